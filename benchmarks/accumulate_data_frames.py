@@ -0,0 +1,60 @@
+"""
+Benchmarks accumulating the results data frames of many analyses into one data frame per sheet.
+Compares appending each analysis to the accumulated data frame with DataFrameAccumulator, which concatenates once.
+
+    $ python benchmarks/accumulate_data_frames.py
+"""
+import time
+
+import pandas as pd
+
+from irida_staramr_results.accumulator import DataFrameAccumulator
+
+
+def _analysis_data_frames(i):
+    """
+    Data frames shaped like the Summary and Detailed_Summary sheets of one analysis.
+    """
+    return {
+        "Summary": pd.DataFrame({"Isolate ID": [f"SAMPLE{i}"], "Quality Module": ["Passed"],
+                                 "Genotype": ["aac(6')-Iaa, blaTEM-1B, sul2"], "Sequence Type": [19]}),
+        "Detailed_Summary": pd.DataFrame({"Isolate ID": [f"SAMPLE{i}"] * 4,
+                                          "Gene": ["aac(6')-Iaa", "blaTEM-1B", "sul2", "ColRNAI"],
+                                          "%Identity": [100.0, 99.88, 100.0, 98.6],
+                                          "Start": [1, 2000, 5000, 7000]})
+    }
+
+
+def append_each(analyses):
+    data_frames = {}
+    for analysis_data_frames in analyses:
+        for sheet_name, df in analysis_data_frames.items():
+            if sheet_name in data_frames:
+                data_frames[sheet_name] = pd.concat([data_frames[sheet_name], df])
+            else:
+                data_frames[sheet_name] = df
+    return data_frames
+
+
+def accumulate(analyses):
+    accumulator = DataFrameAccumulator()
+    for analysis_data_frames in analyses:
+        accumulator.add_data_frames(analysis_data_frames)
+    return accumulator.to_data_frames()
+
+
+def _time(function, analyses):
+    start = time.perf_counter()
+    function(analyses)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    print(f"{'analyses':>10} {'append each (s)':>16} {'accumulator (s)':>16} {'accumulator s/1k':>17}")
+    # parsing is not part of the benchmark, the data frames are created beforehand
+    all_analyses = [_analysis_data_frames(i) for i in range(50000)]
+    for n in (1000, 5000, 10000, 20000, 50000):
+        # appending each analysis is quadratic, only time it while it is still reasonable
+        append_time = f"{_time(append_each, all_analyses[:n]):16.2f}" if n <= 20000 else f"{'-':>16}"
+        accumulate_time = _time(accumulate, all_analyses[:n])
+        print(f"{n:>10} {append_time} {accumulate_time:16.2f} {accumulate_time / n * 1000:17.3f}")
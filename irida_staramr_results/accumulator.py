@@ -0,0 +1,168 @@
+import os
+import pickle
+
+import pandas as pd
+
+
+class DataFrameAccumulator(object):
+    """
+    Collects the data frames parsed from many analyses, per sheet, and concatenates each sheet only once.
+    Appending every analysis to a growing data frame copies all the rows seen so far each time, which is quadratic in
+    the number of analyses, while a single concatenation copies each row once.
+    """
+
+    def __init__(self):
+        self._chunks = {}  # { sheetname : [dataframe, ...] }
+        self._columns = {}  # { sheetname : [column, ...] } columns of every chunk, in order of appearance
+        self._row_counts = {}  # { sheetname : number of rows }
+
+    def add(self, sheet_name, data_frame):
+        """
+        Adds the data frame of one analysis to the sheet.
+        :param sheet_name:
+        :param data_frame:
+        :return None:
+        """
+        columns = self._columns.setdefault(sheet_name, [])
+        self._row_counts.setdefault(sheet_name, 0)
+        if data_frame.empty:
+            return
+
+        for column in data_frame.columns:
+            if column not in columns:
+                columns.append(column)
+        self._row_counts[sheet_name] = self._row_counts[sheet_name] + len(data_frame)
+        self._store_chunk(sheet_name, data_frame)
+
+    def add_data_frames(self, data_frames):
+        """
+        Adds a dictionary of sheetname:dataframe pairs of one analysis.
+        :param data_frames:
+        :return None:
+        """
+        for sheet_name in data_frames:
+            self.add(sheet_name, data_frames[sheet_name])
+
+    def _store_chunk(self, sheet_name, data_frame):
+        self._chunks.setdefault(sheet_name, []).append(data_frame)
+
+    def iter_chunks(self, sheet_name):
+        """
+        Yields the data frames added to the sheet, in the order they were added.
+        :param sheet_name:
+        :return: generator of data frames
+        """
+        yield from self._chunks.get(sheet_name, [])
+
+    def get_sheet_names(self):
+        """
+        Returns the sheet names in the order they were first added.
+        """
+        return list(self._columns)
+
+    def get_columns(self, sheet_name):
+        """
+        Returns the columns of every data frame added to the sheet, in the order they first appeared.
+        """
+        return list(self._columns[sheet_name])
+
+    def get_row_count(self, sheet_name):
+        """
+        Returns the number of rows added to the sheet.
+        """
+        return self._row_counts[sheet_name]
+
+    def to_data_frames(self):
+        """
+        Returns a dictionary of sheetname:dataframe pairs with the data of every analysis added, in the order the
+        sheets were first added. Sheets without any data are empty data frames.
+        :return data_frames:
+        """
+        data_frames = {}
+        for sheet_name in self.get_sheet_names():
+            chunks = list(self.iter_chunks(sheet_name))
+            if chunks:
+                data_frames[sheet_name] = pd.concat(chunks, ignore_index=True, sort=False)
+            else:
+                data_frames[sheet_name] = pd.DataFrame()
+
+        return data_frames
+
+
+class SpooledDataFrameAccumulator(DataFrameAccumulator):
+    """
+    A DataFrameAccumulator that keeps the data frames in spool files on disk instead of memory, one file per sheet.
+    Only the columns and row counts of each sheet stay in memory, so the data of a whole project can be collected and
+    then written one analysis at a time with constant memory.
+    """
+
+    def __init__(self, spool_dir):
+        """
+        :param spool_dir: directory of the spool files, created if it does not exist
+        """
+        super().__init__()
+        self.spool_dir = spool_dir
+        os.makedirs(spool_dir, exist_ok=True)
+        self._spool_files = {}  # { sheetname : spool file path }
+
+    def _get_spool_file(self, sheet_name):
+        if sheet_name not in self._spool_files:
+            self._spool_files[sheet_name] = os.path.join(self.spool_dir, f"{len(self._spool_files)}.pickle")
+        return self._spool_files[sheet_name]
+
+    def get_checkpoint(self):
+        """
+        Returns the columns, row count and spool file size of each sheet, as a JSON serializable list, so a later
+        accumulator can restore() the data added so far from the same spool directory.
+        :return checkpoint: list of dictionaries, in the order the sheets were first added
+        """
+        checkpoint = []
+        for sheet_name in self.get_sheet_names():
+            spool_file = self._spool_files.get(sheet_name)
+            checkpoint.append({"sheet_name": sheet_name,
+                               "columns": self.get_columns(sheet_name),
+                               "row_count": self.get_row_count(sheet_name),
+                               "spool_file": None if spool_file is None else os.path.basename(spool_file),
+                               "spool_size": None if spool_file is None else os.path.getsize(spool_file)})
+        return checkpoint
+
+    def restore(self, checkpoint):
+        """
+        Restores the data added up to a checkpoint of an accumulator of the same spool directory. Spool files are
+        truncated to their size at the checkpoint and the ones created after it are removed, dropping any data frame
+        written after it.
+        :param checkpoint: list returned by get_checkpoint()
+        :return None:
+        """
+        self._chunks = {}
+        self._columns = {}
+        self._row_counts = {}
+        self._spool_files = {}
+
+        for sheet in checkpoint:
+            self._columns[sheet["sheet_name"]] = list(sheet["columns"])
+            self._row_counts[sheet["sheet_name"]] = sheet["row_count"]
+            if sheet["spool_file"] is not None:
+                spool_file = os.path.join(self.spool_dir, sheet["spool_file"])
+                os.truncate(spool_file, sheet["spool_size"])
+                self._spool_files[sheet["sheet_name"]] = spool_file
+
+        for file_name in os.listdir(self.spool_dir):
+            spool_file = os.path.join(self.spool_dir, file_name)
+            if spool_file not in self._spool_files.values():
+                os.remove(spool_file)
+
+    def _store_chunk(self, sheet_name, data_frame):
+        with open(self._get_spool_file(sheet_name), "ab") as file:
+            pickle.dump(data_frame, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def iter_chunks(self, sheet_name):
+        if sheet_name not in self._spool_files:
+            return
+
+        with open(self._spool_files[sheet_name], "rb") as file:
+            while True:
+                try:
+                    yield pickle.load(file)
+                except EOFError:
+                    break
@@ -1,2 +1,4 @@
 from irida_staramr_results.api import exceptions
 from irida_staramr_results.api.irida_api import IridaAPI
+from irida_staramr_results.api.async_irida_api import AsyncIridaAPI
+from irida_staramr_results.api.rate_limit import RateLimiter, RetryPolicy
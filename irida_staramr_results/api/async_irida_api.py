@@ -0,0 +1,224 @@
+import asyncio
+import json
+import logging
+import threading
+from http import HTTPStatus
+
+from irida_staramr_results.api import exceptions
+from irida_staramr_results.api.irida_api import IridaAPI, PROJECTS_TTL
+
+# Number of seconds a request may take, the same as rauth's default timeout.
+REQUEST_TIMEOUT = 300
+
+# Number of seconds idle connections are kept open to be reused.
+KEEPALIVE_TIMEOUT = 30
+
+
+def _import_aiohttp():
+    """
+    aiohttp is an optional dependency, only needed for the asynchronous client.
+    """
+    try:
+        import aiohttp
+    except ImportError:
+        logging.error("The asynchronous client requires aiohttp. "
+                      "Install it with: pip install irida-staramr-results[async]")
+        raise
+    return aiohttp
+
+
+class AsyncIridaAPI(IridaAPI):
+    """
+    An IridaAPI sending the requests of analysis results and results files from asyncio coroutines instead of one
+    thread per request, so a single process can keep hundreds of requests in flight.
+    Coroutines run on an event loop in a background thread and share one aiohttp session, which pools and keeps alive
+    up to max_workers connections. A semaphore of max_workers slots limits the concurrent requests.
+    The methods stay synchronous and can be called from several threads, like IridaAPI. Listing projects and analysis
+    submissions still uses the synchronous session, these are only a few requests per project.
+    """
+
+    def __init__(self, client_id, client_secret,
+                 base_url, username, password, max_wait_time=20, http_max_retries=5, max_workers=1,
+                 result_cache=None, projects_ttl=PROJECTS_TTL, rate_limiter=None, retry_policy=None,
+                 response_cache=None, keepalive_timeout=KEEPALIVE_TIMEOUT):
+        """
+        Same arguments as IridaAPI, and:
+            keepalive_timeout -- number of seconds idle connections are kept open to be reused
+
+        raises ImportError if aiohttp is not installed
+        """
+        self._aiohttp = _import_aiohttp()
+        super().__init__(client_id, client_secret, base_url, username, password, max_wait_time, http_max_retries,
+                         max_workers, result_cache, projects_ttl, rate_limiter, retry_policy, response_cache)
+        self.keepalive_timeout = keepalive_timeout
+
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, name="irida-api-event-loop", daemon=True)
+        self._loop_thread.start()
+        self._client_session = self._run(self._create_client_session())
+
+    async def _create_client_session(self):
+        """
+        Creates the aiohttp session and the request slots, which must be created on the event loop.
+        """
+        self._async_request_slots = asyncio.Semaphore(self.max_workers)
+        connector = self._aiohttp.TCPConnector(limit=self.max_workers, keepalive_timeout=self.keepalive_timeout)
+        return self._aiohttp.ClientSession(connector=connector,
+                                           timeout=self._aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+
+    def _run(self, coroutine):
+        """
+        Runs a coroutine on the event loop and waits for its result.
+        """
+        return self._submit(coroutine).result()
+
+    def _submit(self, coroutine):
+        """
+        Schedules a coroutine on the event loop.
+        :return: concurrent.futures.Future of its result
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def close(self):
+        """
+        Closes the connections of both sessions and stops the event loop.
+        """
+        if self._loop.is_running():
+            self._run(self._client_session.close())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join()
+        self._loop.close()
+        super().close()
+
+    async def _async_get(self, url, headers=None):
+        """
+        Same as IridaAPI._get(), as a coroutine.
+        If IRIDA rejects the access token (401), a new session is created and the request is sent once more.
+        :param url: the url to request
+        :param headers: optional dictionary of headers
+        :return status, reason, body: status code, reason phrase and bytes of the response
+        """
+        session = self._session_instance
+        if self._is_session_expired():
+            logging.debug("Token is about to expire, going to get a new session.")
+            session = await self._loop.run_in_executor(None, self._refresh_session, session)
+
+        status, reason, body = await self._async_send_get(session.access_token, url, headers)
+
+        if status == HTTPStatus.UNAUTHORIZED:
+            logging.debug("Token was rejected, going to get a new session.")
+            session = await self._loop.run_in_executor(None, self._refresh_session, session)
+            status, reason, body = await self._async_send_get(session.access_token, url, headers)
+
+        return status, reason, body
+
+    async def _async_send_get(self, access_token, url, headers=None):
+        """
+        Same as IridaAPI._send_get(), as a coroutine. Like the HTTPAdapter of the synchronous session, a request that
+        could not connect is sent again too, after the backoff of the retry policy.
+        :return status, reason, body: of the last response if every attempt was overloaded
+        """
+        headers = dict(headers or {}, Authorization=f"Bearer {access_token}")
+
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.rate_limiter.reserve())
+            async with self._async_request_slots:
+                self._count_request()
+                try:
+                    async with self._client_session.get(url, headers=headers) as response:
+                        status, reason, body = response.status, response.reason, await response.read()
+                        retry_after = response.headers.get("Retry-After")
+                except self._aiohttp.ClientConnectionError as e:
+                    if attempt >= self.retry_policy.max_retries:
+                        raise
+                    logging.debug(f"Could not connect to {url}, retrying: {e}")
+                    status, retry_after = None, None
+
+            if status is not None:
+                if not self.retry_policy.is_retryable(status):
+                    self.rate_limiter.on_success()
+                    return status, reason, body
+
+                self.rate_limiter.on_overload()
+                if attempt >= self.retry_policy.max_retries:
+                    return status, reason, body
+
+            delay = self.retry_policy.get_delay(attempt, retry_after)
+            logging.debug(f"Retrying {url} in {delay:.1f} seconds.")
+            await asyncio.sleep(delay)
+            attempt = attempt + 1
+
+    async def _async_get_existing_url(self, url, headers=None):
+        """
+        Same as IridaAPI._get_existing_url(), as a coroutine.
+        :return body: bytes of the response if http response OK 200, raises IridaConnectionError otherwise
+        """
+        try:
+            status, reason, body = await self._async_get(url, headers)
+        except Exception as e:
+            logging.error("Could not connect to IRIDA, non URLError Exception occurred. URL '{}' Error: {}"
+                          "".format(url, str(e)))
+            raise exceptions.IridaConnectionError("Could not connect to IRIDA, non URLError Exception occurred. "
+                                                  "URL '{}' Error: {}".format(url, str(e)))
+
+        if status == HTTPStatus.OK:
+            return body
+        else:
+            logging.error("Could not connect to IRIDA, URL '{}' responded with: {} {}".format(url, status, reason))
+            raise exceptions.IridaConnectionError("Could not connect to IRIDA, URL '{}' responded with: {} {}"
+                                                  "".format(url, status, reason))
+
+    async def _async_get_resource(self, url):
+        """
+        Returns the resource of a json response, like IridaAPI._get_analysis_result().
+        """
+        logging.debug(f"Requesting {url}.")
+        status, reason, body = await self._async_get(url)
+        return json.loads(body)["resource"]
+
+    def get_analysis_results(self, analysis_submissions, show_progress=True):
+        """
+        Same as IridaAPI.get_analysis_results(), but the analysis results are requested by coroutines on the event
+        loop, up to `max_workers` at the same time, instead of by a pool of threads.
+        :param analysis_submissions: iterable of COMPLETED analysis submission dictionaries
+        :param show_progress: boolean, print a progress bar
+        :return: list of (analysis submission, analysis result) tuples, in the order of the analysis submissions
+        """
+        def submit(analysis_submission):
+            # the analysis submissions url is resolved by the first call, before any coroutine needs it
+            analysis_results_url = self.get_analysis_results_url(analysis_submission["identifier"])
+            return self._submit(self._async_get_resource(analysis_results_url))
+
+        return self._collect_analysis_results(analysis_submissions, submit, show_progress)
+
+    def _get_file_contents(self, analysis_id, file_links):
+        """
+        Returns the contents of the results files of an analysis, from the result cache if it has them, otherwise
+        requested from IRIDA at the same time.
+        :param analysis_id: integer
+        :param file_links: list of (file key, link) tuples
+        :return file_contents: list of bytes, in the order of file_links
+        """
+        file_contents = [None] * len(file_links)
+        if self.result_cache is not None:
+            file_contents = [self.result_cache.get(self.base_url, analysis_id, file_key) for file_key, _ in file_links]
+
+        missing = [i for i, file_content in enumerate(file_contents) if file_content is None]
+        downloaded = self._run(self._async_get_files([file_links[i][1]["href"] for i in missing]))
+
+        for i, file_content in zip(missing, downloaded):
+            file_contents[i] = file_content
+            if self.result_cache is not None:
+                self.result_cache.put(self.base_url, analysis_id, file_links[i][0], file_content)
+
+        return file_contents
+
+    async def _async_get_files(self, file_urls):
+        """
+        Requests the contents of files at the same time.
+        :param file_urls: list of urls
+        :return file_contents: list of bytes, in the order of file_urls
+        """
+        return await asyncio.gather(*[self._async_get_existing_url(file_url, headers={"Accept": "text/plain"})
+                                      for file_url in file_urls])
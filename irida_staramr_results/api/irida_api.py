@@ -1,19 +1,48 @@
 import ast
+import json
 import logging
 import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
 from urllib.error import URLError
 from urllib.parse import urljoin, urlparse
 
 from requests import ConnectionError
-from requests.adapters import HTTPAdapter
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
 from rauth import OAuth2Service
+from urllib3.util.retry import Retry
 
 from irida_staramr_results.api import exceptions
-from irida_staramr_results.model.result import Result
+from irida_staramr_results.api.rate_limit import RateLimiter, RetryPolicy
+from irida_staramr_results.model.result import Result, SHEET_NAMES, is_pointfinder_enabled
 from irida_staramr_results.util import print_progress_bar
 
 
+# Number of seconds before the access token expires that a new session is requested.
+TOKEN_EXPIRY_MARGIN = 60
+
+# Number of seconds the projects listing is reused before it is requested again.
+PROJECTS_TTL = 300
+
+# Output files of a StarAMR analysis that are downloaded, in the order of the sheets. The PointFinder sheet is last.
+OUTPUT_FILE_KEYS = [
+    "staramr-resfinder.tsv",
+    "staramr-detailed-summary.tsv",
+    "staramr-settings.txt",
+    "staramr-summary.tsv",
+    "staramr-plasmidfinder.tsv",
+    "staramr-mlst.tsv"
+]
+
+# Output files the PointFinder sheet is read from, in order of preference. Analyses without staramr-pointfinder.tsv
+# only have their PointFinder results in a sheet of the excel file, the largest output file.
+POINTFINDER_FILE_KEYS = [
+    "staramr-pointfinder.tsv",
+    "staramr-excel.xlsx"
+]
+
 # For a truly independent api module, we should have a signal, or pubsub system in the module, that the progress module
 # can subscribe to. That way, the api module is separate, and other applications could use the emits/messages in their
 # own setups.
@@ -22,7 +51,9 @@ from irida_staramr_results.util import print_progress_bar
 class IridaAPI(object):
 
     def __init__(self, client_id, client_secret,
-                 base_url, username, password, max_wait_time=20, http_max_retries=5):
+                 base_url, username, password, max_wait_time=20, http_max_retries=5, max_workers=1,
+                 result_cache=None, projects_ttl=PROJECTS_TTL, rate_limiter=None, retry_policy=None,
+                 response_cache=None):
         """
         Create OAuth2Session and store it
 
@@ -32,6 +63,16 @@ class IridaAPI(object):
             base_url -- url of the IRIDA server
             username -- username for server
             password -- password for given username
+            max_workers -- maximum number of concurrent requests made to IRIDA, shared by every thread using
+                this instance (eg. when fanning out per-submission lookups or downloading several projects)
+            result_cache -- optional ResultFileCache consulted before downloading results files
+            projects_ttl -- number of seconds the projects listing is reused before it is requested again
+            rate_limiter -- optional RateLimiter shared by every request, defaults to an unlimited one which only
+                slows down when IRIDA is overloaded
+            retry_policy -- optional RetryPolicy of requests IRIDA could not answer, defaults to retrying
+                http_max_retries times
+            response_cache -- optional ResponseCache of the links and listings, revalidated with conditional
+                requests so unchanged ones are answered 304 Not Modified
 
         return ApiCalls object
         """
@@ -43,43 +84,145 @@ class IridaAPI(object):
         self.password = password
         self.max_wait_time = max_wait_time
         self.http_max_retries = http_max_retries
+        self.max_workers = max(1, max_workers)
+        self.result_cache = result_cache
+        self.projects_ttl = projects_ttl
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy(http_max_retries)
+        self.response_cache = response_cache
 
         self.analysis_submission_url = None
         self.project_url = None
         self.target_submission_ids = {}  # { result_id : submission_id }
+        self._target_submission_ids_lock = threading.Lock()
+        self.failed_submission_ids = set()  # submissions whose analysis result could not be requested
 
         self._session_lock = threading.Lock()
         self._session_set_externally = False
+        self._request_count = 0
+        self._request_count_lock = threading.Lock()
+        self._request_slots = threading.BoundedSemaphore(self.max_workers)
+        self._link_cache = {}  # { (target_url, target_key, target_value) : link }
+        self._link_cache_lock = threading.Lock()
+        self._session_instance = None
+        self._session_expiry = None  # time.monotonic() after which the session is refreshed, None if unknown
+        self._projects_index = None  # { project id : project links }
+        self._projects_index_expiry = None  # time.monotonic() after which the projects are requested again
+        self._projects_index_lock = threading.Lock()
         self._create_session()
-        self.cached_projects = None
-        self.cached_samples = {}
 
     @property
     def _session(self):
-        try:  # Todo: rework this code without the try/catch/finally and odd exception raise
-            self._session_lock.acquire()
-            response = self._session_instance.options(self.base_url)
-            if response.status_code != HTTPStatus.OK:
-                raise Exception
-            else:
-                logging.debug("Existing session still works, going to reuse it.")
-        except Exception:
-            logging.debug("Token is probably expired, going to get a new session.")
-            self._reinitialize_session()
-        finally:
-            self._session_lock.release()
+        """
+        Returns the current session, getting a new one first if its access token is about to expire.
+        The expiry is checked without taking the session lock, so concurrent callers only contend on a refresh.
+        """
+        session = self._session_instance
+        if self._is_session_expired():
+            logging.debug("Token is about to expire, going to get a new session.")
+            session = self._refresh_session(session)
+
+        return session
+
+    def _is_session_expired(self):
+        return self._session_expiry is not None and time.monotonic() >= self._session_expiry
+
+    def _refresh_session(self, stale_session):
+        """
+        Replaces stale_session with a new session, unless another thread already replaced it.
+        :param stale_session: the session that expired or had its access token rejected
+        :return: the current session
+        """
+        with self._session_lock:
+            if self._session_instance is stale_session:
+                self._reinitialize_session()
 
         return self._session_instance
 
     def _reinitialize_session(self):
         oauth_service = self._get_oauth_service()
-        access_token = self._get_access_token(oauth_service)
+        access_token, expires_in = self._get_access_token(oauth_service)
         _sess = oauth_service.get_session(access_token)
-        # We add a HTTPAdapter with max retries so we don't fail out if one request gets lost
-        _sess.mount('https://', HTTPAdapter(max_retries=self.http_max_retries))
-        _sess.mount('http://', HTTPAdapter(max_retries=self.http_max_retries))
+        # We add a HTTPAdapter with max retries so we don't fail out if one request gets lost, with a backoff between
+        # attempts. Responses of an overloaded IRIDA are retried by _send_get().
+        # The connection pool is sized so concurrent lookups don't discard connections.
+        pool_size = max(DEFAULT_POOLSIZE, self.max_workers)
+        max_retries = Retry(total=self.http_max_retries, backoff_factor=self.retry_policy.backoff_factor,
+                            status_forcelist=None, respect_retry_after_header=False)
+        _sess.mount('https://', HTTPAdapter(max_retries=max_retries, pool_maxsize=pool_size))
+        _sess.mount('http://', HTTPAdapter(max_retries=max_retries, pool_maxsize=pool_size))
+
+        # Refresh the session a little before IRIDA expires the token, a rejected token is handled by _get().
+        if expires_in is None:
+            self._session_expiry = None
+        else:
+            self._session_expiry = time.monotonic() + max(0, int(expires_in) - TOKEN_EXPIRY_MARGIN)
         self._session_instance = _sess
 
+    def _get(self, url, **kwargs):
+        """
+        Makes a GET request with the current session, see _send_get().
+        If IRIDA rejects the access token (401), a new session is created and the request is sent once more.
+        :param url: the url to request
+        :param kwargs: keyword arguments passed to the session (eg. headers)
+        :return: response
+        """
+        session = self._session
+        response = self._send_get(session, url, **kwargs)
+
+        if response.status_code == HTTPStatus.UNAUTHORIZED:
+            logging.debug("Token was rejected, going to get a new session.")
+            session = self._refresh_session(session)
+            response = self._send_get(session, url, **kwargs)
+
+        return response
+
+    def _send_get(self, session, url, **kwargs):
+        """
+        Sends a GET request once one of the `max_workers` request slots is free and the rate limiter allows it, so
+        threads sharing this instance never send more than `max_workers` requests at the same time.
+        When IRIDA responds that it is overloaded (eg. 503), the rate limiter slows down and the request is sent again
+        after the backoff of the retry policy. The request slot is free while waiting.
+        :return: response, the last one if every attempt was overloaded
+        """
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            with self._request_slots:
+                self._count_request()
+                response = session.get(url, **kwargs)
+
+            if not self.retry_policy.is_retryable(response.status_code):
+                self.rate_limiter.on_success()
+                return response
+
+            self.rate_limiter.on_overload()
+            if attempt >= self.retry_policy.max_retries:
+                return response
+
+            delay = self.retry_policy.get_delay(attempt, response.headers.get("Retry-After"))
+            logging.debug(f"IRIDA responded {response.status_code} to {url}, retrying in {delay:.1f} seconds.")
+            response.close()
+            time.sleep(delay)
+            attempt = attempt + 1
+
+    def _count_request(self):
+        with self._request_count_lock:
+            self._request_count = self._request_count + 1
+
+    @property
+    def request_count(self):
+        """
+        The number of GET requests sent to IRIDA by this instance.
+        """
+        return self._request_count
+
+    def close(self):
+        """
+        Closes the connections of the current session.
+        """
+        self._session_instance.close()
+
     def _create_session(self):
         """
         create session to be re-used until expiry for get and post calls
@@ -128,7 +271,7 @@ class IridaAPI(object):
         arguments:
             oauth_service -- O2AuthService from get_oauth_service
 
-        returns access token
+        returns access token and its lifetime in seconds (None if IRIDA did not send one)
         """
 
         def token_decoder(return_dict):
@@ -172,7 +315,9 @@ class IridaAPI(object):
             raise exceptions.IridaConnectionError("Could not get access token from IRIDA. Credentials may be incorrect."
                                                   " IRIDA returned with error message: {}".format(e.args))
 
-        return access_token
+        expires_in = token_decoder(oauth_service.access_token_response.content).get("expires_in")
+
+        return access_token, expires_in
 
     def _validate_url_existence(self, url):
         """
@@ -187,8 +332,24 @@ class IridaAPI(object):
             true if http response OK 200
             raises IridaConnectionError otherwise
         """
+        self._get_existing_url(url)
+        return True
+
+    def _get_existing_url(self, url, allow_not_modified=False, **kwargs):
+        """
+        opens the given url, validating its existence like _validate_url_existence()
+
+        arguments:
+            url -- the url link to open
+            allow_not_modified -- also return the response of a conditional request answered 304 Not Modified
+            kwargs -- keyword arguments passed to the session (eg. headers)
+
+        returns
+            the response if http response OK 200 (or 304 if allowed)
+            raises IridaConnectionError otherwise
+        """
         try:
-            response = self._session.get(url)
+            response = self._get(url, **kwargs)
         except URLError as e:
             logging.error("Could not connect to IRIDA, URL '{}' responded with: {}"
                           "".format(url, str(e)))
@@ -200,14 +361,49 @@ class IridaAPI(object):
             raise exceptions.IridaConnectionError("Could not connect to IRIDA, non URLError Exception occurred. "
                                                   "URL '{}' Error: {}".format(url, str(e)))
 
-        if response.status_code == HTTPStatus.OK:
-            return True
+        if response.status_code == HTTPStatus.OK or (allow_not_modified and
+                                                     response.status_code == HTTPStatus.NOT_MODIFIED):
+            return response
         else:
             logging.error("Could not connect to IRIDA, URL '{}' responded with: {} {}"
                           "".format(url, response.status_code, response.reason))
             raise exceptions.IridaConnectionError("Could not connect to IRIDA, URL '{}' responded with: {} {}"
                                                   "".format(url, response.status_code, response.reason))
 
+    def _get_json(self, url):
+        """
+        Returns the json response of a url listing links or resources.
+        With a response cache, the ETag and Last-Modified validators of the cached response are sent with the request,
+        and the cached response is returned if IRIDA answers 304 Not Modified, so unchanged listings are not downloaded
+        again. IRIDA only sends validators when its server is configured to, otherwise every response is downloaded.
+
+        arguments:
+            url -- the url link to open
+
+        returns the json dictionary of the response
+        raises IridaConnectionError if the response is not OK 200 or 304
+        """
+        if self.response_cache is None:
+            return self._get_existing_url(url).json()
+
+        cached_response = self.response_cache.get(self.username, url)
+        headers = {}
+        if cached_response is not None:
+            etag, last_modified, _ = cached_response
+            if etag is not None:
+                headers["If-None-Match"] = etag
+            if last_modified is not None:
+                headers["If-Modified-Since"] = last_modified
+
+        response = self._get_existing_url(url, allow_not_modified=cached_response is not None, headers=headers)
+        if response.status_code == HTTPStatus.NOT_MODIFIED:
+            logging.debug(f"{url} was not modified, using the cached response.")
+            return json.loads(cached_response[2])
+
+        self.response_cache.put(self.username, url, response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                                response.content)
+        return response.json()
+
     def _get_link(self, target_url, target_key, target_dict=None):
         """
         makes a call to target_url(api) expecting a json response
@@ -227,19 +423,18 @@ class IridaAPI(object):
 
         logging.debug("irida_api._get_link: target_url: {}, target_key: {}".format(target_url, target_key))
 
-        self._validate_url_existence(target_url)
-        response = self._session.get(target_url)
+        response = self._get_json(target_url)
 
         if target_dict:  # we are targeting specific resources in the response
 
             # TODO: This try except block has been added to log a crash that has occurred, to find the source.
             try:
-                resources_list = response.json()["resource"]["resources"]
+                resources_list = response["resource"]["resources"]
             except KeyError as e:
                 # This is occurring for an unknown reason.
                 # Once docs can be gathered displaying information, we can determine the source of the bug and fix it.
                 logging.error("Dumping json response from IRIDA:")
-                logging.error(str(response.json()))
+                logging.error(str(response))
                 logging.error("Dumping python KeyError:")
                 logging.error(e)
                 error_txt = "Response from IRIDA Could not be parsed. Please show the log to your IRIDA Administrator."
@@ -257,10 +452,10 @@ class IridaAPI(object):
                     target_dict["key"] + " not found. Available keys: " ", ".join(resources_list[0].keys()))
 
             except StopIteration:
-                raise exceptions.IridaKeyError(target_dict["value"] + " not found.")
+                raise exceptions.IridaKeyError(str(target_dict["value"]) + " not found.")
 
         else:  # get all the links in the response
-            links_list = response.json()["resource"]["links"]
+            links_list = response["resource"]["links"]
         try:
             ret_val = next(link["href"] for link in links_list
                            if link["rel"] == target_key)
@@ -273,6 +468,88 @@ class IridaAPI(object):
 
         return ret_val
 
+    def _get_cached_link(self, target_url, target_key, target_dict=None):
+        """
+        Same as _get_link(), but each link is only requested once and then shared by every thread using this instance.
+        Links of IRIDA resources (eg. projects or analysisSubmissions) do not change while exporting results.
+        Lookups hold the link cache lock, so threads asking for a link that is being requested wait for it instead of
+        requesting it again.
+
+        arguments:
+            target_url -- URL to retrieve link from
+            target_key -- name of link (e.g projects or project/samples)
+            target_dict -- optional dict containing key and value to search in targets, see _get_link()
+
+        returns link if it exists
+        """
+        target_value = None if target_dict is None else (target_dict["key"], str(target_dict["value"]).lower())
+        cache_key = (target_url, target_key, target_value)
+
+        with self._link_cache_lock:
+            if cache_key not in self._link_cache:
+                self._link_cache[cache_key] = self._get_link(target_url, target_key, target_dict)
+            return self._link_cache[cache_key]
+
+    def _get_projects_index(self, refresh=False):
+        """
+        Returns the projects the user has access to as a dictionary of project id (lowercase string) to the links of
+        the project. eg. { "1": [{"rel": "project/analyses", "href": ...}, ...], ... }
+        The projects listing is requested once and reused by every lookup until it is older than projects_ttl seconds,
+        so looking up many projects doesn't download and scan the whole listing each time.
+
+        arguments:
+            refresh -- request the projects listing even if it has not expired
+
+        returns projects index
+        """
+        with self._projects_index_lock:
+            if refresh or self._projects_index is None or time.monotonic() >= self._projects_index_expiry:
+                if not self.project_url:
+                    self.project_url = self._get_cached_link(self.base_url, "projects")
+
+                logging.info(f"Requesting {self.project_url}.")
+                response = self._get_json(self.project_url)
+                try:
+                    resources_list = response["resource"]["resources"]
+                    self._projects_index = {str(r["identifier"]).lower(): r["links"] for r in resources_list}
+                except KeyError as e:
+                    logging.error("Dumping json response from IRIDA:")
+                    logging.error(str(response))
+                    error_txt = ("Response from IRIDA Could not be parsed. "
+                                 "Please show the log to your IRIDA Administrator.")
+                    logging.error(error_txt)
+                    raise exceptions.IridaKeyError(error_txt) from e
+
+                self._projects_index_expiry = time.monotonic() + self.projects_ttl
+
+            return self._projects_index
+
+    def _get_project_link(self, project_id, target_key):
+        """
+        Returns a link of a project from the projects index.
+        If the project is not in the index, the projects listing is requested again in case the project was created
+        after it was requested.
+
+        arguments:
+            project_id -- identifier of the project
+            target_key -- name of link (e.g project/analyses)
+
+        returns link if it exists
+        raises IridaKeyError if the project or the link does not exist
+        """
+        index_key = str(project_id).lower()
+        links_list = self._get_projects_index().get(index_key)
+        if links_list is None:
+            links_list = self._get_projects_index(refresh=True).get(index_key)
+        if links_list is None:
+            raise exceptions.IridaKeyError(f"{project_id} not found.")
+
+        try:
+            return next(link["href"] for link in links_list if link["rel"] == target_key)
+        except StopIteration:
+            raise exceptions.IridaKeyError(target_key + " not found in links. Available links: " +
+                                           ", ".join([str(link["rel"]) for link in links_list]))
+
     def _is_result_type_amr(self, analysis_result):
         """
         Checks if the analysis result is an amr detection type.
@@ -300,11 +577,16 @@ class IridaAPI(object):
 
         return False
 
-    def get_completed_amr_analysis_results(self, project_id):
+    def get_completed_amr_analysis_results(self, project_id, submission_filter=None, show_progress=True):
         """
         Get COMPLETED analysis results of AMR DETECTION type from a project id.
         If no analysis results found in the project, it returns an empty array.
+        The analysis result of each COMPLETED submission is requested concurrently, see get_analysis_results().
+        Results are returned in the same order as the project's analysis submissions.
         :param project_id: integer
+        :param submission_filter: optional function called with every analysis submission of the project before any
+            analysis result is requested. Submissions for which it returns False are skipped.
+        :param show_progress: boolean, print a progress bar. Disable it when several projects are requested at once.
         :return completed_amr_analysis_results: an array of completed amr analysis result dictionaries
         """
 
@@ -319,55 +601,125 @@ class IridaAPI(object):
 
         logging.info("Requesting completed staramr analysis results.")
 
-        # progress bar variables
-        total = len(project_analysis_submissions)
-        iteration = 0
-
-        # Filter Completed AMR Detection type
-        for analysis_submission in project_analysis_submissions:
-
-            iteration = iteration + 1
-            print_progress_bar(iteration, total, message="analysis submissions seen")
+        # Only COMPLETED submissions have analysis results we can retrieve and find out its type.
+        completed_analysis_submissions = (s for s in project_analysis_submissions
+                                          if (submission_filter is None or submission_filter(s))
+                                          and s["analysisState"] == "COMPLETED")
 
-            if analysis_submission["analysisState"] == "COMPLETED":
-                analysis_result = self._get_analysis_result(analysis_submission["identifier"])
-                if self._is_result_type_amr(analysis_result):
-                    completed_amr_analysis_results.append(analysis_result)
+        # Filter Completed AMR Detection type, keeping the order of the analysis submissions
+        for analysis_submission, analysis_result in self.get_analysis_results(completed_analysis_submissions,
+                                                                              show_progress):
+            if self._is_result_type_amr(analysis_result):
+                completed_amr_analysis_results.append(analysis_result)
 
-                    # cache submission id with corresponding result id
-                    self._store_submission_id(analysis_result["identifier"], analysis_submission["identifier"])
+                # cache submission id with corresponding result id
+                self._store_submission_id(analysis_result["identifier"], analysis_submission["identifier"])
 
-        logging.info(f"{len(completed_amr_analysis_results)} completed StarAMR analysis results were requested in total.")
+        logging.info(f"{len(completed_amr_analysis_results)} completed StarAMR analysis results were requested in "
+                     f"total for project [{project_id}].")
 
         if len(completed_amr_analysis_results) < 1:
             logging.warning(f"No Completed AMR Detection type found in project [{project_id}].")
 
         return completed_amr_analysis_results
 
+    def get_analysis_results(self, analysis_submissions, show_progress=True):
+        """
+        Requests the analysis result of each COMPLETED analysis submission concurrently, using up to `max_workers`
+        threads. The analysis submissions are consumed lazily, so requests start while a paged iterator is still
+        fetching the next pages. A failed request for one submission is logged, skipped and its id added to
+        `failed_submission_ids`, it does not stop the other lookups.
+        :param analysis_submissions: iterable of COMPLETED analysis submission dictionaries
+        :param show_progress: boolean, print a progress bar
+        :return: list of (analysis submission, analysis result) tuples, in the order of the analysis submissions
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def submit(analysis_submission):
+                return executor.submit(self._get_analysis_result, analysis_submission["identifier"])
+
+            return self._collect_analysis_results(analysis_submissions, submit, show_progress)
+
+    def _collect_analysis_results(self, analysis_submissions, submit, show_progress=True):
+        """
+        Requests the analysis results of get_analysis_results() with submit, in order. At most twice as many requests
+        as `max_workers` are pending at a time, so the analysis submissions are only consumed as the results arrive
+        and memory does not grow with the number of requests waiting.
+        :param analysis_submissions: iterable of COMPLETED analysis submission dictionaries
+        :param submit: function returning a concurrent.futures.Future of the analysis result of an analysis submission
+        :param show_progress: boolean, print a progress bar
+        :return: list of (analysis submission, analysis result) tuples, without the failed ones
+        """
+        max_pending = 2 * self.max_workers
+        pending = deque()  # [ (analysis submission, future), ... ] requests not collected yet, in order
+        analysis_results = []
+        iteration = 0
+
+        def finish_next():
+            nonlocal iteration
+            analysis_submission, future = pending.popleft()
+            try:
+                analysis_results.append((analysis_submission, future.result()))
+            except Exception as e:
+                logging.warning(f"Could not request the analysis result of analysis submission "
+                                f"[{analysis_submission['identifier']}]: {e}. Moving on...")
+                self.failed_submission_ids.add(analysis_submission["identifier"])
+
+            # the total is the number of analysis submissions seen so far, the next ones are not known yet
+            iteration = iteration + 1
+            if show_progress:
+                print_progress_bar(iteration, iteration + len(pending), message="completed analysis submissions seen")
+
+        for analysis_submission in analysis_submissions:
+            pending.append((analysis_submission, submit(analysis_submission)))
+            if len(pending) > max_pending:
+                finish_next()
+
+        while pending:
+            finish_next()
+
+        return analysis_results
+
     def _get_project_analysis_submissions(self, project_id):
         """
-        Returns an array of ALL analysis submissions (regardless of the type) for a given project
+        Returns an iterator of ALL analysis submissions (regardless of the type) for a given project,
+        see iter_project_analysis_submissions()
         :param project_id: integer
-        :return analysis_submissions: array
+        :return analysis_submissions: iterator
         """
-        if not self.project_url:
-            self.project_url = self._get_link(self.base_url, "projects")
-
         try:
-            logging.info(f"Requesting {self.project_url}.")
-            project_analysis_submissions_url = self._get_link(self.project_url, "project/analyses",
-                                                      target_dict={
-                                                          "key": "identifier",
-                                                          "value": project_id
-                                                      })
+            return self.iter_project_analysis_submissions(project_id)
         except StopIteration:
             logging.error(f"The given project ID doesn't exist: {project_id}")
             raise exceptions.IridaResourceError("The given project ID doesn't exist", project_id)
 
-        response = self._session.get(project_analysis_submissions_url)
-        analysis_submissions = response.json()["resource"]["resources"]
+    def iter_project_analysis_submissions(self, project_id):
+        """
+        Returns an iterator of ALL analysis submissions (regardless of the type) for a given project.
+        Submissions are yielded one page at a time: when IRIDA pages a collection, the "next" link of each page is
+        only followed once the submissions of the previous page were consumed, so callers can start filtering and
+        requesting results right away and only one page is held in memory. Without paging, the whole collection is a
+        single page.
+        The project is looked up when this is called, an unknown project raises IridaKeyError right away.
+        :param project_id: integer
+        :return analysis_submissions: iterator of analysis submission dictionaries
+        """
+        project_analysis_submissions_url = self._get_project_link(project_id, "project/analyses")
+        return self._iter_collection(project_analysis_submissions_url)
+
+    def _iter_collection(self, url):
+        """
+        Yields the resources of a collection, requesting the next page when the previous one is consumed.
+        :param url: url of the first page of the collection
+        :return: generator of resource dictionaries
+        """
+        requested_urls = set()
+        while url is not None and url not in requested_urls:
+            requested_urls.add(url)
+            logging.debug(f"Requesting {url}.")
+            resource = self._get_json(url)["resource"]
+            url = next((link["href"] for link in resource.get("links", []) if link["rel"] == "next"), None)
 
-        return analysis_submissions
+            yield from resource["resources"]
 
     def _get_analysis_result(self, analysis_submission_id):
         """
@@ -380,14 +732,14 @@ class IridaAPI(object):
 
         if not self.analysis_submission_url:
             logging.debug("Requesting analysis submissions url.")
-            self.analysis_submission_url = self._get_link(self.base_url, "analysisSubmissions")
+            self.analysis_submission_url = self._get_cached_link(self.base_url, "analysisSubmissions")
 
         analysis_results_url = self.get_analysis_results_url(analysis_submission_id)
 
         logging.debug(f"Requesting {analysis_results_url}.")
         try:
 
-            analysis_result = self._session.get(analysis_results_url).json()["resource"]
+            analysis_result = self._get(analysis_results_url).json()["resource"]
 
         except exceptions.IridaKeyError:
             """
@@ -400,71 +752,142 @@ class IridaAPI(object):
 
         return analysis_result
 
-    def get_analysis_result_files(self, analysis_id):
+    def get_analysis_result_files(self, analysis_id, analysis_result=None, sheet_names=None):
         """
         Returns a list of Result, which are file objects, given analysis id.
-        Each AMR analysis should have at least five Result file objects. staramr-pointfinder.tsv is optional.
+        Each AMR analysis should have at least five Result file objects, and a last one of its PointFinder results:
+        staramr-pointfinder.tsv if the analysis has one, otherwise staramr-excel.xlsx, which is only downloaded if the
+        settings of the analysis show it searched for PointFinder point mutations.
         This function accepts analysis_id with COMPLETED analysis status and an AMR_DETECTION type,
             otherwise, it will thrown an exception.
+        The output file links are resolved from a single analysis response. If the analysis result dictionary
+        (eg. from get_completed_amr_analysis_results()) is given, its links are reused and only the file contents
+        are requested.
+        With sheet_names, only the results files of those sheets are requested.
         :param analysis_id:
+        :param analysis_result: optional, the analysis result dictionary of analysis_id including its links
+        :param sheet_names: optional list of sheet names (see SHEET_NAMES), defaults to every sheet
         :return result_files: an array of Results object
         """
 
-        file_list = [
-            "staramr-resfinder.tsv",
-            "staramr-detailed-summary.tsv",
-            "staramr-settings.txt",
-            "staramr-summary.tsv",
-            "staramr-plasmidfinder.tsv",
-            "staramr-mlst.tsv",
-            "staramr-excel.xlsx"
-        ]
+        file_links = []  # [ (file key, link), ... ]
 
-        result_files = []
+        # get file links of the analysis base on OUTPUT_FILE_KEYS
+        output_file_links = self._get_output_file_links(analysis_id, analysis_result)
 
-        # get file urls base on file_list
-        for file_key in file_list:
-            try:
-                file_url = self._get_file_url(analysis_id, file_key)
-            except exceptions.IridaKeyError:
+        for file_key in OUTPUT_FILE_KEYS:
+            if sheet_names is not None and SHEET_NAMES[file_key] not in sheet_names:
+                continue
+
+            if file_key not in output_file_links:
                 """
-                Catches an exception if an analysis submission does not contain an analysis result.
-                For our case, this shouldn't happen since we use analysis_id with COMPLETED analysis status and 
+                For our case, this shouldn't happen since we use analysis_id with COMPLETED analysis status and
                 an AMR_DETECTION type given by the caller (downloader).
                 """
-                logging.error(f"No analysis result exists for analysis id "
+                logging.error(f"No {file_key} output file exists for analysis id "
                               f"[{analysis_id}]. Check analysis id [{analysis_id}] "
                               f"and ensure the analysis status is COMPLETED and with type AMR_DETECTION.")
+                continue
+
+            file_links.append((file_key, output_file_links[file_key]))
 
-            # response containing json
-            response_json = self._session.get(file_url)
+        pointfinder_file_key = next((file_key for file_key in POINTFINDER_FILE_KEYS if file_key in output_file_links),
+                                    None)
+        if sheet_names is not None and "PointFinder" not in sheet_names:
+            pointfinder_file_key = None
+        elif pointfinder_file_key is None:
+            logging.error(f"No staramr-pointfinder.tsv or staramr-excel.xlsx output file exists for analysis id "
+                          f"[{analysis_id}]. Check analysis id [{analysis_id}] "
+                          f"and ensure the analysis status is COMPLETED and with type AMR_DETECTION.")
+        elif pointfinder_file_key != "staramr-excel.xlsx":
+            file_links.append((pointfinder_file_key, output_file_links[pointfinder_file_key]))
 
-            # response containing text (actual file contents)
-            response_txt = self._session.get(file_url, headers={"Accept": "text/plain"})
+        file_contents = self._get_file_contents(analysis_id, file_links)
 
-            # create output object
-            output = Result(file_json=response_json.json()["resource"],
-                            file_txt=response_txt.content,
-                            file_key=file_key)
-            result_files.append(output)
+        # create output objects
+        result_files = [Result(file_json=file_link, file_txt=file_content, file_key=file_key)
+                        for (file_key, file_link), file_content in zip(file_links, file_contents)]
+
+        if pointfinder_file_key == "staramr-excel.xlsx":
+            result_files.append(self._get_excel_result_file(analysis_id, output_file_links, result_files))
 
         return result_files
 
-    def _get_file_url(self, analysis_id, file_key):
+    def _get_excel_result_file(self, analysis_id, output_file_links, result_files):
+        """
+        Returns the Result of staramr-excel.xlsx, which is only requested if the settings of the analysis show it
+        searched for PointFinder point mutations. Otherwise, the Result has no contents and its sheet is empty.
+        :param analysis_id: integer
+        :param output_file_links: dictionary of file key to link, see _get_output_file_links()
+        :param result_files: the other Result of the analysis. If staramr-settings.txt is not one of them, it is
+            requested to check the settings, but not returned.
+        :return result_file:
+        """
+        excel_file_link = output_file_links["staramr-excel.xlsx"]
+        settings_file = next((r for r in result_files if r.get_file_name() == "staramr-settings.txt"), None)
+        if settings_file is None and "staramr-settings.txt" in output_file_links:
+            settings_link = output_file_links["staramr-settings.txt"]
+            settings_content, = self._get_file_contents(analysis_id, [("staramr-settings.txt", settings_link)])
+            settings_file = Result(file_json=settings_link, file_txt=settings_content, file_key="staramr-settings.txt")
+
+        settings = settings_file.get_contents() if settings_file is not None else None
+        if settings is not None and not is_pointfinder_enabled(settings):
+            logging.debug(f"Analysis [{analysis_id}] did not search for PointFinder point mutations, "
+                          f"staramr-excel.xlsx is not downloaded.")
+            return Result(file_json=excel_file_link, file_txt=None, file_key="staramr-excel.xlsx")
+
+        file_content, = self._get_file_contents(analysis_id, [("staramr-excel.xlsx", excel_file_link)])
+        return Result(file_json=excel_file_link, file_txt=file_content, file_key="staramr-excel.xlsx")
+
+    def _get_file_contents(self, analysis_id, file_links):
+        """
+        Returns the contents of the results files of an analysis, one at a time, see _get_file_content().
+        :param analysis_id: integer
+        :param file_links: list of (file key, link) tuples
+        :return file_contents: list of bytes, in the order of file_links
+        """
+        return [self._get_file_content(analysis_id, file_key, file_link["href"]) for file_key, file_link in file_links]
+
+    def _get_file_content(self, analysis_id, file_key, file_url):
         """
-        Returns a URL of a file given an file key (file name with extension)
+        Returns the contents of a results file, from the result cache if it has it, otherwise from IRIDA.
         :param analysis_id: integer
         :param file_key: string, file name (eg. staramr-resfinder.tsv)
-        :return file_url: string
+        :param file_url: url of the file
+        :return file_content: bytes
         """
-        if not self.analysis_submission_url:
-            logging.debug("Requesting analysis submissions url.")
-            self.analysis_submission_url = self._get_link(self.base_url, "analysisSubmissions")
+        if self.result_cache is not None:
+            file_content = self.result_cache.get(self.base_url, analysis_id, file_key)
+            if file_content is not None:
+                return file_content
+
+        # response containing text (actual file contents)
+        file_content = self._get_existing_url(file_url, headers={"Accept": "text/plain"}).content
+
+        if self.result_cache is not None:
+            self.result_cache.put(self.base_url, analysis_id, file_key, file_content)
+
+        return file_content
+
+    def _get_output_file_links(self, analysis_id, analysis_result=None):
+        """
+        Returns the output file links of an analysis as a dictionary of file key (file name with extension) to link.
+        eg. { "staramr-resfinder.tsv": {"rel": "outputFile/staramr-resfinder.tsv", "href": ...}, ... }
+        :param analysis_id: integer
+        :param analysis_result: optional, the analysis result dictionary including its links.
+            If not given, it is requested using the submission id of analysis_id.
+        :return output_file_links: dictionary
+        """
+        if analysis_result is None or "links" not in analysis_result:
+            analysis_result_url = self.get_analysis_results_url(self.target_submission_ids[analysis_id])
+            analysis_result = self._get_existing_url(analysis_result_url).json()["resource"]
 
-        analysis_result_url = self.get_analysis_results_url(self.target_submission_ids[analysis_id])
+        output_file_links = {}
+        for link in analysis_result["links"]:
+            if link["rel"].startswith("outputFile/"):
+                output_file_links[link["rel"][len("outputFile/"):]] = link
 
-        file_url = self._get_link(analysis_result_url, "outputFile/" + file_key)
-        return file_url
+        return output_file_links
 
     def get_analysis_results_url(self, analysis_submission_id):
         """
@@ -476,7 +899,7 @@ class IridaAPI(object):
         """
         if not self.analysis_submission_url:
             logging.debug("Requesting analysis submissions url.")
-            self.analysis_submission_url = self._get_link(self.base_url, "analysisSubmissions")
+            self.analysis_submission_url = self._get_cached_link(self.base_url, "analysisSubmissions")
 
         return f"{self.analysis_submission_url}/{analysis_submission_id}/analysis"
 
@@ -488,4 +911,5 @@ class IridaAPI(object):
         :param submission_id: analysis submission id
         :return None:
         """
-        self.target_submission_ids[results_id] = submission_id
+        with self._target_submission_ids_lock:
+            self.target_submission_ids[results_id] = submission_id
@@ -0,0 +1,169 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Response statuses of an overloaded or unavailable IRIDA, the requests are sent again after a backoff.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Lowest rate (requests per second) an overloaded IRIDA slows the requests down to.
+MIN_RATE = 0.2
+
+# Number of seconds after slowing down during which other overloaded responses don't slow down again, so the
+# responses to requests sent at the same time only count once.
+OVERLOAD_COOLDOWN = 1
+
+# Fraction of the configured rate added back with each successful response.
+RATE_INCREASE = 0.05
+
+
+class RateLimiter(object):
+    """
+    Token bucket limiting the number of requests sent per second to IRIDA, shared by every thread and coroutine using
+    an IridaAPI. The bucket holds up to one second of requests, so short bursts are allowed.
+    The rate adapts to the load of IRIDA: when it responds that it is overloaded (see RETRY_STATUSES), the rate is
+    halved, down to MIN_RATE, and each successful response adds back a small fraction of the configured rate.
+    Without a configured rate, requests are not limited until IRIDA is first overloaded, which starts limiting at half
+    the rate requests were sent during the previous second. Once the rate grows back to that, it is unlimited again.
+    """
+
+    def __init__(self, requests_per_second=None):
+        """
+        :param requests_per_second: maximum rate of requests, or None to only slow down when IRIDA is overloaded
+        """
+        self.max_rate = requests_per_second
+        self.rate = requests_per_second
+
+        self._lock = threading.Lock()
+        self._tokens = 0 if requests_per_second is None else max(1.0, requests_per_second)
+        self._last_refill = time.monotonic()
+        self._last_overload = None
+        self._unlimited_rate = None  # rate above which requests are unlimited again, when no rate is configured
+        self._sent = deque()  # times of the requests sent during the last second, while unlimited
+
+    def reserve(self):
+        """
+        Reserves the next request, without waiting.
+        :return delay: number of seconds to wait before sending the request
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.rate is None:
+                self._sent.append(now)
+                while self._sent[0] < now - 1:
+                    self._sent.popleft()
+                return 0
+
+            self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens = self._tokens - 1
+
+            return 0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        """
+        Waits until the next request can be sent.
+        """
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def on_overload(self):
+        """
+        Slows the requests down after IRIDA responded that it is overloaded.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._last_overload is not None and now - self._last_overload < OVERLOAD_COOLDOWN:
+                return
+            self._last_overload = now
+
+            if self.rate is None:
+                while self._sent and self._sent[0] < now - 1:
+                    self._sent.popleft()
+                self._unlimited_rate = max(MIN_RATE, float(len(self._sent)))
+                self._sent.clear()
+                self.rate = self._unlimited_rate
+                self._tokens = 0
+                self._last_refill = now
+
+            self.rate = max(MIN_RATE, self.rate / 2)
+            logging.info(f"IRIDA is overloaded, slowing down to {self.rate:.1f} requests per second.")
+
+    def on_success(self):
+        """
+        Speeds the requests back up after a successful response, up to the configured rate.
+        """
+        with self._lock:
+            if self.rate is None:
+                return
+
+            ceiling = self.max_rate if self.max_rate is not None else self._unlimited_rate
+            self.rate = min(ceiling, self.rate + ceiling * RATE_INCREASE)
+
+            if self.max_rate is None and self.rate >= ceiling:
+                logging.debug("IRIDA recovered, requests are no longer limited.")
+                self.rate = None
+
+
+class RetryPolicy(object):
+    """
+    When and how long to wait before sending again a request that IRIDA could not answer (see RETRY_STATUSES) or that
+    could not connect. Waits are exponential backoffs with full jitter, a random time between 0 and
+    backoff_factor * 2 ** attempt seconds, so clients that failed together don't retry together. A Retry-After header
+    is honoured, up to max_backoff seconds.
+    """
+
+    def __init__(self, max_retries=5, backoff_factor=0.5, max_backoff=60, retry_statuses=RETRY_STATUSES):
+        """
+        :param max_retries: number of times a request is sent again
+        :param backoff_factor: number of seconds of the first backoff, doubled with each attempt
+        :param max_backoff: maximum number of seconds waited before an attempt
+        :param retry_statuses: response statuses retried
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retry_statuses = retry_statuses
+
+    def is_retryable(self, status_code):
+        return status_code in self.retry_statuses
+
+    def get_delay(self, attempt, retry_after=None):
+        """
+        Returns the number of seconds to wait before sending a request again.
+        :param attempt: number of times the request was already retried, starting at 0
+        :param retry_after: optional value of the Retry-After header of the response, seconds or an HTTP date
+        :return delay:
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+        retry_after_seconds = _parse_retry_after(retry_after)
+        if retry_after_seconds is not None:
+            delay = max(delay, min(self.max_backoff, retry_after_seconds))
+
+        return delay
+
+
+def _parse_retry_after(retry_after):
+    """
+    Returns the number of seconds of a Retry-After header, or None if there is none or it can't be parsed.
+    """
+    if retry_after is None:
+        return None
+
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+
+    try:
+        retry_date = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if retry_date.tzinfo is None:
+        retry_date = retry_date.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_date - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,267 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Cache directory used when none is given, following the XDG base directory specification.
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+                                 "irida-staramr-results")
+
+# Maximum size of the cached file contents (in bytes) before the least recently used files are evicted.
+DEFAULT_CACHE_MAX_SIZE = 2 * 1024 ** 3
+
+# Maximum size of the cached responses (in bytes) before the least recently used responses are evicted.
+DEFAULT_RESPONSE_CACHE_MAX_SIZE = 256 * 1024 ** 2
+
+
+class _SQLiteCache(object):
+    """
+    Base of the persistent caches stored in a SQLite database in cache_dir, in table TABLE_NAME which has size and
+    last_access columns and the primary key KEY_COLUMNS. When the cached contents grow over max_size, the least recently
+    used rows are evicted. The total size of the cached contents is kept up to date as rows are stored and deleted, so
+    the table is only scanned when it is over max_size.
+    """
+
+    DATABASE_NAME = None
+    TABLE_NAME = None
+    KEY_COLUMNS = None
+
+    def __init__(self, cache_dir, max_size):
+        """
+        Opens the cache in cache_dir, creating it if it does not exist.
+        :param cache_dir: directory of the cache database
+        :param max_size: maximum size of the cached contents in bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(os.path.join(cache_dir, self.DATABASE_NAME), check_same_thread=False)
+        with self._connection:
+            self._create_table()
+            self._connection.execute(f"CREATE INDEX IF NOT EXISTS {self.TABLE_NAME}_last_access "
+                                     f"ON {self.TABLE_NAME} (last_access)")
+        self._key_condition = " AND ".join(f"{column} = ?" for column in self.KEY_COLUMNS)
+        self._total_size = self._get_total_size()
+
+    def _create_table(self):
+        raise NotImplementedError
+
+    def _get_total_size(self):
+        return self._connection.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.TABLE_NAME}").fetchone()[0]
+
+    def _insert(self, key, values, size):
+        """
+        Inserts a row, replacing the row of the same key, and adds its size to the total size.
+        Must be called with the lock held, within a transaction.
+        :param key: tuple of the values of KEY_COLUMNS
+        :param values: tuple of the values of the other columns, in the order of the table
+        :param size: size of the contents of the row, its size column
+        """
+        row = self._connection.execute(f"SELECT size FROM {self.TABLE_NAME} WHERE {self._key_condition}",
+                                       key).fetchone()
+        self._connection.execute(f"INSERT OR REPLACE INTO {self.TABLE_NAME} "
+                                 f"VALUES ({', '.join('?' * (len(key) + len(values)))})", key + values)
+        self._total_size = self._total_size + size - (row[0] if row is not None else 0)
+
+    def _delete(self, key):
+        """
+        Deletes a row, and removes its size from the total size.
+        Must be called with the lock held, within a transaction.
+        :param key: tuple of the values of KEY_COLUMNS
+        """
+        row = self._connection.execute(f"SELECT size FROM {self.TABLE_NAME} WHERE {self._key_condition}",
+                                       key).fetchone()
+        if row is not None:
+            self._connection.execute(f"DELETE FROM {self.TABLE_NAME} WHERE {self._key_condition}", key)
+            self._total_size = self._total_size - row[0]
+
+    def _evict(self):
+        """
+        Deletes the least recently used rows until the cached contents fit in max_size.
+        Must be called with the lock held, within a transaction.
+        """
+        if self._total_size <= self.max_size:
+            return
+
+        # other processes may have stored or evicted rows of the same database
+        total_size = self._get_total_size()
+        evicted = []
+        least_recently_used = self._connection.execute(f"SELECT rowid, size FROM {self.TABLE_NAME} "
+                                                       f"ORDER BY last_access, rowid")
+        for rowid, size in least_recently_used:
+            if total_size <= self.max_size:
+                break
+            evicted.append((rowid,))
+            total_size = total_size - size
+
+        logging.debug(f"Evicting {len(evicted)} rows from the {self.TABLE_NAME} cache.")
+        self._connection.executemany(f"DELETE FROM {self.TABLE_NAME} WHERE rowid = ?", evicted)
+        self._total_size = total_size
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class ResultFileCache(_SQLiteCache):
+    """
+    Persistent cache of analysis results files contents, stored in a SQLite database in cache_dir.
+    Outputs of a COMPLETED analysis never change in IRIDA, so files are keyed by server url, analysis id and file key
+    (file name with extension), and never expire. Each file is stored with its sha256 digest, which is verified when
+    the file is read. When the cached contents grow over max_size, the least recently used files are evicted.
+    """
+
+    DATABASE_NAME = "results-cache.sqlite3"
+    TABLE_NAME = "result_files"
+    KEY_COLUMNS = ("server", "analysis_id", "file_key")
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size=DEFAULT_CACHE_MAX_SIZE):
+        """
+        Opens the cache in cache_dir, creating it if it does not exist.
+        :param cache_dir: directory of the cache database
+        :param max_size: maximum size of the cached file contents in bytes
+        """
+        super().__init__(cache_dir, max_size)
+
+    def _create_table(self):
+        self._connection.execute("CREATE TABLE IF NOT EXISTS result_files ("
+                                 "server TEXT NOT NULL, "
+                                 "analysis_id INTEGER NOT NULL, "
+                                 "file_key TEXT NOT NULL, "
+                                 "content BLOB NOT NULL, "
+                                 "size INTEGER NOT NULL, "
+                                 "sha256 TEXT NOT NULL, "
+                                 "last_access REAL NOT NULL, "
+                                 "PRIMARY KEY (server, analysis_id, file_key))")
+
+    def get(self, server, analysis_id, file_key):
+        """
+        Returns the cached contents of a file, or None if the file is not cached or failed its integrity check.
+        :param server: url of the IRIDA server
+        :param analysis_id: integer
+        :param file_key: string, file name (eg. staramr-resfinder.tsv)
+        :return content: bytes
+        """
+        key = (server, analysis_id, file_key)
+        with self._lock:
+            row = self._connection.execute("SELECT content, sha256 FROM result_files "
+                                           "WHERE server = ? AND analysis_id = ? AND file_key = ?", key).fetchone()
+            if row is None:
+                return None
+
+            content, sha256 = row
+            with self._connection:
+                if hashlib.sha256(content).hexdigest() != sha256:
+                    logging.warning(f"Cached {file_key} of analysis [{analysis_id}] is corrupted, "
+                                    f"it will be downloaded again.")
+                    self._delete(key)
+                    return None
+
+                self._connection.execute("UPDATE result_files SET last_access = ? "
+                                         "WHERE server = ? AND analysis_id = ? AND file_key = ?", (time.time(),) + key)
+
+        logging.debug(f"Using cached {file_key} of analysis [{analysis_id}].")
+        return bytes(content)
+
+    def put(self, server, analysis_id, file_key, content):
+        """
+        Stores the contents of a file, then evicts the least recently used files if the cache is over max_size.
+        :param server: url of the IRIDA server
+        :param analysis_id: integer
+        :param file_key: string, file name (eg. staramr-resfinder.tsv)
+        :param content: bytes
+        :return None:
+        """
+        if len(content) > self.max_size:
+            return
+
+        with self._lock, self._connection:
+            self._insert((server, analysis_id, file_key),
+                         (content, len(content), hashlib.sha256(content).hexdigest(), time.time()), len(content))
+            self._evict()
+
+
+class ResponseCache(_SQLiteCache):
+    """
+    Persistent cache of the responses of IRIDA's navigation endpoints (eg. the links of the base url, the projects
+    listing or the analysis submissions of a project), stored with their ETag and Last-Modified validators in a SQLite
+    database in cache_dir. The validators are sent with the next request of the url, and IRIDA answers 304 Not Modified
+    instead of the whole response if it did not change.
+    Listings depend on what the user can access, so responses are keyed by username and url. Each response is stored
+    with its sha256 digest, which is verified when it is read. When the cached responses grow over max_size, the least
+    recently used responses are evicted.
+    """
+
+    DATABASE_NAME = "responses-cache.sqlite3"
+    TABLE_NAME = "responses"
+    KEY_COLUMNS = ("username", "url")
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size=DEFAULT_RESPONSE_CACHE_MAX_SIZE):
+        """
+        Opens the cache in cache_dir, creating it if it does not exist.
+        :param cache_dir: directory of the cache database
+        :param max_size: maximum size of the cached responses in bytes
+        """
+        super().__init__(cache_dir, max_size)
+
+    def _create_table(self):
+        self._connection.execute("CREATE TABLE IF NOT EXISTS responses ("
+                                 "username TEXT NOT NULL, "
+                                 "url TEXT NOT NULL, "
+                                 "etag TEXT, "
+                                 "last_modified TEXT, "
+                                 "content BLOB NOT NULL, "
+                                 "size INTEGER NOT NULL, "
+                                 "sha256 TEXT NOT NULL, "
+                                 "last_access REAL NOT NULL, "
+                                 "PRIMARY KEY (username, url))")
+
+    def get(self, username, url):
+        """
+        Returns the cached response of a url, or None if it is not cached or failed its integrity check.
+        :param username: IRIDA account the response was requested by
+        :param url:
+        :return etag, last_modified, content: validators (None if IRIDA did not send one) and bytes of the response
+        """
+        key = (username, url)
+        with self._lock:
+            row = self._connection.execute("SELECT etag, last_modified, content, sha256 FROM responses "
+                                           "WHERE username = ? AND url = ?", key).fetchone()
+            if row is None:
+                return None
+
+            etag, last_modified, content, sha256 = row
+            with self._connection:
+                if hashlib.sha256(content).hexdigest() != sha256:
+                    logging.warning(f"Cached response of {url} is corrupted, it will be requested again.")
+                    self._delete(key)
+                    return None
+
+                self._connection.execute("UPDATE responses SET last_access = ? WHERE username = ? AND url = ?",
+                                         (time.time(),) + key)
+
+        return etag, last_modified, bytes(content)
+
+    def put(self, username, url, etag, last_modified, content):
+        """
+        Stores a response with its validators, then evicts the least recently used responses if the cache is over
+        max_size. Responses without any validator can't be revalidated, they are not stored.
+        :param username: IRIDA account the response was requested by
+        :param url:
+        :param etag: value of the ETag header, or None
+        :param last_modified: value of the Last-Modified header, or None
+        :param content: bytes
+        :return None:
+        """
+        if (etag is None and last_modified is None) or len(content) > self.max_size:
+            return
+
+        with self._lock, self._connection:
+            self._insert((username, url),
+                         (etag, last_modified, content, len(content), hashlib.sha256(content).hexdigest(),
+                          time.time()), len(content))
+            self._evict()
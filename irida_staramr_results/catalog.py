@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from irida_staramr_results import filter
+from irida_staramr_results.cache import DEFAULT_CACHE_DIR
+
+# Catalog file used when none is given.
+DEFAULT_CATALOG_FILE = os.path.join(DEFAULT_CACHE_DIR, "catalog.sqlite3")
+
+
+class SubmissionCatalog(object):
+    """
+    Local SQLite catalog of the analysis submissions of projects and of their analysis results (type, created date and
+    output file links), kept up to date by sync_project(). Exports can then find the analyses to download in the
+    catalog and only request the results files from IRIDA.
+    Analysis results of COMPLETED submissions never change, so each sync only requests the analysis results of
+    submissions that completed since the previous sync. Everything is keyed by server url, so one catalog can hold
+    projects of several IRIDA servers.
+    """
+
+    def __init__(self, catalog_path=DEFAULT_CATALOG_FILE):
+        """
+        Opens the catalog, creating it if it does not exist.
+        :param catalog_path: path of the catalog database
+        """
+        self.catalog_path = catalog_path
+
+        catalog_dir = os.path.dirname(catalog_path)
+        if catalog_dir:
+            os.makedirs(catalog_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._indexes = {}  # { (server, project_id) : filter.SubmissionIndex }
+        self._connection = sqlite3.connect(catalog_path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS projects ("
+                                     "server TEXT NOT NULL, "
+                                     "project_id TEXT NOT NULL, "
+                                     "synced_at REAL NOT NULL, "
+                                     "PRIMARY KEY (server, project_id))")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS submissions ("
+                                     "server TEXT NOT NULL, "
+                                     "project_id TEXT NOT NULL, "
+                                     "submission_id TEXT NOT NULL, "
+                                     "name TEXT, "
+                                     "analysis_state TEXT NOT NULL, "
+                                     "created_date INTEGER, "
+                                     "submission TEXT NOT NULL, "
+                                     "PRIMARY KEY (server, project_id, submission_id))")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS analysis_results ("
+                                     "server TEXT NOT NULL, "
+                                     "submission_id TEXT NOT NULL, "
+                                     "analysis_id TEXT NOT NULL, "
+                                     "analysis_type TEXT, "
+                                     "created_date INTEGER, "
+                                     "analysis_result TEXT NOT NULL, "
+                                     "PRIMARY KEY (server, submission_id))")
+
+    def sync_project(self, irida_api, project_id, show_progress=True):
+        """
+        Updates the analysis submissions of a project from IRIDA, then requests the analysis results of the COMPLETED
+        submissions the catalog doesn't have yet. Submissions deleted from the project are removed.
+        Analysis results that could not be requested are requested again by the next sync.
+        :param irida_api: IridaAPI
+        :param project_id: integer
+        :param show_progress: boolean, print a progress bar
+        :return counts: dictionary of the number of submissions, new submissions, removed submissions and analysis
+            results added to the catalog
+        """
+        server = irida_api.base_url
+        project_id = str(project_id)
+
+        logging.info(f"Requesting project [{project_id}]'s analysis submissions.")
+        analysis_submissions = list(irida_api.iter_project_analysis_submissions(project_id))
+        submission_ids = {str(s["identifier"]) for s in analysis_submissions}
+
+        with self._lock, self._connection:
+            known_submission_ids = {row[0] for row in self._connection.execute(
+                "SELECT submission_id FROM submissions WHERE server = ? AND project_id = ?", (server, project_id))}
+            removed_submission_ids = known_submission_ids - submission_ids
+
+            self._connection.executemany("INSERT OR REPLACE INTO submissions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                         [(server, project_id, str(s["identifier"]), s.get("name"),
+                                           s["analysisState"], s.get("createdDate"), json.dumps(s))
+                                          for s in analysis_submissions])
+            self._connection.executemany("DELETE FROM submissions "
+                                         "WHERE server = ? AND project_id = ? AND submission_id = ?",
+                                         [(server, project_id, i) for i in removed_submission_ids])
+
+            cataloged_submission_ids = {row[0] for row in self._connection.execute(
+                "SELECT r.submission_id FROM analysis_results r JOIN submissions s "
+                "ON r.server = s.server AND r.submission_id = s.submission_id "
+                "WHERE s.server = ? AND s.project_id = ?", (server, project_id))}
+
+        missing_analysis_submissions = [s for s in analysis_submissions
+                                        if s["analysisState"] == "COMPLETED"
+                                        and str(s["identifier"]) not in cataloged_submission_ids]
+        logging.info(f"Requesting {len(missing_analysis_submissions)} new analysis results of project [{project_id}].")
+        analysis_results = irida_api.get_analysis_results(missing_analysis_submissions, show_progress)
+
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO analysis_results VALUES (?, ?, ?, ?, ?, ?)",
+                                         [(server, str(s["identifier"]), str(r.get("identifier")),
+                                           r.get("analysisType", {}).get("type"), r.get("createdDate"),
+                                           json.dumps(r))
+                                          for s, r in analysis_results])
+            self._connection.execute("INSERT OR REPLACE INTO projects VALUES (?, ?, ?)",
+                                     (server, project_id, time.time()))
+            self._indexes.pop((server, project_id), None)
+
+        counts = {"submissions": len(submission_ids),
+                  "new_submissions": len(submission_ids - known_submission_ids),
+                  "removed_submissions": len(removed_submission_ids),
+                  "analysis_results": len(analysis_results)}
+        logging.info(f"Synchronized project [{project_id}]: {counts['submissions']} analysis submissions "
+                     f"({counts['new_submissions']} new, {counts['removed_submissions']} removed), "
+                     f"{counts['analysis_results']} analysis results added.")
+        if len(analysis_results) < len(missing_analysis_submissions):
+            logging.warning(f"{len(missing_analysis_submissions) - len(analysis_results)} analysis results could not "
+                            f"be requested, they will be requested again by the next sync.")
+
+        return counts
+
+    def get_synced_at(self, server, project_id):
+        """
+        Returns the unix time (in seconds) of the last sync of the project, or None if it was never synchronized.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT synced_at FROM projects WHERE server = ? AND project_id = ?",
+                                           (server, str(project_id))).fetchone()
+        return None if row is None else row[0]
+
+    def _get_index(self, server, project_id):
+        """
+        Returns the analysis submissions of a project as a filter.SubmissionIndex, in order of submission id.
+        The index is kept until the project is synchronized again, so repeated queries reuse it.
+        """
+        key = (server, str(project_id))
+        with self._lock:
+            if key not in self._indexes:
+                rows = self._connection.execute("SELECT submission FROM submissions "
+                                                "WHERE server = ? AND project_id = ? "
+                                                "ORDER BY CAST(submission_id AS INTEGER), submission_id", key)
+                self._indexes[key] = filter.SubmissionIndex(json.loads(row[0]) for row in rows)
+            return self._indexes[key]
+
+    def get_completed_amr_analysis_results(self, server, project_id, submission_filter=None, submission_query=None,
+                                           failed_submission_ids=None):
+        """
+        Returns the COMPLETED analysis results of AMR DETECTION type of a project from the catalog, like
+        IridaAPI.get_completed_amr_analysis_results(), in order of submission id.
+        :param server: url of the IRIDA server
+        :param project_id: integer
+        :param submission_filter: optional function selecting analysis submissions, called only with the submissions
+            accepted by submission_query, so an ExportState's filter does not record submissions the query rejects
+        :param submission_query: optional filter.Predicate selecting analysis submissions with the catalog's index
+        :param failed_submission_ids: optional set, the ids of COMPLETED submissions without an analysis result in the
+            catalog are added to it
+        :return completed_amr_analysis_results: list of analysis result dictionaries
+        :raises LookupError: if the project was never synchronized
+        """
+        if self.get_synced_at(server, project_id) is None:
+            raise LookupError(f"Project [{project_id}] is not in the catalog {self.catalog_path}, synchronize it "
+                              f"first with: irida-staramr-results sync -p {project_id}")
+
+        index = self._get_index(server, project_id)
+        if submission_query is not None:
+            analysis_submissions = index.select(submission_query)
+        else:
+            analysis_submissions = index.analysis_submissions
+
+        completed_submission_ids = [str(s["identifier"]) for s in analysis_submissions
+                                    if (submission_filter is None or submission_filter(s))
+                                    and s["analysisState"] == "COMPLETED"]
+
+        analysis_results = {}
+        with self._lock:
+            # in batches, to stay under SQLite's limit of query parameters
+            for start in range(0, len(completed_submission_ids), 500):
+                batch = completed_submission_ids[start:start + 500]
+                rows = self._connection.execute(f"SELECT submission_id, analysis_type, analysis_result "
+                                                f"FROM analysis_results WHERE server = ? "
+                                                f"AND submission_id IN ({', '.join('?' * len(batch))})",
+                                                [server] + batch)
+                for submission_id, analysis_type, analysis_result in rows:
+                    analysis_results[submission_id] = (analysis_type, analysis_result)
+
+        missing_submission_ids = [i for i in completed_submission_ids if i not in analysis_results]
+        if missing_submission_ids:
+            logging.warning(f"The analysis results of {len(missing_submission_ids)} analysis submissions of project "
+                            f"[{project_id}] are not in the catalog, synchronize it again to export them.")
+            if failed_submission_ids is not None:
+                failed_submission_ids.update(missing_submission_ids)
+
+        completed_amr_analysis_results = [json.loads(analysis_results[i][1]) for i in completed_submission_ids
+                                          if i in analysis_results and analysis_results[i][0] == "AMR_DETECTION"]
+
+        logging.info(f"{len(completed_amr_analysis_results)} completed StarAMR analysis results were found in the "
+                     f"catalog for project [{project_id}].")
+
+        return completed_amr_analysis_results
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -1,9 +1,14 @@
 import argparse
 import logging
+import sqlite3
 import sys
 
 from irida_staramr_results.version import __version__
-from irida_staramr_results import downloader, api, parser, validate
+from irida_staramr_results import downloader, api, parser, validate, columnar
+from irida_staramr_results.cache import ResultFileCache, ResponseCache, DEFAULT_CACHE_DIR
+from irida_staramr_results.catalog import SubmissionCatalog, DEFAULT_CATALOG_FILE
+from irida_staramr_results.model.result import SHEET_NAMES
+from irida_staramr_results.state import ExportState, DEFAULT_STATE_FILE
 
 
 logging.basicConfig(format='%(asctime)s %(levelname)-8s %(message)s',
@@ -14,12 +19,20 @@ logging.basicConfig(format='%(asctime)s %(levelname)-8s %(message)s',
 def init_argparser():
     argument_parser = argparse.ArgumentParser(
         prog="irida-staramr-results",
-        description="Exports StarAMR results available through IRIDA into a single excel report."
+        description="Exports StarAMR results available through IRIDA into a single excel report.",
+        epilog="Run 'irida-staramr-results sync --help' to keep a local catalog of the projects' analyses."
     )
     argument_parser.add_argument("-v", "--version", action="version", version=f"{argument_parser.prog} {__version__}",
                                  help="The current version of irida-staramr-results.")
-    argument_parser.add_argument("-p", "--project", action="store", required=True, type=int,
-                                 help="Required. Project(s) to scan for StarAMR results.")
+    argument_parser.add_argument("-p", "--project", action="store", nargs="+", type=int,
+                                 help="Project(s) to scan for StarAMR results. Required unless --project_file is "
+                                      "given.")
+    argument_parser.add_argument("-pf", "--project_file", action="store",
+                                 help="Path to a file listing the project(s) to scan for StarAMR results, "
+                                      "separated by spaces or new lines.")
+    argument_parser.add_argument("-m", "--merge", action="store_true",
+                                 help="Export the results of every project to the same output file, instead of one "
+                                      "output file per project.")
     argument_parser.add_argument("-o", "--output", action="store", default="output",
                                  help="The name of the output excel file.")
     argument_parser.add_argument("-u", "--username", action="store",
@@ -31,12 +44,82 @@ def init_argparser():
     argument_parser.add_argument("-sr", "--split_results", action="store_true",
                                  help="Export each analysis results into separate output files resulting to "
                                       "one excel file per analysis.")
+    argument_parser.add_argument("-pc", "--processes", action="store", type=int,
+                                 help="The number of processes writing the output files of --split_results. "
+                                      "Only applies to --split_results. Defaults to the number of CPUs.")
     argument_parser.add_argument("-fd", "--from_date", action="store",
                                  help="Download only results of the analysis that were created FROM this date (YYYY-MM-DD).")
     argument_parser.add_argument("-td", "--to_date", action="store",
                                  help="Download only results of the analysis that were created UP UNTIL this date (YYYY-MM-DD).")
+    argument_parser.add_argument("-q", "--query", action="store",
+                                 help="Download only results of the analysis submissions matching this filter "
+                                      "expression, eg. 'name ~ \"salmonella*\" and not id in [12, 15]'.")
+    argument_parser.add_argument("-w", "--workers", action="store", default=1, type=int,
+                                 help="The number of concurrent requests made to IRIDA. Defaults to 1.")
+    argument_parser.add_argument("-a", "--async_requests", action="store_true",
+                                 help="Send the requests of analyses and results files from an asynchronous client, "
+                                      "so --workers can be raised to hundreds of concurrent requests. "
+                                      "Requires aiohttp.")
+    argument_parser.add_argument("-ct", "--catalog", action="store", nargs="?", const=DEFAULT_CATALOG_FILE,
+                                 help=f"Find the analyses to export in a catalog kept by the sync command, instead "
+                                      f"of requesting them from IRIDA. Defaults to {DEFAULT_CATALOG_FILE} if no "
+                                      f"path is given.")
+    argument_parser.add_argument("-cd", "--cache_dir", action="store", default=DEFAULT_CACHE_DIR,
+                                 help=f"Directory where downloaded results files and listings are cached. "
+                                      f"Defaults to {DEFAULT_CACHE_DIR}.")
+    argument_parser.add_argument("-nc", "--no_cache", action="store_true",
+                                 help="Download every results file and listing from IRIDA without using the cache.")
+    argument_parser.add_argument("-i", "--incremental", action="store_true",
+                                 help="Download only the analysis submissions that were not exported by previous "
+                                      "incremental runs, and append them to the previous output file.")
+    argument_parser.add_argument("-sf", "--state_file", action="store", default=DEFAULT_STATE_FILE,
+                                 help=f"The file recording what incremental runs exported. "
+                                      f"Defaults to {DEFAULT_STATE_FILE}.")
+    argument_parser.add_argument("-f", "--format", action="store", nargs="+", default=["xlsx"],
+                                 choices=columnar.OUTPUT_FORMATS,
+                                 help="Format(s) of the output files. Formats other than xlsx write one file per "
+                                      "sheet. Defaults to xlsx.")
+    argument_parser.add_argument("-s", "--sheets", action="store", nargs="+", metavar="SHEET",
+                                 choices=list(dict.fromkeys(SHEET_NAMES.values())),
+                                 help=f"Sheet(s) to export, any of {', '.join(dict.fromkeys(SHEET_NAMES.values()))}. "
+                                      f"Results files of the other sheets are not downloaded. Defaults to every sheet.")
+    argument_parser.add_argument("-r", "--resume", action="store",
+                                 help="Output directory of an interrupted run of the same command. Its output files "
+                                      "are finished without downloading again the analyses already written.")
+
+    return argument_parser
 
 
+def init_sync_argparser():
+    argument_parser = argparse.ArgumentParser(
+        prog="irida-staramr-results sync",
+        description="Updates a local catalog of the analysis submissions and analysis results of projects, which "
+                    "exports can use with --catalog to only request the results files from IRIDA."
+    )
+    argument_parser.add_argument("-p", "--project", action="store", nargs="+", type=int,
+                                 help="Project(s) to synchronize. Required unless --project_file is given.")
+    argument_parser.add_argument("-pf", "--project_file", action="store",
+                                 help="Path to a file listing the project(s) to synchronize, "
+                                      "separated by spaces or new lines.")
+    argument_parser.add_argument("-u", "--username", action="store",
+                                 help="This is your IRIDA account username.")
+    argument_parser.add_argument("-pw", "--password", action="store",
+                                 help="This is your IRIDA account password.")
+    argument_parser.add_argument("-c", "--config", action="store", required=True,
+                                 help="Required. Path to a configuration file. ")
+    argument_parser.add_argument("-w", "--workers", action="store", default=1, type=int,
+                                 help="The number of concurrent requests made to IRIDA. Defaults to 1.")
+    argument_parser.add_argument("-a", "--async_requests", action="store_true",
+                                 help="Send the requests of analyses from an asynchronous client, so --workers can "
+                                      "be raised to hundreds of concurrent requests. Requires aiohttp.")
+    argument_parser.add_argument("-ct", "--catalog", action="store", default=DEFAULT_CATALOG_FILE,
+                                 help=f"Path of the catalog. Defaults to {DEFAULT_CATALOG_FILE}.")
+    argument_parser.add_argument("-cd", "--cache_dir", action="store", default=DEFAULT_CACHE_DIR,
+                                 help=f"Directory where listings are cached, so unchanged ones are not downloaded "
+                                      f"again. Defaults to {DEFAULT_CACHE_DIR}.")
+    argument_parser.add_argument("-nc", "--no_cache", action="store_true",
+                                 help="Download every listing from IRIDA without using the cache.")
+
     return argument_parser
 
 
@@ -46,6 +129,11 @@ def _validate_args(args):
         - If user does not include username and password in arguments, the program prompts the user to enter it.
         - If user specify ".xlsx" for the output name, this method removes it.
         - Validates date arguments (from and to)
+        - Validates the number of workers and processes
+        - Validates the optional dependencies of the output formats are installed
+        - Combines the project ids of arguments and project file
+        - Parses the filter expression
+        - Validates the output directory to resume
     :param args:
     :return dictionary:
     """
@@ -53,64 +141,204 @@ def _validate_args(args):
     user_credentials = validate.user_credentials(args.username, args.password)
     output_file_name = validate.output_file_name(args.output)
     date_range = validate.date_range(args.from_date, args.to_date)
+    workers = validate.workers(args.workers)
+    processes = validate.processes(args.processes, args.split_results)
+    output_formats = validate.output_formats(args.format)
+    project_ids = validate.project_ids(args.project, args.project_file)
+    submission_query = validate.query(args.query)
+    resume_directory = validate.resume_directory(args.resume)
 
     return {'username': user_credentials["username"],
             'password': user_credentials["password"],
             'config': args.config,
-            'project': args.project,
+            'project': project_ids,
+            'merge': args.merge,
             'output': output_file_name,
             'split_results': args.split_results,
+            'processes': processes,
             'from_date': date_range["from_date"],
-            'to_date': date_range["to_date"]}
+            'to_date': date_range["to_date"],
+            'query': submission_query,
+            'workers': workers,
+            'async_requests': args.async_requests,
+            'cache_dir': None if args.no_cache else args.cache_dir,
+            'state_file': args.state_file if args.incremental else None,
+            'catalog': args.catalog,
+            'format': output_formats,
+            'sheets': None if args.sheets is None else list(dict.fromkeys(args.sheets)),
+            'resume': resume_directory}
 
 
 def _init_api(args_dict, config_dict):
     """
     Connects to IRIDA RESTful API and returns an irida_api instance.
     """
+    result_cache = None
+    response_cache = None
+    if args_dict["cache_dir"] is not None:
+        try:
+            result_cache = ResultFileCache(args_dict["cache_dir"])
+            response_cache = ResponseCache(args_dict["cache_dir"])
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"Unable to open the cache in {args_dict['cache_dir']}: {e}. "
+                            f"Continuing without cache.")
+
+    # the configuration file can cap the concurrent requests, whatever the number of workers
+    max_workers = args_dict["workers"]
+    if config_dict["max_concurrency"] is not None and max_workers > config_dict["max_concurrency"]:
+        logging.info(f"Sending at most {config_dict['max_concurrency']} concurrent requests, the max-concurrency of "
+                     f"the configuration file.")
+        max_workers = config_dict["max_concurrency"]
+
+    api_class = api.AsyncIridaAPI if args_dict["async_requests"] else api.IridaAPI
+
     try:
-        irida_api = api.IridaAPI(
+        irida_api = api_class(
             config_dict["client_id"],
             config_dict["client_secret"],
             config_dict["base_url"],
             args_dict["username"],
-            args_dict["password"])
+            args_dict["password"],
+            http_max_retries=config_dict["max_retries"],
+            max_workers=max_workers,
+            result_cache=result_cache,
+            response_cache=response_cache,
+            rate_limiter=api.RateLimiter(config_dict["requests_per_second"]),
+            retry_policy=api.RetryPolicy(config_dict["max_retries"], config_dict["backoff_factor"],
+                                         config_dict["max_backoff"]))
     except api.exceptions.IridaConnectionError:
         logging.error("Unable to connect to IRIDA REST API. "
                       "Ensure your client info and account credentials are correct.")
         sys.exit(1)
+    except ImportError:
+        sys.exit(1)
 
     return irida_api
 
 
+def _close_api(irida_api):
+    """
+    Closes the connections of the api, and the caches _init_api() opened for it.
+    """
+    irida_api.close()
+    for cache in (irida_api.result_cache, irida_api.response_cache):
+        if cache is not None:
+            cache.close()
+
+
+def _parse_config(config_path):
+    """
+    Parses the configuration file, exits if it can't be parsed.
+    """
+    try:
+        return parser.parse_config(config_path)
+    except parser.exceptions.ConfigFileNotFoundError:
+        logging.error("Configuration file not found.")
+        sys.exit(1)
+    except parser.exceptions.ConfigInformationError:
+        logging.error("An error occurred related to the information of the config file.")
+        sys.exit(1)
+
+
+def _open_catalog(catalog_path):
+    """
+    Opens the catalog, exits if it can't be opened.
+    """
+    try:
+        return SubmissionCatalog(catalog_path)
+    except (OSError, sqlite3.Error) as e:
+        logging.error(f"Unable to open the catalog {catalog_path}: {e}")
+        sys.exit(1)
+
+
+def sync_main(argv):
+    """
+    Entry point of the sync command, which updates the catalog of the given projects.
+    :param argv: command line arguments after "sync"
+    """
+    args = init_sync_argparser().parse_args(argv)
+
+    user_credentials = validate.user_credentials(args.username, args.password)
+    args_dict = {'username': user_credentials["username"],
+                 'password': user_credentials["password"],
+                 'project': validate.project_ids(args.project, args.project_file),
+                 'workers': validate.workers(args.workers),
+                 'async_requests': args.async_requests,
+                 'cache_dir': None if args.no_cache else args.cache_dir}
+
+    config_dict = _parse_config(args.config)
+    catalog = _open_catalog(args.catalog)
+
+    try:
+        logging.info("Connecting to IRIDA API...")
+        irida_api = _init_api(args_dict, config_dict)
+        logging.info("Successfully connected to IRIDA API.")
+
+        failed_project_ids = []
+        for project_id in args_dict["project"]:
+            try:
+                catalog.sync_project(irida_api, project_id)
+            except Exception as e:
+                logging.error(f"Could not synchronize project id [{project_id}]: {e}")
+                failed_project_ids.append(project_id)
+
+        _close_api(irida_api)
+    finally:
+        catalog.close()
+
+    if failed_project_ids:
+        sys.exit(1)
+
+
 def main():
     """
     Main entry point of irida_staramr_results.
     Accepts commands from command line to be processed by the program.
     """
+    if sys.argv[1:2] == ["sync"]:
+        sync_main(sys.argv[2:])
+        return
+
     argument_parser = init_argparser()
 
     args = argument_parser.parse_args()
 
     args_dict = _validate_args(args)
 
+    config_dict = _parse_config(args_dict["config"])
+
+    export_state = None
+    if args_dict["state_file"] is not None:
+        try:
+            export_state = ExportState(args_dict["state_file"])
+        except ValueError:
+            logging.error(f"The state file {args_dict['state_file']} could not be read.")
+            sys.exit(1)
+
+    catalog = None
+    if args_dict["catalog"] is not None:
+        catalog = _open_catalog(args_dict["catalog"])
+
     try:
-        config_dict = parser.parse_config(args_dict["config"])
-    except parser.exceptions.ConfigFileNotFoundError:
-        logging.error("Configuration file not found.")
-        sys.exit(1)
-    except parser.exceptions.ConfigInformationError:
-        logging.error("An error occurred related to the information of the config file.")
-        sys.exit(1)
+        # Connect to IRIDA REST API
+        logging.info("Connecting to IRIDA API...")
+        irida_api = _init_api(args_dict, config_dict)
+        logging.info("Successfully connected to IRIDA API.")
 
-    # Connect to IRIDA REST API
-    logging.info("Connecting to IRIDA API...")
-    irida_api = _init_api(args_dict, config_dict)
-    logging.info("Successfully connected to IRIDA API.")
+        # Start downloading results
+        failed_project_ids = downloader.download_all_results(irida_api, args_dict["project"], args_dict["output"],
+                                                             args_dict["split_results"], args_dict["from_date"],
+                                                             args_dict["to_date"], args_dict["workers"],
+                                                             export_state, args_dict["format"], args_dict["merge"],
+                                                             args_dict["query"], catalog, args_dict["resume"],
+                                                             args_dict["sheets"], args_dict["processes"])
+        _close_api(irida_api)
+    finally:
+        if catalog is not None:
+            catalog.close()
 
-    # Start downloading results
-    downloader.download_all_results(irida_api, args_dict["project"], args_dict["output"], args_dict["split_results"],
-                                    args_dict["from_date"], args_dict["to_date"])
+    if failed_project_ids:
+        sys.exit(1)
 
 
 # This is called when the program is run for the first time
@@ -0,0 +1,171 @@
+import gzip
+import logging
+import os
+
+# Output formats of the results. Excel writes one file with a sheet per results file, the others one file per sheet.
+OUTPUT_FORMATS = ["xlsx", "parquet", "feather", "csv"]
+
+# File extensions of the formats written one file per sheet.
+FILE_EXTENSIONS = {
+    "parquet": ".parquet",
+    "feather": ".feather",
+    "csv": ".csv.gz"
+}
+
+
+def _import_pyarrow():
+    """
+    pyarrow is an optional dependency, only needed for the parquet and feather formats.
+    """
+    try:
+        import pyarrow
+    except ImportError:
+        logging.error("The parquet and feather formats require pyarrow. "
+                      "Install it with: pip install irida-staramr-results[columnar]")
+        raise
+    return pyarrow
+
+
+def check_dependencies(output_formats):
+    """
+    Checks the optional dependencies of the output formats are installed, so a missing one stops the export before
+    anything is downloaded instead of once the output files are written.
+    :param output_formats: list of OUTPUT_FORMATS
+    :raises ImportError: if pyarrow is needed but not installed
+    """
+    if "parquet" in output_formats or "feather" in output_formats:
+        _import_pyarrow()
+
+
+def get_sheet_file_path(directory_name, output_file_name, sheet_name, output_format):
+    """
+    Returns the path of the file a sheet is written to, eg. <directory_name>/<output_file_name>-ResFinder.parquet
+    :param directory_name:
+    :param output_file_name:
+    :param sheet_name:
+    :param output_format: one of parquet, feather or csv
+    :return path:
+    """
+    return os.path.join(directory_name, f"{output_file_name}-{sheet_name}{FILE_EXTENSIONS[output_format]}")
+
+
+def accumulator_to_files(accumulator, directory_name, output_file_name, output_format):
+    """
+    Writes each sheet of a DataFrameAccumulator to its own file of the given format, one data frame at a time.
+    Sheets without any data are skipped. Unlike excel, there is no limit on the number of rows.
+    :param accumulator: DataFrameAccumulator
+    :param directory_name:
+    :param output_file_name:
+    :param output_format: one of parquet, feather or csv
+    :return None:
+    """
+    writers = {
+        "parquet": _sheet_to_parquet,
+        "feather": _sheet_to_feather,
+        "csv": _sheet_to_csv
+    }
+
+    for sheet_name in accumulator.get_sheet_names():
+        if accumulator.get_row_count(sheet_name) < 1:
+            continue
+
+        target_path = get_sheet_file_path(directory_name, output_file_name, sheet_name, output_format)
+        logging.debug(f"Writing {sheet_name} data to {target_path}.")
+        writers[output_format](accumulator, sheet_name, target_path)
+
+
+def _sheet_to_csv(accumulator, sheet_name, target_path):
+    """
+    Writes a sheet to a gzip compressed csv file.
+    """
+    columns = accumulator.get_columns(sheet_name)
+    with gzip.open(target_path, "wt", newline="") as file:
+        header = True
+        for df in accumulator.iter_chunks(sheet_name):
+            df.reindex(columns=columns).to_csv(file, header=header, index=False)
+            header = False
+
+
+def _sheet_to_parquet(accumulator, sheet_name, target_path):
+    """
+    Writes a sheet to a parquet file, one row group per data frame.
+    """
+    pyarrow = _import_pyarrow()
+    import pyarrow.parquet
+
+    schema = _get_arrow_schema(accumulator, sheet_name)
+    with pyarrow.parquet.ParquetWriter(target_path, schema) as writer:
+        for table in _iter_arrow_tables(accumulator, sheet_name, schema):
+            writer.write_table(table)
+
+
+def _sheet_to_feather(accumulator, sheet_name, target_path):
+    """
+    Writes a sheet to a feather (arrow IPC) file, one record batch per data frame. The categories of each analysis are
+    a different dictionary, which the IPC file format can't replace between record batches, so categoricals are
+    written as their values.
+    """
+    pyarrow = _import_pyarrow()
+
+    schema = _get_arrow_schema(accumulator, sheet_name, dictionaries=False)
+    with pyarrow.OSFile(target_path, "wb") as sink, pyarrow.ipc.new_file(sink, schema) as writer:
+        for table in _iter_arrow_tables(accumulator, sheet_name, schema):
+            writer.write_table(table)
+
+
+def _iter_arrow_tables(accumulator, sheet_name, schema):
+    """
+    Yields the data frames of a sheet as arrow tables of the given schema.
+    """
+    pyarrow = _import_pyarrow()
+
+    for df in accumulator.iter_chunks(sheet_name):
+        table = pyarrow.Table.from_pandas(df.reindex(columns=schema.names), preserve_index=False)
+        yield table.replace_schema_metadata(None).cast(schema)
+
+
+def _get_arrow_schema(accumulator, sheet_name, dictionaries=True):
+    """
+    Returns an arrow schema every data frame of a sheet can be cast to.
+    Each analysis is parsed on its own, so a column can be integers in one analysis and floats or strings in another.
+    Numbers of different types are stored as floats, anything else that differs is stored as strings.
+    :param dictionaries: boolean, keep categoricals as dictionary types, otherwise they are stored as their values
+    """
+    pyarrow = _import_pyarrow()
+
+    types = {column: None for column in accumulator.get_columns(sheet_name)}
+    for df in accumulator.iter_chunks(sheet_name):
+        for field in pyarrow.Schema.from_pandas(df, preserve_index=False):
+            types[field.name] = _unify_arrow_types(pyarrow, types[field.name], field.type)
+
+    if not dictionaries:
+        types = {column: t.value_type if t is not None and pyarrow.types.is_dictionary(t) else t
+                 for column, t in types.items()}
+
+    return pyarrow.schema([(column, pyarrow.large_string() if t is None or pyarrow.types.is_null(t) else t)
+                           for column, t in types.items()])
+
+
+def _unify_arrow_types(pyarrow, type_a, type_b):
+    """
+    Returns an arrow type both type_a and type_b can be cast to. None and null types are missing values.
+    """
+    if type_a is None or pyarrow.types.is_null(type_a):
+        return type_b
+    if pyarrow.types.is_null(type_b) or type_a.equals(type_b):
+        return type_a
+
+    if pyarrow.types.is_dictionary(type_a) and pyarrow.types.is_dictionary(type_b):
+        return pyarrow.dictionary(pyarrow.int32(), _unify_arrow_types(pyarrow, type_a.value_type, type_b.value_type))
+    if pyarrow.types.is_dictionary(type_a):
+        return _unify_arrow_types(pyarrow, type_a.value_type, type_b)
+    if pyarrow.types.is_dictionary(type_b):
+        return _unify_arrow_types(pyarrow, type_a, type_b.value_type)
+
+    def is_number(t):
+        return pyarrow.types.is_integer(t) or pyarrow.types.is_floating(t)
+
+    if is_number(type_a) and is_number(type_b):
+        return pyarrow.float64()
+
+    return pyarrow.large_string()
@@ -1,88 +1,444 @@
-import io
+import glob
 import os
 import logging
+import multiprocessing
+import threading
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
-import pandas as pd
+import openpyxl
+import xlsxwriter
 
-from irida_staramr_results import filter, util
+from irida_staramr_results import columnar, filter, util
+from irida_staramr_results.accumulator import DataFrameAccumulator, SpooledDataFrameAccumulator
+from irida_staramr_results.state import ExportCheckpoint
 
 _directory_name = ""
+_directory_lock = threading.Lock()
 
+# Maximum number of rows of an excel sheet, including the header.
+EXCEL_MAX_ROWS = 1048576
 
-def download_all_results(irida_api, project_id, output_file_name, separate_mode, from_timestamp, to_timestamp):
+# Number of rows of each excel sheet the column widths are fitted to. Widths rarely change after the first rows, and
+# measuring every cell of sheets with millions of cells adds to their writing time.
+COLUMN_WIDTH_SAMPLE_ROWS = 10000
+
+
+def download_all_results(irida_api, project_ids, output_file_name, separate_mode, from_timestamp, to_timestamp,
+                         workers=1, export_state=None, output_formats=("xlsx",), merge=False, submission_query=None,
+                         catalog=None, resume_directory=None, sheet_names=None, processes=1):
     """
     Main function for downloading StarAMR results to an excel file.
+    Several projects are downloaded concurrently, each to its own output files named after the project
+    (eg. output-project-1.xlsx), unless merge is True.
     :param irida_api:
-    :param project_id:
+    :param project_ids: a project id, or a list of project ids
     :param output_file_name:
     :param separate_mode: boolean, export file data separately if True
     :param from_timestamp: 00:00:00 of this day
     :param to_timestamp: 23:59:58 of this day
-    :return:
+    :param workers: number of analyses whose results files are downloaded concurrently
+    :param export_state: optional ExportState, only analysis submissions not exported yet are downloaded and
+        the new results are appended to the project's previous report
+    :param output_formats: formats of the output files, any of columnar.OUTPUT_FORMATS
+    :param merge: boolean, write the results of every project to the same output file, with a Project ID column.
+        Does not apply to separate_mode, which always writes one file per analysis.
+    :param submission_query: optional filter.Predicate, only analysis submissions it accepts are downloaded
+    :param catalog: optional SubmissionCatalog, the analyses are found in the catalog instead of requested from IRIDA,
+        only the results files are downloaded
+    :param resume_directory: optional output directory of an interrupted run, its output files are finished
+        without downloading again the analyses it already wrote
+    :param sheet_names: optional list of the sheets to export, see model.result.SHEET_NAMES. Results files of the
+        other sheets are not downloaded. Defaults to every sheet.
+    :param processes: number of processes parsing the results files and writing the output files of separate_mode,
+        shared by every project. With 1, they are written by the calling process.
+    :return failed_project_ids: list of the projects whose results could not be downloaded
     """
 
-    logging.info(f"Requesting completed amr analysis submissions for project id [{project_id}]. "
-                 f"This may take a while...")
+    if isinstance(project_ids, int):
+        project_ids = [project_ids]
+    project_ids = list(project_ids)
 
-    amr_completed_analysis_results = irida_api.get_completed_amr_analysis_results(project_id)
+    # a new output directory is created by the first project needing one, unless resuming
+    global _directory_name
+    _directory_name = resume_directory or ""
 
-    if len(amr_completed_analysis_results) < 1:
-        logging.warning(f"No completed amr analysis results type for project id [{project_id}].")
-        return
+    def get_project_analyses(project_id, submission_filter, show_progress):
+        return _get_project_analyses(irida_api, project_id, from_timestamp, to_timestamp, submission_filter,
+                                     submission_query, show_progress, catalog)
+
+    if merge and not separate_mode and len(project_ids) > 1:
+        failed_project_ids = _download_merged_results(irida_api, project_ids, output_file_name, get_project_analyses,
+                                                      workers, export_state, output_formats, sheet_names)
+    else:
+        # writing an excel file per analysis is CPU bound, they are written by a pool of processes. They are spawned
+        # rather than forked, as forking a process running threads (and their locks and connections) is not safe.
+        pool = nullcontext()
+        if separate_mode and processes > 1:
+            pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+        with pool as process_pool:
+            failed_project_ids = _download_each_project_results(irida_api, project_ids, output_file_name,
+                                                                separate_mode, get_project_analyses, workers,
+                                                                export_state, output_formats, sheet_names,
+                                                                process_pool, processes)
+
+    if export_state is not None:
+        export_state.save()
+
+    if failed_project_ids:
+        logging.error(f"Results of project(s) {failed_project_ids} could not be downloaded.")
+        if _directory_name:
+            logging.info(f"Run the same command with --resume {_directory_name} to finish the export without "
+                         f"downloading again the analyses already written.")
+
+    return failed_project_ids
+
+
+def _download_each_project_results(irida_api, project_ids, output_file_name, separate_mode, get_project_analyses,
+                                   workers, export_state, output_formats, sheet_names=None, process_pool=None,
+                                   processes=1):
+    """
+    Downloads the StarAMR results of each project to its own output files, see download_all_results().
+    :param get_project_analyses: function returning the analyses to download of a project, see _get_project_analyses()
+    :param process_pool: optional ProcessPoolExecutor writing the output files of separate_mode
+    :param processes: number of processes of process_pool
+    :return failed_project_ids:
+    """
+    single_project = len(project_ids) == 1
+
+    def download_project_results(project_id):
+        submission_filter, report_path = _get_incremental_export(export_state, project_id, output_formats)
+        project_output_file_name = output_file_name if single_project else f"{output_file_name}-project-{project_id}"
+
+        analyses = get_project_analyses(project_id, submission_filter, show_progress=single_project)
+        report_path = _download_analyses_results(irida_api, analyses, project_output_file_name, separate_mode,
+                                                 workers, report_path, output_formats, show_progress=single_project,
+                                                 sheet_names=sheet_names, process_pool=process_pool,
+                                                 processes=processes)
+        logging.info(f"Download complete for project id [{project_id}].")
+
+        if export_state is not None:
+            export_state.update(project_id, irida_api.failed_submission_ids, report_path)
+
+    return _run_per_project(download_project_results, project_ids, workers)
+
+
+def _download_merged_results(irida_api, project_ids, output_file_name, get_project_analyses, workers, export_state,
+                             output_formats, sheet_names=None):
+    """
+    Downloads the StarAMR results of every project to the same output files, see download_all_results().
+    The analysis submissions of the projects are requested concurrently, then the results are written together.
+    :param get_project_analyses: function returning the analyses to download of a project, see _get_project_analyses()
+    :return failed_project_ids:
+    """
+    analyses_per_project = {}
+    report_paths = set()
+
+    def get_merged_project_analyses(project_id):
+        submission_filter, report_path = _get_incremental_export(export_state, project_id, output_formats)
+        report_paths.add(report_path)
+        analyses_per_project[project_id] = get_project_analyses(project_id, submission_filter, show_progress=False)
+
+    failed_project_ids = _run_per_project(get_merged_project_analyses, project_ids, workers)
+
+    # results are only appended to a previous report if every project was exported to it
+    report_path = report_paths.pop() if len(report_paths) == 1 else None
+
+    analyses = []
+    analysis_projects = {}  # { analysis id : project id }
+    for project_id in project_ids:
+        for a in analyses_per_project.get(project_id, []):
+            analyses.append(a)
+            analysis_projects[a["identifier"]] = project_id
+
+    report_path = _download_analyses_results(irida_api, analyses, output_file_name, False, workers, report_path,
+                                             output_formats, analysis_projects=analysis_projects,
+                                             sheet_names=sheet_names)
+    logging.info(f"Download complete for project ids {list(analyses_per_project)}.")
+
+    if export_state is not None:
+        for project_id in analyses_per_project:
+            export_state.update(project_id, irida_api.failed_submission_ids, report_path)
+
+    return failed_project_ids
+
+
+def _run_per_project(function, project_ids, workers):
+    """
+    Calls function with each project id, concurrently using up to `workers` threads. A project that fails is logged
+    and does not stop the other projects.
+    :param function: function called with a project id
+    :param project_ids:
+    :param workers:
+    :return failed_project_ids: list of the projects for which function raised an exception
+    """
+    failed_project_ids = []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(project_ids)))) as executor:
+        futures = [executor.submit(function, project_id) for project_id in project_ids]
+
+    for project_id, future in zip(project_ids, futures):
+        try:
+            future.result()
+        except Exception as e:
+            logging.error(f"Could not download results of project id [{project_id}]: {e}")
+            failed_project_ids.append(project_id)
+
+    return failed_project_ids
 
-    # Filter analysis created since target date (in timestamp)
-    amr_completed_analysis_results = filter.by_date_range(amr_completed_analysis_results, from_timestamp, to_timestamp)
+
+def _get_incremental_export(export_state, project_id, output_formats):
+    """
+    Returns the submission filter and the previous excel report of a project for an incremental export.
+    :param export_state: optional ExportState
+    :param project_id:
+    :param output_formats:
+    :return submission_filter, report_path: both None when not exporting incrementally
+    """
+    if export_state is None:
+        return None, None
+
+    logging.info(f"Skipping analysis submissions of project id [{project_id}] up to "
+                 f"[{export_state.get_last_submission_id(project_id)}], they were already exported, except "
+                 f"{len(export_state.get_pending_submission_ids(project_id))} pending submission(s).")
+    submission_filter = export_state.submission_filter(project_id)
+
+    report_path = None
+    if "xlsx" in output_formats:
+        report_path = export_state.get_report(project_id)
+    if report_path is not None and not os.path.isfile(report_path):
+        logging.warning(f"Previous report {report_path} no longer exists, new results are written to a new file.")
+        report_path = None
+
+    return submission_filter, report_path
+
+
+def _get_project_analyses(irida_api, project_id, from_timestamp, to_timestamp, submission_filter=None,
+                          submission_query=None, show_progress=True, catalog=None):
+    """
+    Returns the completed amr analysis results of a project created in the date range.
+    The date range is checked on the createdDate of the analysis submissions, before any analysis result is requested.
+    :param submission_filter: optional function selecting the analysis submissions to download
+    :param submission_query: optional filter.Predicate selecting the analysis submissions to download
+    :param show_progress: boolean, print progress bars
+    :param catalog: optional SubmissionCatalog the analyses are found in, instead of requesting them from IRIDA
+    :return analyses: list of analysis result dictionaries
+    """
+
+    if catalog is not None:
+        logging.info(f"Finding completed amr analysis submissions for project id [{project_id}] in the catalog.")
+        date_range = filter.Range("createdDate", from_timestamp, True, to_timestamp, True)
+        submission_query = date_range if submission_query is None else filter.And([date_range, submission_query])
+        amr_completed_analysis_results = catalog.get_completed_amr_analysis_results(
+            irida_api.base_url, project_id, submission_filter, submission_query, irida_api.failed_submission_ids)
+    else:
+        logging.info(f"Requesting completed amr analysis submissions for project id [{project_id}]. "
+                     f"This may take a while...")
+
+        # the submission filter goes last, so incremental exports only record the submissions accepted by the others,
+        # like the catalog which selects with the query before calling it
+        submission_filter = filter.all_of(submission_query, filter.created_between(from_timestamp, to_timestamp),
+                                          submission_filter)
+        amr_completed_analysis_results = irida_api.get_completed_amr_analysis_results(project_id, submission_filter,
+                                                                                      show_progress)
 
     if len(amr_completed_analysis_results) < 1:
         from_date = util.timestamp_to_local(from_timestamp)
         to_date = util.timestamp_to_local(to_timestamp - 86400000)
-        logging.warning(f"No completed amr analysis submission created from [{from_date}] to [{to_date}]. Exiting..")
-        return
+        logging.warning(f"No completed amr analysis submission created from [{from_date}] to [{to_date}] "
+                        f"for project id [{project_id}].")
+
+    return amr_completed_analysis_results
 
+
+def _create_output_directory():
+    """
+    Creates the timestamped directory the output files of this run are written to, unless it was already created.
+    :return directory_name:
+    """
     global _directory_name
-    _directory_name = "staramr-results-" + datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
-    logging.info(f"Creating directory name {_directory_name} to store results files.")
-    os.mkdir(_directory_name)
+    with _directory_lock:
+        if not _directory_name:
+            _directory_name = "staramr-results-" + datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+            logging.info(f"Creating directory name {_directory_name} to store results files.")
+            os.mkdir(_directory_name)
+
+    return _directory_name
+
+
+def _download_analyses_results(irida_api, analyses, output_file_name, separate_mode, workers, report_path=None,
+                               output_formats=("xlsx",), show_progress=True, analysis_projects=None, sheet_names=None,
+                               process_pool=None, processes=1):
+    """
+    Downloads the results files of the analyses and writes them to output files, see download_all_results().
+    Each analysis done is recorded in an ExportCheckpoint, so analyses recorded by an interrupted run are skipped.
+    :param analyses: list of analysis result dictionaries
+    :param report_path: optional path of an existing excel report the combined results are appended to
+    :param output_formats: formats of the output files
+    :param show_progress: boolean, print progress bars
+    :param analysis_projects: optional dictionary of analysis id to project id, adds a Project ID column to every sheet
+    :param sheet_names: optional list of the sheets to export, defaults to every sheet
+    :param process_pool: optional ProcessPoolExecutor parsing the results files and writing the output files of
+        separate_mode, otherwise they are written by this thread
+    :param processes: number of processes of process_pool
+    :return report_path: path of the combined excel report, or None if no combined excel report was written
+    """
+
+    if len(analyses) < 1:
+        return report_path
+
+    # formats other than excel are always written to a new directory
+    if separate_mode or report_path is None or set(output_formats) - {"xlsx"}:
+        _create_output_directory()
+
+    checkpoint = ExportCheckpoint(_directory_name or os.path.dirname(report_path), output_file_name)
+    remaining_analyses = [a for a in analyses if not checkpoint.is_done(a["identifier"])]
 
     # progress bar variables
-    total = len(amr_completed_analysis_results)
-    iteration = 0
+    total = len(analyses)
+    iteration = total - len(remaining_analyses)
 
     if separate_mode:
         # Write the collection of files into a file, one file per analysis
         logging.info(f"Writing each results data per analysis in their separate output file...")
-        for a in amr_completed_analysis_results:
-            results_files = irida_api.get_analysis_result_files(a["identifier"])
-            data_frames = _files_to_data_frames(results_files)
-            out_name = _get_output_file_name(output_file_name, a["createdDate"])
+        # Output file names are reserved in the order of the analyses before any file is written, so names are the
+        # same whichever process finishes first. At most twice as many analyses as processes wait for the pool, to
+        # bound memory, and an analysis is checkpointed once its files are written. Reserved names are checkpointed
+        # too, so a resumed export overwrites the files of the analyses written but not checkpointed yet.
+        reserved_names = set(checkpoint.output_file_names.values())
+        max_pending = 2 * processes
+        pending = deque()  # [ (analysis, future), ... ] output files being written by the pool, in order
+
+        def finish_next():
+            pending_analysis, future = pending.popleft()
+            future.result()
+            checkpoint.add(pending_analysis["identifier"])
+
+        for a, results_files in _download_analysis_result_files(irida_api, remaining_analyses, workers,
+                                                                sheet_names=sheet_names):
+            out_name = checkpoint.get_output_file_name(a["identifier"])
+            if out_name is None:
+                out_name = _get_output_file_name(output_file_name, a["createdDate"], reserved_names)
+                checkpoint.reserve_output_file_name(a["identifier"], out_name)
             iteration = iteration + 1
-            util.print_progress_bar(iteration, total, message="results downloaded")
-            logging.debug(f"Creating a file named {out_name}.xlsx for analysis [{a['identifier']}]. ")
-            _data_frames_to_excel(data_frames, out_name)
+            if show_progress:
+                util.print_progress_bar(iteration, total, message="results downloaded")
+            logging.debug(f"Creating files named {out_name} for analysis [{a['identifier']}]. ")
+            if process_pool is None:
+                _write_analysis_output_files(results_files, _directory_name, out_name, output_formats)
+                checkpoint.add(a["identifier"])
+                continue
+
+            pending.append((a, process_pool.submit(_write_analysis_output_files, results_files, _directory_name,
+                                                   out_name, output_formats)))
+            while len(pending) > max_pending or (pending and pending[0][1].done()):
+                finish_next()
+
+        while pending:
+            finish_next()
     else:
-        # Base case, collect all the data into dataframes, one per unique file name, then write a single file.
+        # Base case, collect all the data into spool files on disk, one per unique file name, then write a single file
+        # one analysis at a time, so the data of the whole project is never held in memory.
+        # The spool files are the checkpoint of the analyses appended so far.
         logging.info(f"Appending all results data in one output file.")
-        data_frames = {}
-        for a in amr_completed_analysis_results:
+        accumulator = SpooledDataFrameAccumulator(checkpoint.spool_dir)
+        accumulator.restore(checkpoint.accumulator_checkpoint or [])
+        for a, result_files in _download_analysis_result_files(irida_api, remaining_analyses, workers,
+                                                               sheet_names=sheet_names):
             logging.debug(f"Appending analysis [{a['identifier']}]. ")
-            result_files = irida_api.get_analysis_result_files(a["identifier"])
-            data_frames = _append_file_data_to_existing_data_frames(result_files, data_frames)
+            data_frames = _files_to_data_frames(result_files)
+            if analysis_projects is not None:
+                _add_project_column(data_frames, analysis_projects[a["identifier"]])
+            accumulator.add_data_frames(data_frames)
+            checkpoint.add(a["identifier"], accumulator)
             iteration = iteration + 1
-            util.print_progress_bar(iteration, total, message="results appended")
-        _data_frames_to_excel(data_frames, output_file_name)
+            if show_progress:
+                util.print_progress_bar(iteration, total, message="results appended")
+
+        if report_path is not None:
+            if not checkpoint.report_appended:
+                logging.info(f"Appending new results to {report_path}.")
+                _append_accumulator_to_excel(accumulator, report_path)
+                checkpoint.set_report_appended()
+            output_formats = [f for f in output_formats if f != "xlsx"]
+        elif "xlsx" in output_formats:
+            report_path = os.path.join(_directory_name, output_file_name + ".xlsx")
+
+        _accumulator_to_output_files(accumulator, output_file_name, output_formats)
+
+    checkpoint.remove()
 
-    logging.info(f"Download complete for project id [{project_id}].")
+    return report_path
 
 
-def _get_output_file_name(prefix_name, timestamp):
+def _add_project_column(data_frames, project_id):
+    """
+    Inserts a Project ID column first in each data frame that has data.
+    :param data_frames: dictionary of sheetname:dataframe pairs
+    :param project_id:
+    :return None:
+    """
+    for sheet_name, data_frame in data_frames.items():
+        if not data_frame.empty:
+            # the data frames of the results files are not modified, the column is inserted in a shallow copy
+            data_frame = data_frame.copy(deep=False)
+            data_frame.insert(0, "Project ID", project_id)
+            data_frames[sheet_name] = data_frame
+
+
+def _download_analysis_result_files(irida_api, analyses, workers=1, max_pending=None, sheet_names=None):
+    """
+    Downloads the results files of each analysis using a pool of `workers` threads and yields them in the same order as
+    the given analyses, so the caller can parse them while the next analyses are still downloading.
+    To keep memory bounded, no more than `max_pending` analyses (default: twice the number of workers) are downloaded
+    ahead of the caller.
+    :param irida_api:
+    :param analyses: iterable of analysis result dictionaries
+    :param workers: number of analyses downloaded concurrently
+    :param max_pending: maximum number of analyses downloaded or downloading but not yet yielded
+    :param sheet_names: optional list of the sheets whose results files are downloaded, defaults to every sheet
+    :return: generator of (analysis, results files) tuples
+    """
+
+    if max_pending is None:
+        max_pending = 2 * workers
+
+    analyses = iter(analyses)
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def submit_next():
+            a = next(analyses, None)
+            if a is not None:
+                pending.append((a, executor.submit(irida_api.get_analysis_result_files, a["identifier"], a,
+                                                       sheet_names)))
+
+        for _ in range(max(1, max_pending)):
+            submit_next()
+
+        while pending:
+            a, future = pending.popleft()
+            result_files = future.result()
+            submit_next()
+            yield a, result_files
+
+
+def _get_output_file_name(prefix_name, timestamp, reserved_names=None):
     """
     Generates an output file name. This method is called from the main downloader function when the mode is non-append.
         - Converts unix timestamp to UTC.
+        - Names in reserved_names are taken too, the name returned is added to them. Files written concurrently
+          don't exist yet, their names must be reserved to not be generated twice.
     :param prefix_name: the name added before the time.
     :param timestamp: unix timestamp in millisecond
+    :param reserved_names: optional set of the names generated for files not written yet
     :return: output name as <prefix_name>-YYYY-mm-ddTHH-MM-SS.
     """
+    if reserved_names is None:
+        reserved_names = set()
 
     date = datetime.utcfromtimestamp(timestamp/1000)
     date_formatted = date.strftime('%Y-%m-%dT%H-%M-%S')
@@ -91,119 +447,212 @@ def _get_output_file_name(prefix_name, timestamp):
 
     # if filename already exists, add an increment number
     increment = 1
-    target_path = os.path.join(_directory_name, output_file_name + ".xlsx")
-    while os.path.isfile(target_path):
+    while output_file_name in reserved_names or _output_files_exist(output_file_name):
         output_file_name = f"{prefix_name}-{date_formatted} ({increment})"
-        target_path = os.path.join(_directory_name, output_file_name + ".xlsx")
         increment = increment + 1
-        logging.info(f"File name already exists, {output_file_name}.xlsx generated.")
+        logging.info(f"File name already exists, {output_file_name} generated.")
 
+    reserved_names.add(output_file_name)
     return output_file_name
 
 
-def _data_frames_to_excel(data_frames, output_file_name):
+def _output_files_exist(output_file_name):
     """
-    Writes data_frames to the output file.
-    Each dataframe is appended as a separate sheet.
-    :param data_frames:
+    Returns True if the output directory has an excel file, or a file of any sheet, named output_file_name.
     :param output_file_name:
-    :return:
+    :return boolean:
     """
+    if os.path.isfile(os.path.join(_directory_name, output_file_name + ".xlsx")):
+        return True
+    return len(glob.glob(os.path.join(glob.escape(_directory_name), glob.escape(output_file_name) + "-*"))) > 0
 
-    # create new file
-    target_path = f"{_directory_name}/{output_file_name}.xlsx"
-    with pd.ExcelWriter(target_path, engine='xlsxwriter') as writer:
-        # append data frame to file
-        for file_sheet_name in data_frames:
-            logging.debug(f"Writing {file_sheet_name} data to {output_file_name}.xlsx.")
-            df = data_frames[file_sheet_name]
-            if not df.empty:
-                df.to_excel(writer, sheet_name=file_sheet_name, index=False)
-                _auto_fit_column_width(writer, data_frames[file_sheet_name], file_sheet_name)
+
+def _write_analysis_output_files(results_files, directory_name, output_file_name, output_formats):
+    """
+    Parses the results files of one analysis and writes them to their own output files, see separate_mode.
+    Runs in the processes of a pool too, which don't have the output directory of the parent process.
+    :param results_files: list of Result of the analysis
+    :param directory_name: output directory
+    :param output_file_name:
+    :param output_formats: any of columnar.OUTPUT_FORMATS
+    :return None:
+    """
+    global _directory_name
+    _directory_name = directory_name
+
+    accumulator = DataFrameAccumulator()
+    accumulator.add_data_frames(_files_to_data_frames(results_files))
+    _accumulator_to_output_files(accumulator, output_file_name, output_formats)
 
 
-def _auto_fit_column_width(writer, data_frame, sheet_name, max_width=75):
+def _accumulator_to_output_files(accumulator, output_file_name, output_formats):
     """
-    Auto adjust column width to fit content, with max width, in a excel file.
-    :param writer:
-    :param data_frame:
-    :param sheet_name:
-    :param max_width:
+    Writes the data collected by a DataFrameAccumulator to the output directory, in each of the output formats.
+    :param accumulator: DataFrameAccumulator
+    :param output_file_name:
+    :param output_formats: any of columnar.OUTPUT_FORMATS
+    :return:
+    """
+    for output_format in output_formats:
+        if output_format == "xlsx":
+            _accumulator_to_excel(accumulator, output_file_name)
+        else:
+            columnar.accumulator_to_files(accumulator, _directory_name, output_file_name, output_format)
+
+
+def _accumulator_to_excel(accumulator, output_file_name, max_width=75):
+    """
+    Writes the data collected by a DataFrameAccumulator to the output file, each sheet of the accumulator as a
+    separate excel sheet. Rows are streamed one data frame at a time with xlsxwriter's constant_memory mode, which
+    flushes each row to disk as soon as the next one is written. Sheets without any data are skipped.
+    Column widths are fitted to the content of the first COLUMN_WIDTH_SAMPLE_ROWS rows, with max width, as the rows
+    are written.
+    :param accumulator: DataFrameAccumulator
+    :param output_file_name:
+    :param max_width: maximum width of a column
     :return:
     """
-    worksheet = writer.sheets[sheet_name]
-    for index, col in enumerate(data_frame):  # loop through all columns
-        series = data_frame[col]
 
-        # get maximum width of cells in that column plus extra space
-        width = max((
-            series.astype(str).map(len).max(),
-            len(str(series.name))
-        )) + 1
+    # create new file
+    target_path = f"{_directory_name}/{output_file_name}.xlsx"
+    workbook = xlsxwriter.Workbook(target_path, {"constant_memory": True,
+                                                 "strings_to_formulas": False,
+                                                 "strings_to_urls": False})
+    # same header format as pandas.DataFrame.to_excel()
+    header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
 
-        if width > max_width:
-            width = max_width
+    for file_sheet_name in accumulator.get_sheet_names():
+        if accumulator.get_row_count(file_sheet_name) < 1:
+            continue
 
-        worksheet.set_column(index, index, width)
+        logging.debug(f"Writing {file_sheet_name} data to {output_file_name}.xlsx.")
+        columns = accumulator.get_columns(file_sheet_name)
+        column_widths = ColumnWidths(columns, max_width, COLUMN_WIDTH_SAMPLE_ROWS)
 
+        worksheet = workbook.add_worksheet(file_sheet_name)
+        worksheet.write_row(0, 0, columns, header_format)
 
-def _files_to_data_frames(results_files):
+        row_index = 1
+        for df in accumulator.iter_chunks(file_sheet_name):
+            if row_index + len(df) > EXCEL_MAX_ROWS:
+                logging.warning(f"{file_sheet_name} has more rows than an excel sheet can hold, "
+                                f"only the first {EXCEL_MAX_ROWS - 1} rows are written to {output_file_name}.xlsx. "
+                                f"Use another output format to export every row.")
+                df = df.iloc[:EXCEL_MAX_ROWS - row_index]
+
+            for row in _to_excel_rows(df, columns):
+                worksheet.write_row(row_index, 0, row)
+                column_widths.update(row)
+                row_index = row_index + 1
+
+            if row_index >= EXCEL_MAX_ROWS:
+                break
+
+        for index, width in enumerate(column_widths.get_widths()):
+            worksheet.set_column(index, index, width)
+
+    workbook.close()
+
+
+class ColumnWidths(object):
     """
-    Accepts a list of results files and returns them as dictionary of sheetname:dataframe pairs.
-    eg. { "sheetname":{dataframe}, ..., "sheetname":{dataframe} }
-    :param results_files: array of Results object
-    :return:
+    Running maximum width of the cells of each column, updated one row at a time as rows are written, so fitting the
+    columns to their content doesn't need another pass over the data.
+    Measuring stops once every column reached max_width, or after sample_rows rows if given.
     """
-    data_frames = {}
-    for file in results_files:
-        data_frames[file.get_sheet_name()] = _convert_to_df(file.get_sheet_name(), file.get_contents())
 
-    return data_frames
+    def __init__(self, columns, max_width=75, sample_rows=None):
+        """
+        :param columns: column names, the header row is measured too
+        :param max_width: maximum width of a column
+        :param sample_rows: optional, number of rows measured after the header
+        """
+        self.max_width = max_width
+        self._widths = [len(str(column)) for column in columns]
+        self._remaining_rows = sample_rows
+
+    def update(self, row):
+        """
+        Measures the cells of a row, None cells are empty.
+        :param row: list of cell values
+        :return None:
+        """
+        if self._remaining_rows is not None:
+            if self._remaining_rows < 1:
+                return
+            self._remaining_rows = self._remaining_rows - 1
+
+        self._widths = [width if width >= self.max_width or value is None else max(width, len(str(value)))
+                        for width, value in zip(self._widths, row)]
+
+        if min(self._widths) >= self.max_width:
+            self._remaining_rows = 0
+
+    def get_widths(self):
+        """
+        Returns the width of each column plus extra space, with max width.
+        """
+        return [min(width + 1, self.max_width) for width in self._widths]
+
+
+def _to_excel_rows(data_frame, columns):
+    """
+    Yields the rows of data_frame as lists of cell values in the order of columns, with None for missing values.
+    :param data_frame:
+    :param columns: columns of the sheet, columns data_frame doesn't have are missing values
+    :return: generator of lists
+    """
+    data_frame = data_frame.reindex(columns=columns).astype(object)
+    data_frame = data_frame.where(data_frame.notna(), None)
+    for row in data_frame.itertuples(index=False, name=None):
+        yield list(row)
 
 
-def _append_file_data_to_existing_data_frames(results_files, data_frames):
+def _append_accumulator_to_excel(accumulator, report_path):
     """
-    Accepts a list of results files and appends the data to a given list of data_frames.
-    The data_frames can be an empty dict
-    :param results_files: a list of files to be converted into dataframes, and added or appended to the data_frames dict
-    :param data_frames: a dictionary of filename:dataframe pairs
-    :return: an updated dictionary of dataframe objects containing the newly appended data per filename.
-             example: {'filename1':dataframe1, 'filename2':dataframe2, ...}
+    Appends the data collected by a DataFrameAccumulator to the sheets of an existing excel file.
+    Rows are matched to the existing columns by name, new columns are added after the existing ones and sheets
+    that do not exist yet are created.
+    :param accumulator: DataFrameAccumulator
+    :param report_path: path of the excel file
+    :return:
     """
 
-    for file in results_files:
-        file_sheet_name = file.get_sheet_name()
-        if file_sheet_name not in data_frames.keys():
-            # new file, new dataframe
-            data_frames[file_sheet_name] = _convert_to_df(file_sheet_name, file.get_contents())
+    workbook = openpyxl.load_workbook(report_path)
+    for file_sheet_name in accumulator.get_sheet_names():
+        if accumulator.get_row_count(file_sheet_name) < 1:
+            continue
+
+        if file_sheet_name in workbook.sheetnames:
+            worksheet = workbook[file_sheet_name]
+            header = [cell.value for cell in worksheet[1] if cell.value is not None]
         else:
-            # appending data to existing dataframe
-            prev_data = data_frames[file_sheet_name]
-            curr_data = _convert_to_df(file_sheet_name, file.get_contents())
-            updated_data = prev_data.append(curr_data)
-            data_frames[file_sheet_name] = updated_data
+            worksheet = workbook.create_sheet(file_sheet_name)
+            header = []
 
-    return data_frames
+        for column in accumulator.get_columns(file_sheet_name):
+            if column not in header:
+                header.append(column)
+                worksheet.cell(row=1, column=len(header), value=column)
 
+        logging.debug(f"Appending {accumulator.get_row_count(file_sheet_name)} rows of {file_sheet_name} data "
+                      f"to {report_path}.")
+        for df in accumulator.iter_chunks(file_sheet_name):
+            for row in _to_excel_rows(df, header):
+                worksheet.append(row)
 
-def _convert_to_df(file_sheet_name, file_content):
+    workbook.save(report_path)
+
+
+def _files_to_data_frames(results_files):
     """
-    Converts dictionary or tsv contents to a data frame
-    :param file_sheet_name: Used for checking if data is being pulled from an excel sheet in the case of PointFinder
-    :param file_content:
-    :return data_frame:
+    Accepts a list of results files and returns them as dictionary of sheetname:dataframe pairs.
+    eg. { "sheetname":{dataframe}, ..., "sheetname":{dataframe} }
+    :param results_files: array of Results object
+    :return:
     """
-    # Pointfinder data comes from the specified "PointFinder" page of an excel sheet.
-    if file_sheet_name == "PointFinder":
-        try:
-            data_frame = pd.read_excel(file_content, sheet_name=file_sheet_name)
-        except ValueError:
-            # no pointfinder sheet on excel file, return empty data_frame
-            return pd.DataFrame()
-    # All other data fits into either a dict or a csv/tsv
-    elif type(file_content) is dict:
-        data_frame = pd.DataFrame([file_content])
-    else:
-        data_frame = pd.read_csv(io.StringIO(file_content), delimiter="\t")
+    data_frames = {}
+    for file in results_files:
+        data_frames[file.get_sheet_name()] = file.get_data_frame()
 
-    return data_frame
+    return data_frames
@@ -1,3 +1,10 @@
+import bisect
+import fnmatch
+import re
+
+from irida_staramr_results import util
+
+
 def by_date_range(analysis, from_timestamp, to_timestamp):
     """
     Filters list of analysis objects with attribute "createdDate".
@@ -8,10 +15,410 @@ def by_date_range(analysis, from_timestamp, to_timestamp):
     :return:
     """
 
+    is_created_in_range = created_between(from_timestamp, to_timestamp)
+
     analysis_filtered = []
 
     for a in analysis:
-        if from_timestamp <= a["createdDate"] <= to_timestamp:
+        if is_created_in_range(a):
             analysis_filtered.append(a)
 
     return analysis_filtered
+
+
+def created_between(from_timestamp, to_timestamp):
+    """
+    Returns a predicate accepting objects with attribute "createdDate" between from_timestamp and to_timestamp.
+    Analysis submissions carry their createdDate, so this can be given to the api as a submission filter to skip
+    submissions out of the date range before their analysis results are requested.
+    :param from_timestamp: unix timestamp (float)
+    :param to_timestamp: unix timestamp (float)
+    :return is_created_in_range: function
+    """
+
+    def is_created_in_range(a):
+        return from_timestamp <= a["createdDate"] <= to_timestamp
+
+    return is_created_in_range
+
+
+def all_of(*predicates):
+    """
+    Returns a predicate accepting objects accepted by every one of the predicates, checked in order.
+    None predicates are ignored.
+    :param predicates: functions returning a boolean
+    :return is_accepted: function
+    """
+    predicates = [p for p in predicates if p is not None]
+
+    def is_accepted(a):
+        return all(p(a) for p in predicates)
+
+    return is_accepted
+
+
+# Short names of the analysis submission fields in filter expressions. Any other field of the analysis submissions
+# can be used with its IRIDA name (eg. label).
+FIELD_ALIASES = {
+    "id": "identifier",
+    "name": "name",
+    "state": "analysisState",
+    "workflow": "workflowId",
+    "submitter": "submitter",
+    "created": "createdDate",
+    "modified": "modifiedDate"
+}
+
+# Fields compared as numbers, the others are compared as case insensitive strings.
+NUMERIC_FIELDS = {"identifier", "createdDate", "modifiedDate"}
+
+# Numeric fields holding unix timestamps (in millisecond), which can also be compared to dates as YYYY-mm-dd.
+DATE_FIELDS = {"createdDate", "modifiedDate"}
+
+_TOKEN_PATTERN = re.compile(r'\s*(?:(?P<string>"[^"]*"|\'[^\']*\')|(?P<operator><=|>=|!=|=|<|>|~)'
+                            r'|(?P<punctuation>[()\[\],])|(?P<word>[^\s()\[\],=!<>~"\']+))')
+
+
+def parse_expression(expression):
+    """
+    Parses a filter expression on the fields of analysis submissions, eg.
+        name ~ "salmonella*" and created >= 2021-01-01 and not id in [12, 15]
+    Comparisons are `field operator value`, with the operators = != < <= > >= (ordering), ~ (glob pattern with * and ?)
+    and `in` followed by a list of values. They are combined with and, or, not and parentheses.
+    See FIELD_ALIASES for the field names. Dates are compared by day: `created <= 2021-01-31` includes the whole day.
+    :param expression: string
+    :return predicate: Predicate, a function accepting or rejecting an analysis submission
+    :raises ValueError: if the expression is not valid
+    """
+    tokens = _tokenize(expression)
+    predicate, position = _parse_or(tokens, 0)
+    if position < len(tokens):
+        raise ValueError(f"Unexpected '{tokens[position][1]}' in filter expression.")
+    return predicate
+
+
+def _tokenize(expression):
+    """
+    Splits an expression into (kind, text) tokens. Keywords are words of kind "keyword".
+    """
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN_PATTERN.match(expression, position)
+        if match is None:
+            raise ValueError(f"Unexpected '{expression[position:].strip()}' in filter expression.")
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == "string":
+            text = text[1:-1]
+        elif kind == "word" and text.lower() in ("and", "or", "not", "in"):
+            kind, text = "keyword", text.lower()
+        tokens.append((kind, text))
+        position = match.end()
+
+    return tokens
+
+
+def _get_token(tokens, position):
+    return tokens[position] if position < len(tokens) else (None, None)
+
+
+def _parse_or(tokens, position):
+    predicate, position = _parse_and(tokens, position)
+    predicates = [predicate]
+    while _get_token(tokens, position) == ("keyword", "or"):
+        predicate, position = _parse_and(tokens, position + 1)
+        predicates.append(predicate)
+    return (predicates[0] if len(predicates) == 1 else Or(predicates)), position
+
+
+def _parse_and(tokens, position):
+    predicate, position = _parse_not(tokens, position)
+    predicates = [predicate]
+    while _get_token(tokens, position) == ("keyword", "and"):
+        predicate, position = _parse_not(tokens, position + 1)
+        predicates.append(predicate)
+    return (predicates[0] if len(predicates) == 1 else And(predicates)), position
+
+
+def _parse_not(tokens, position):
+    if _get_token(tokens, position) == ("keyword", "not"):
+        predicate, position = _parse_not(tokens, position + 1)
+        return Not(predicate), position
+    return _parse_comparison(tokens, position)
+
+
+def _parse_comparison(tokens, position):
+    kind, text = _get_token(tokens, position)
+    if (kind, text) == ("punctuation", "("):
+        predicate, position = _parse_or(tokens, position + 1)
+        if _get_token(tokens, position) != ("punctuation", ")"):
+            raise ValueError("Missing ')' in filter expression.")
+        return predicate, position + 1
+
+    if kind not in ("word", "string"):
+        raise ValueError(f"Expected a field name in filter expression, found '{text or 'the end'}'.")
+    field = FIELD_ALIASES.get(text.lower(), text)
+
+    operator_kind, operator = _get_token(tokens, position + 1)
+    if operator_kind == "keyword" and operator == "in":
+        values, position = _parse_list(tokens, position + 2)
+        return Or([_get_comparison(field, "=", value) for value in values]), position
+    if operator_kind != "operator":
+        raise ValueError(f"Expected an operator after '{text}' in filter expression.")
+
+    value_kind, value = _get_token(tokens, position + 2)
+    if value_kind not in ("word", "string"):
+        raise ValueError(f"Expected a value after '{text} {operator}' in filter expression.")
+
+    return _get_comparison(field, operator, value), position + 3
+
+
+def _parse_list(tokens, position):
+    if _get_token(tokens, position) != ("punctuation", "["):
+        raise ValueError("Expected a list of values like [1, 2, 3] after 'in' in filter expression.")
+
+    values = []
+    position = position + 1
+    while True:
+        kind, value = _get_token(tokens, position)
+        if kind not in ("word", "string"):
+            raise ValueError("Expected a value in the list of filter expression.")
+        values.append(value)
+
+        kind, text = _get_token(tokens, position + 1)
+        position = position + 2
+        if (kind, text) == ("punctuation", "]"):
+            return values, position
+        if (kind, text) != ("punctuation", ","):
+            raise ValueError("Missing ']' in filter expression.")
+
+
+def _get_comparison(field, operator, value):
+    """
+    Returns the predicate comparing a field to a value from an expression.
+    """
+    if operator == "~":
+        if field in NUMERIC_FIELDS:
+            raise ValueError(f"Patterns (~) can not be used with {field}.")
+        return Pattern(field, value.lower())
+
+    if field in DATE_FIELDS and re.fullmatch(r"\d{4}-\d{2}-\d{2}", value):
+        # a date is the range of timestamps of the whole day
+        start = util.local_to_timestamp(value)
+        end = start + 86400000
+        day = Range(field, start, True, end, False)
+        ranges = {
+            "=": day,
+            "!=": Not(day),
+            "<": Range(field, None, False, start, False),
+            "<=": Range(field, None, False, end, False),
+            ">": Range(field, end, True, None, False),
+            ">=": Range(field, start, True, None, False)
+        }
+        return ranges[operator]
+
+    value = _normalize(field, value)
+    if value is None:
+        raise ValueError(f"{field} must be compared to a number.")
+
+    comparisons = {
+        "=": lambda: Equal(field, value),
+        "!=": lambda: Not(Equal(field, value)),
+        "<": lambda: Range(field, None, False, value, False),
+        "<=": lambda: Range(field, None, False, value, True),
+        ">": lambda: Range(field, value, False, None, False),
+        ">=": lambda: Range(field, value, True, None, False)
+    }
+    return comparisons[operator]()
+
+
+def _normalize(field, value):
+    """
+    Returns the value of a field as it is compared: numbers for NUMERIC_FIELDS, lowercase strings otherwise.
+    Missing values (and numeric fields that are not numbers) are None.
+    """
+    if value is None:
+        return None
+    if field in NUMERIC_FIELDS:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return str(value).lower()
+
+
+def _get_value(analysis_submission, field):
+    return _normalize(field, analysis_submission.get(field))
+
+
+class Predicate(object):
+    """
+    A filter on analysis submissions. Calling it with an analysis submission returns whether the submission is
+    accepted, so it can be used as a submission filter of IridaAPI.get_completed_amr_analysis_results().
+    select() returns the positions of the accepted submissions of a SubmissionIndex without scanning every submission.
+    """
+
+    def __call__(self, analysis_submission):
+        raise NotImplementedError
+
+    def select(self, index):
+        """
+        :param index: SubmissionIndex
+        :return positions: set of the positions of the accepted submissions in the index
+        """
+        raise NotImplementedError
+
+
+class Equal(Predicate):
+
+    def __init__(self, field, value):
+        self.field = field
+        self.value = value
+
+    def __call__(self, analysis_submission):
+        return _get_value(analysis_submission, self.field) == self.value
+
+    def select(self, index):
+        return set(index.get_hashed(self.field).get(self.value, ()))
+
+
+class Range(Predicate):
+    """
+    Accepts values between low and high. A None bound is unbounded.
+    """
+
+    def __init__(self, field, low, low_inclusive, high, high_inclusive):
+        self.field = field
+        self.low = low
+        self.low_inclusive = low_inclusive
+        self.high = high
+        self.high_inclusive = high_inclusive
+
+    def __call__(self, analysis_submission):
+        value = _get_value(analysis_submission, self.field)
+        if value is None:
+            return False
+        if self.low is not None and (value < self.low or (value == self.low and not self.low_inclusive)):
+            return False
+        if self.high is not None and (value > self.high or (value == self.high and not self.high_inclusive)):
+            return False
+        return True
+
+    def select(self, index):
+        values, positions = index.get_sorted(self.field)
+        start = 0
+        end = len(values)
+        if self.low is not None:
+            start = (bisect.bisect_left if self.low_inclusive else bisect.bisect_right)(values, self.low)
+        if self.high is not None:
+            end = (bisect.bisect_right if self.high_inclusive else bisect.bisect_left)(values, self.high)
+        return set(positions[start:end])
+
+
+class Pattern(Predicate):
+    """
+    Accepts values matching a case insensitive glob pattern (* matches anything, ? matches one character).
+    """
+
+    def __init__(self, field, pattern):
+        self.field = field
+        self.pattern = pattern
+        self.prefix = re.split(r"[*?\[]", pattern, maxsplit=1)[0]
+
+    def __call__(self, analysis_submission):
+        value = _get_value(analysis_submission, self.field)
+        return value is not None and fnmatch.fnmatchcase(value, self.pattern)
+
+    def select(self, index):
+        values, positions = index.get_sorted(self.field)
+        # only values starting with the literal prefix of the pattern can match
+        start = bisect.bisect_left(values, self.prefix)
+        end = bisect.bisect_left(values, self.prefix + "\U0010ffff") if self.prefix else len(values)
+        return {positions[i] for i in range(start, end) if fnmatch.fnmatchcase(values[i], self.pattern)}
+
+
+class Not(Predicate):
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def __call__(self, analysis_submission):
+        return not self.predicate(analysis_submission)
+
+    def select(self, index):
+        return set(range(len(index))) - self.predicate.select(index)
+
+
+class And(Predicate):
+
+    def __init__(self, predicates):
+        self.predicates = predicates
+
+    def __call__(self, analysis_submission):
+        return all(p(analysis_submission) for p in self.predicates)
+
+    def select(self, index):
+        positions = self.predicates[0].select(index)
+        for p in self.predicates[1:]:
+            if not positions:
+                break
+            positions = positions & p.select(index)
+        return positions
+
+
+class Or(Predicate):
+
+    def __init__(self, predicates):
+        self.predicates = predicates
+
+    def __call__(self, analysis_submission):
+        return any(p(analysis_submission) for p in self.predicates)
+
+    def select(self, index):
+        positions = set()
+        for p in self.predicates:
+            positions = positions | p.select(index)
+        return positions
+
+
+class SubmissionIndex(object):
+    """
+    Analysis submissions indexed by their fields, to select the submissions accepted by a Predicate without checking
+    every submission. Each field gets a hash index (value to positions) for = and `in`, and a sorted index for
+    ranges and patterns, built the first time the field is queried and reused by the next queries.
+    """
+
+    def __init__(self, analysis_submissions):
+        self.analysis_submissions = list(analysis_submissions)
+        self._hashed = {}  # { field : { value : [position, ...] } }
+        self._sorted = {}  # { field : ([value, ...], [position, ...]) } sorted by value
+
+    def __len__(self):
+        return len(self.analysis_submissions)
+
+    def get_hashed(self, field):
+        if field not in self._hashed:
+            hashed = {}
+            for position, analysis_submission in enumerate(self.analysis_submissions):
+                value = _get_value(analysis_submission, field)
+                if value is not None:
+                    hashed.setdefault(value, []).append(position)
+            self._hashed[field] = hashed
+        return self._hashed[field]
+
+    def get_sorted(self, field):
+        if field not in self._sorted:
+            pairs = sorted((value, position) for value, positions in self.get_hashed(field).items()
+                           for position in positions)
+            self._sorted[field] = ([value for value, _ in pairs], [position for _, position in pairs])
+        return self._sorted[field]
+
+    def select(self, predicate):
+        """
+        Returns the analysis submissions accepted by the predicate, in the order they were indexed.
+        :param predicate: Predicate
+        :return analysis_submissions: list
+        """
+        return [self.analysis_submissions[position] for position in sorted(predicate.select(self))]
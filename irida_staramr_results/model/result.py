@@ -1,3 +1,10 @@
+import io
+import logging
+import zipfile
+
+import openpyxl
+import pandas as pd
+from openpyxl.utils.exceptions import InvalidFileException
 
 SHEET_NAMES = {
     "staramr-resfinder.tsv": "ResFinder",
@@ -6,41 +13,208 @@ SHEET_NAMES = {
     "staramr-summary.tsv": "Summary",
     "staramr-plasmidfinder.tsv": "PlasmidFinder",
     "staramr-mlst.tsv": "MLST_Summary",
+    "staramr-pointfinder.tsv": "PointFinder",
     "staramr-excel.xlsx": "PointFinder"
 }
 
+# Columns shared by the files of the BLAST hits of genes (ResFinder, PlasmidFinder and PointFinder).
+_HIT_COLUMNS = {
+    "Isolate ID": str,
+    "Gene": "category",
+    "%Identity": "float64",
+    "%Overlap": "float64",
+    "HSP Length/Total Length": str,
+    "Contig": str,
+    "Start": "Int64",
+    "End": "Int64",
+    "Accession": str,
+}
+
+# Columns of each StarAMR output file and their types, applied when the file is parsed so a column has the same type in
+# every analysis, whatever its values look like (eg. an isolate id or sequence type that looks like a number). Names of
+# genes, drugs, plasmids and schemes repeat across isolates and are categoricals. Columns a file doesn't have are
+# ignored, and columns a schema doesn't declare (eg. the loci of MLST schemes) are inferred.
+SCHEMAS = {
+    "staramr-resfinder.tsv": dict(_HIT_COLUMNS, **{"Predicted Phenotype": "category"}),
+    "staramr-detailed-summary.tsv": dict(_HIT_COLUMNS, **{"Predicted Phenotype": "category",
+                                                          "Data Type": "category"}),
+    "staramr-settings.txt": {},
+    "staramr-summary.tsv": {
+        "Isolate ID": str,
+        "Quality Module": "category",
+        "Genotype": str,
+        "Predicted Phenotype": str,
+        "Plasmid": str,
+        "Scheme": "category",
+        "Sequence Type": str,
+        "Genome Length": "Int64",
+        "N50 value": "Int64",
+        "Number of Contigs Greater Than Or Equal To 300 bp": "Int64",
+        "Quality Module Feedback": str,
+    },
+    "staramr-plasmidfinder.tsv": dict(_HIT_COLUMNS),
+    "staramr-mlst.tsv": {
+        "Isolate ID": str,
+        "Scheme": "category",
+        "Sequence Type": str,
+    },
+    "staramr-pointfinder.tsv": dict(_HIT_COLUMNS, **{"Predicted Phenotype": "category",
+                                                     "Type": "category",
+                                                     "Position": "Int64",
+                                                     "Mutation": str}),
+}
+SCHEMAS["staramr-excel.xlsx"] = SCHEMAS["staramr-pointfinder.tsv"]
+
 
 class Result(object):
 
     def __init__(self, file_json, file_txt, file_key):
+        """
+        :param file_json: link of the file
+        :param file_txt: bytes of the file, or None if the analysis did not produce it (eg. PointFinder results of
+            an analysis that did not search for point mutations), which is an empty sheet
+        :param file_key: file name with extension, eg. staramr-resfinder.tsv
+        """
         self.file_info = file_json
         self.file_content = file_txt
         self.file_key = file_key
+        self._contents = None
+        self._data_frame = None
 
     def get_contents(self):
+        """
+        Returns the contents of the file: bytes of the excel file, a dictionary of the settings of settings.txt or the
+        text of the tsv files. The contents are decoded once, then reused.
+        """
+        if self._contents is None:
+            self._contents = self._decode_contents()
+
+        return self._contents
+
+    def _decode_contents(self):
+        if self.file_content is None:
+            return None
+
         # Excel files do not need to be converted to utf-8 strings
-        # Pointfinder data is ripped from excel file as tsv file for pointfinder is not included
+        # Pointfinder data is ripped from excel file when the analysis has no staramr-pointfinder.tsv
         if self.file_key == "staramr-excel.xlsx":
             # return raw excel file data
             return self.file_content
 
+        # reformat settings.txt contents to a key:value pairs.
+        if "settings.txt" in self.file_key:
+            return _parse_settings(self.file_content)
+
         # convert bytes contents to string
-        contents_str = str(self.file_content, 'utf-8')
+        return str(self.file_content, 'utf-8')
 
-        # reformat settings.txt contents to a key:value pairs.
-        if "settings.txt" in self.file_info["label"]:
-            settings_dict = {}
-            lines = contents_str.split("\n")
-            for line in lines:
-                settings_row = line.split("=")
-                if len(settings_row) > 1:
-                    settings_dict[settings_row[0].strip()] = settings_row[1].strip()
-            return settings_dict
+    def get_data_frame(self):
+        """
+        Returns the contents of the file as a data frame, parsed from the bytes of the file without decoding them to a
+        string first. The data frame is parsed once, then reused, so it must not be modified.
+        """
+        if self._data_frame is None:
+            self._data_frame = self._parse_data_frame()
+
+        return self._data_frame
+
+    def _parse_data_frame(self):
+        if self.file_content is None:
+            return pd.DataFrame()
+
+        if "settings.txt" in self.file_key:
+            return pd.DataFrame([self.get_contents()])
+
+        schema = SCHEMAS.get(self.file_key, {})
+        try:
+            return self._read_file(schema)
+        except (ValueError, TypeError) as e:
+            # a value that doesn't fit the schema, eg. from a newer StarAMR version, must not stop the export
+            logging.warning(f"{self.file_key} does not match the schema of StarAMR results, "
+                            f"its column types are inferred instead: {e}")
+            return self._read_file(None)
 
-        return contents_str
+    def _read_file(self, schema):
+        # Pointfinder data comes from the specified "PointFinder" page of an excel sheet.
+        if self.file_key == "staramr-excel.xlsx":
+            return _read_excel_sheet(self.file_content, self.get_sheet_name(), schema)
+
+        # BytesIO shares the buffer of the bytes, they are not copied
+        return pd.read_csv(io.BytesIO(self.file_content), delimiter="\t", encoding="utf-8", dtype=schema)
 
     def get_file_name(self):
-        return self.file_info["label"]
+        return self.file_key
 
     def get_sheet_name(self):
         return SHEET_NAMES[self.file_key]
+
+
+def is_pointfinder_enabled(settings):
+    """
+    Returns whether an analysis searched for PointFinder point mutations, which StarAMR only does when run with
+    --pointfinder-organism, given the dictionary of its settings.txt. Settings without the command line are assumed to
+    have searched, so their PointFinder results are not missed.
+    :param settings: dictionary returned by Result.get_contents() of staramr-settings.txt
+    :return boolean:
+    """
+    if "command_line" not in settings:
+        return True
+
+    return "--pointfinder-organism" in settings["command_line"]
+
+
+def _read_excel_sheet(file_content, sheet_name, schema=None):
+    """
+    Returns a sheet of an excel file as a data frame. The workbook is opened read-only, which streams the rows of that
+    sheet from the file instead of loading every sheet, so the other sheets of staramr-excel.xlsx are never parsed.
+    :param file_content: bytes of the excel file
+    :param sheet_name:
+    :param schema: optional dictionary of column:type, like the dtype of pd.read_csv()
+    :return data_frame: empty if the file is not an excel file or has no such sheet
+    """
+    try:
+        workbook = openpyxl.load_workbook(io.BytesIO(file_content), read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException):
+        return pd.DataFrame()
+
+    try:
+        if sheet_name not in workbook.sheetnames:
+            return pd.DataFrame()
+
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        data_frame = pd.DataFrame.from_records(list(rows), columns=list(header))
+    finally:
+        workbook.close()
+
+    # like pd.read_excel(), blank rows are skipped
+    data_frame = data_frame.dropna(how="all").reset_index(drop=True)
+
+    for column, dtype in (schema or {}).items():
+        if column not in data_frame.columns:
+            continue
+        if dtype is str:
+            # like pd.read_csv(), missing values stay missing
+            data_frame[column] = data_frame[column].map(str, na_action="ignore")
+        else:
+            data_frame[column] = data_frame[column].astype(dtype)
+
+    return data_frame
+
+
+def _parse_settings(file_content):
+    """
+    Returns the key = value lines of settings.txt as a dictionary, splitting the bytes before decoding each key and
+    value. Values are everything after the first "=", so options like --min-coverage=98 are kept whole.
+    :param file_content: bytes
+    :return settings_dict:
+    """
+    settings_dict = {}
+    for line in file_content.splitlines():
+        key, separator, value = line.partition(b"=")
+        if separator:
+            settings_dict[key.strip().decode("utf-8")] = value.strip().decode("utf-8")
+
+    return settings_dict
@@ -3,6 +3,16 @@ import logging
 
 from irida_staramr_results import parser
 
+# Optional keys of the configuration file limiting the requests made to IRIDA, with their type and default value.
+# None is no limit.
+REQUEST_SETTINGS = {
+    "requests-per-second": (float, None),
+    "max-concurrency": (int, None),
+    "max-retries": (int, 5),
+    "backoff-factor": (float, 0.5),
+    "max-backoff": (float, 60)
+}
+
 
 def parse_config(config_file_path):
     """
@@ -27,4 +37,16 @@ def parse_config(config_file_path):
                       f"Ensure your client information in the configuration file is correct.")
         raise parser.exceptions.ConfigInformationError()
 
+    for key, (value_type, default) in REQUEST_SETTINGS.items():
+        value = config_info.get(key, default)
+        if value is not None:
+            try:
+                value = value_type(value)
+            except (TypeError, ValueError):
+                value = None
+            if value is None or value < 0 or (value == 0 and key != "max-retries"):
+                logging.error(f"The value of {key} in the config file must be a positive number.")
+                raise parser.exceptions.ConfigInformationError()
+        config_dict[key.replace("-", "_")] = value
+
     return config_dict
@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import shutil
+
+# Analysis states that never change once an analysis submission reaches them.
+TERMINAL_ANALYSIS_STATES = ("COMPLETED", "ERROR")
+
+# State file used by incremental exports when none is given.
+DEFAULT_STATE_FILE = "staramr-results-state.json"
+
+
+class ExportState(object):
+    """
+    Record of the analysis submissions already exported per project, saved as a JSON file between incremental runs.
+    For each project it keeps the highest submission id seen (and its createdDate), the ids of the submissions up to it
+    that were not exported yet, and the path of the combined report the results were written to. eg.
+    { "1": {"last_submission_id": 120, "last_created_date": 1617858000000, "pending_submission_ids": [117],
+            "report": "/path/to/output.xlsx"}, ... }
+
+    Submission ids only go up, so the next run can skip every submission up to last_submission_id before requesting
+    any analysis result, except the pending ones: submissions still running or whose analysis result could not be
+    requested, which are checked again on the next run without exporting again the submissions after them.
+    """
+
+    def __init__(self, state_file_path=DEFAULT_STATE_FILE):
+        """
+        Loads the state file, if it exists.
+        :param state_file_path: path of the JSON state file
+        """
+        self.state_file_path = state_file_path
+        self._projects = {}
+        self._new_submissions = {}  # { project_id : [analysis submission, ...] } seen during this run
+
+        if os.path.isfile(state_file_path):
+            with open(state_file_path, "r") as file:
+                self._projects = json.load(file)
+            logging.debug(f"Loaded export state of projects {list(self._projects)} from {state_file_path}.")
+
+    def _get_project(self, project_id):
+        return self._projects.get(str(project_id), {})
+
+    def get_last_submission_id(self, project_id):
+        """
+        Returns the highest submission id of the project seen by a previous run, or 0.
+        :param project_id: integer
+        :return last_submission_id: integer
+        """
+        return self._get_project(project_id).get("last_submission_id", 0)
+
+    def get_pending_submission_ids(self, project_id):
+        """
+        Returns the ids of the submissions of the project up to the last submission id that were not exported yet.
+        :param project_id: integer
+        :return pending_submission_ids: list of integers
+        """
+        return self._get_project(project_id).get("pending_submission_ids", [])
+
+    def get_report(self, project_id):
+        """
+        Returns the path of the combined report the project was exported to, or None.
+        :param project_id: integer
+        :return report: string
+        """
+        return self._get_project(project_id).get("report")
+
+    def submission_filter(self, project_id):
+        """
+        Returns a predicate accepting only analysis submissions of the project that were not exported yet.
+        The new submissions it sees are remembered to update the state once the export is done, so it must be the last
+        predicate of a submission filter: a submission rejected by the others (eg. outside the date range) would
+        otherwise be recorded as exported.
+        :param project_id: integer
+        :return is_new_submission: function
+        """
+        last_submission_id = self.get_last_submission_id(project_id)
+        pending_submission_ids = set(self.get_pending_submission_ids(project_id))
+        new_submissions = self._new_submissions.setdefault(project_id, [])
+
+        def is_new_submission(analysis_submission):
+            submission_id = int(analysis_submission["identifier"])
+            if submission_id <= last_submission_id and submission_id not in pending_submission_ids:
+                return False
+            new_submissions.append(analysis_submission)
+            return True
+
+        return is_new_submission
+
+    def update(self, project_id, failed_submission_ids=(), report=None):
+        """
+        Moves the last submission id of the project past the new submissions seen by its submission filter.
+        Those that are not COMPLETED or ERROR yet, or whose analysis result failed, are kept as pending submissions.
+        :param project_id: integer
+        :param failed_submission_ids: ids of the submissions whose analysis result could not be requested
+        :param report: path of the combined report the results were written to
+        :return None:
+        """
+        project = dict(self._get_project(project_id))
+        failed_submission_ids = {int(i) for i in failed_submission_ids}
+        pending_submission_ids = set(project.get("pending_submission_ids", []))
+
+        for analysis_submission in self._new_submissions.pop(project_id, []):
+            submission_id = int(analysis_submission["identifier"])
+            if (analysis_submission["analysisState"] not in TERMINAL_ANALYSIS_STATES
+                    or submission_id in failed_submission_ids):
+                pending_submission_ids.add(submission_id)
+            else:
+                pending_submission_ids.discard(submission_id)
+            if submission_id > project.get("last_submission_id", 0):
+                project["last_submission_id"] = submission_id
+                project["last_created_date"] = analysis_submission["createdDate"]
+
+        project["pending_submission_ids"] = sorted(pending_submission_ids)
+
+        if report is not None:
+            project["report"] = os.path.abspath(report)
+
+        self._projects[str(project_id)] = project
+
+    def save(self):
+        """
+        Writes the state file, replacing the previous one only once it is completely written.
+        :return None:
+        """
+        temp_path = self.state_file_path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self._projects, file, indent=2)
+        os.replace(temp_path, self.state_file_path)
+
+
+class ExportCheckpoint(object):
+    """
+    Progress of an export to an output directory, so an interrupted export can be resumed without downloading again
+    the analyses it already wrote. The ids of the analyses done are appended to a checkpoint file as each analysis is
+    done, eg. <directory_name>/.checkpoint-output.jsonl, along with the spooled accumulator's checkpoint when the
+    results of every analysis are combined in one output file. The spool files are kept in the output directory too,
+    eg. <directory_name>/.spool-output, and both are removed once the output files are written.
+    When each analysis is written to its own output files, the name of those files is recorded before they are written,
+    so an analysis whose files were written but not recorded as done yet overwrites them when resumed.
+    """
+
+    def __init__(self, directory_name, output_file_name):
+        """
+        Loads the checkpoint of the output file name, if it exists.
+        :param directory_name: output directory of the export
+        :param output_file_name: name of the output file(s) of the export
+        """
+        self.checkpoint_path = os.path.join(directory_name, f".checkpoint-{output_file_name}.jsonl")
+        self.spool_dir = os.path.join(directory_name, f".spool-{output_file_name}")
+        self.analysis_ids = set()
+        self.accumulator_checkpoint = None
+        self.report_appended = False
+        self.output_file_names = {}  # { analysis id : name of its output files }
+
+        if os.path.isfile(self.checkpoint_path):
+            size = 0
+            with open(self.checkpoint_path, "rb") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line) if line.endswith(b"\n") else None
+                    except ValueError:
+                        record = None
+                    if record is None:
+                        break
+                    size = size + len(line)
+                    if "analysis_id" in record:
+                        self.analysis_ids.add(record["analysis_id"])
+                        self.accumulator_checkpoint = record.get("accumulator")
+                    if "reserved_analysis_id" in record:
+                        self.output_file_names[record["reserved_analysis_id"]] = record["output_file_name"]
+                    self.report_appended = record.get("report_appended", self.report_appended)
+
+            # the last line is incomplete if the export stopped while writing it
+            os.truncate(self.checkpoint_path, size)
+            logging.info(f"Resuming from {self.checkpoint_path}, {len(self.analysis_ids)} analyses were already "
+                         f"downloaded.")
+
+    def is_done(self, analysis_id):
+        return str(analysis_id) in self.analysis_ids
+
+    def add(self, analysis_id, accumulator=None):
+        """
+        Records an analysis as done.
+        :param analysis_id:
+        :param accumulator: optional SpooledDataFrameAccumulator the results of the analysis were added to
+        :return None:
+        """
+        record = {"analysis_id": str(analysis_id)}
+        if accumulator is not None:
+            record["accumulator"] = accumulator.get_checkpoint()
+            self.accumulator_checkpoint = record["accumulator"]
+        self._append(record)
+        self.analysis_ids.add(str(analysis_id))
+
+    def get_output_file_name(self, analysis_id):
+        """
+        Returns the name of the output files reserved for an analysis, or None.
+        :param analysis_id:
+        :return output_file_name:
+        """
+        return self.output_file_names.get(str(analysis_id))
+
+    def reserve_output_file_name(self, analysis_id, output_file_name):
+        """
+        Records the name of the output files of an analysis, before they are written.
+        :param analysis_id:
+        :param output_file_name:
+        :return None:
+        """
+        self._append({"reserved_analysis_id": str(analysis_id), "output_file_name": output_file_name})
+        self.output_file_names[str(analysis_id)] = output_file_name
+
+    def set_report_appended(self):
+        """
+        Records the combined results were appended to the previous report, so resuming does not append them again.
+        :return None:
+        """
+        self._append({"report_appended": True})
+        self.report_appended = True
+
+    def _append(self, record):
+        with open(self.checkpoint_path, "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+    def remove(self):
+        """
+        Removes the checkpoint file and the spool files, once the export is complete.
+        :return None:
+        """
+        if os.path.isfile(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
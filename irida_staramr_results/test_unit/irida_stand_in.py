@@ -0,0 +1,194 @@
+import hashlib
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+
+# Time the first analysis submission was created, the next ones are created one second apart.
+FIRST_CREATED_DATE = 1611122400000
+
+# Contents of the text results files of an analysis, {i} is the analysis submission id.
+RESULT_FILES = {
+    "staramr-resfinder.tsv": "Isolate ID\tGene\tPredicted Phenotype\t%Identity\nS{i}\tblaTEM-1B\tampicillin\t100.0\n",
+    "staramr-detailed-summary.tsv": "Isolate ID\tGene\tData Type\nS{i}\tblaTEM-1B\tResistance\n",
+    "staramr-settings.txt": "command_line = staramr search --pointfinder-organism salmonella\nversion = 0.7.1\n",
+    "staramr-summary.tsv": "Isolate ID\tQuality Module\tGenotype\nS{i}\tPassed\tblaTEM-1B\n",
+    "staramr-plasmidfinder.tsv": "Isolate ID\tGene\nS{i}\tColRNAI\n",
+    "staramr-mlst.tsv": "Isolate ID\tScheme\tSequence Type\nS{i}\tsenterica\t19\n",
+}
+
+# Contents of staramr-pointfinder.tsv, served when the stand-in has pointfinder_tsv.
+POINTFINDER_FILE = "Isolate ID\tGene\tType\tPosition\nS{i}\tgyrA (S83F)\tcodon\t83\n"
+
+# Contents of staramr-settings.txt of an analysis that did not search for PointFinder point mutations.
+SETTINGS_WITHOUT_POINTFINDER = "command_line = staramr search\nversion = 0.7.1\n"
+
+
+def _get_excel_file():
+    """
+    Returns a staramr-excel.xlsx file with a PointFinder sheet.
+    """
+    excel_file = io.BytesIO()
+    with pd.ExcelWriter(excel_file, engine="xlsxwriter") as writer:
+        pd.DataFrame({"Isolate ID": ["S1"], "Gene": ["gyrA (S83F)"]}).to_excel(writer, sheet_name="PointFinder",
+                                                                               index=False)
+    return excel_file.getvalue()
+
+
+class IridaStandIn(object):
+    """
+    A local stand-in for the parts of the IRIDA REST API used by irida-staramr-results, served on a free port.
+    Each project has submission_count analysis submissions with ids 1 to submission_count: every fifth submission is
+    in ERROR and every third one is a SISTR analysis, the others are COMPLETED StarAMR analyses.
+    IRIDA returns the analysis submissions of a project in a single response, with page_size they are paged with
+    "next" links instead. Analyses have a staramr-pointfinder.tsv output file with pointfinder_tsv, and did not search
+    for PointFinder point mutations without pointfinder_enabled.
+    The next overloaded_responses GET requests are answered 503 Service Unavailable, with a Retry-After header of
+    retry_after seconds.
+    Json responses have an ETag, and conditional requests with a matching If-None-Match are answered 304 Not Modified.
+    """
+
+    def __init__(self, project_ids=(1,), submission_count=10, page_size=None, pointfinder_tsv=False,
+                 pointfinder_enabled=True):
+        self.project_ids = [str(project_id) for project_id in project_ids]
+        self.submission_count = submission_count
+        self.page_size = page_size
+        self.pointfinder_tsv = pointfinder_tsv
+        self.pointfinder_enabled = pointfinder_enabled
+        self.deleted_submission_ids = set()  # ids of the analysis submissions left out of the projects
+        self.overloaded_responses = 0
+        self.retry_after = "0"
+        self._overloaded_lock = threading.Lock()
+        self.requests = []  # paths of every GET request, in order
+        self.not_modified = []  # paths of the GET requests answered 304 Not Modified, in order
+        self._excel_file = _get_excel_file()
+        self._server = None
+
+    def start(self):
+        """
+        Starts serving in a background thread.
+        :return base_url: url of the stand-in api, eg. http://127.0.0.1:8080/api/
+        """
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._get_handler())
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}/api/"
+
+    def get_analysis_submission(self, i):
+        return {"identifier": str(i),
+                "name": f"submission-{i}",
+                "analysisState": "ERROR" if i % 5 == 0 else "COMPLETED",
+                "createdDate": FIRST_CREATED_DATE + i * 1000}
+
+    def get_analysis_result(self, i):
+        file_keys = list(RESULT_FILES) + ["staramr-excel.xlsx"]
+        if self.pointfinder_tsv:
+            file_keys.append("staramr-pointfinder.tsv")
+        return {"identifier": str(1000 + i),
+                "createdDate": FIRST_CREATED_DATE + i * 1000,
+                "analysisType": {"type": "SISTR_TYPING" if i % 3 == 0 else "AMR_DETECTION"},
+                "links": [{"rel": "outputFile/" + file_key,
+                           "href": f"{self.base_url}analysisSubmissions/{i}/analysis/file/{file_key}"}
+                          for file_key in file_keys]}
+
+    def _get_response(self, path, query):
+        """
+        Returns the json dictionary or bytes served for a path, or None if the path does not exist.
+        """
+        parts = path.strip("/").split("/")[1:]  # without the leading api
+
+        if not parts:
+            return {"resource": {"links": [{"rel": "projects", "href": self.base_url + "projects"},
+                                           {"rel": "analysisSubmissions",
+                                            "href": self.base_url + "analysisSubmissions"}]}}
+
+        if parts == ["projects"]:
+            return {"resource": {"links": [], "resources": [
+                {"identifier": project_id,
+                 "links": [{"rel": "project/analyses", "href": f"{self.base_url}projects/{project_id}/analyses"}]}
+                for project_id in self.project_ids]}}
+
+        if len(parts) == 3 and parts[0] == "projects" and parts[2] == "analyses" and parts[1] in self.project_ids:
+            submission_ids = [i for i in range(1, self.submission_count + 1) if i not in self.deleted_submission_ids]
+            links = []
+            if self.page_size is not None:
+                page = int(query.get("page", ["0"])[0])
+                if (page + 1) * self.page_size < len(submission_ids):
+                    links.append({"rel": "next", "href": f"{self.base_url}{'/'.join(parts)}?page={page + 1}"})
+                submission_ids = submission_ids[page * self.page_size:(page + 1) * self.page_size]
+            return {"resource": {"links": links,
+                                 "resources": [self.get_analysis_submission(i) for i in submission_ids]}}
+
+        if len(parts) >= 3 and parts[0] == "analysisSubmissions" and parts[2] == "analysis":
+            i = int(parts[1])
+            if len(parts) == 3:
+                return {"resource": self.get_analysis_result(i)}
+            if len(parts) == 5 and parts[3] == "file":
+                if parts[4] == "staramr-excel.xlsx":
+                    return self._excel_file
+                if parts[4] == "staramr-pointfinder.tsv" and self.pointfinder_tsv:
+                    return POINTFINDER_FILE.format(i=i).encode()
+                if parts[4] == "staramr-settings.txt" and not self.pointfinder_enabled:
+                    return SETTINGS_WITHOUT_POINTFINDER.encode()
+                return RESULT_FILES[parts[4]].format(i=i).encode()
+
+        return None
+
+    def _get_handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                # oauth/token
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self._send(200, json.dumps({"access_token": "token", "expires_in": 43199}).encode(),
+                           "application/json")
+
+            def do_GET(self):
+                stand_in.requests.append(self.path)
+                with stand_in._overloaded_lock:
+                    overloaded = stand_in.overloaded_responses > 0
+                    stand_in.overloaded_responses = stand_in.overloaded_responses - overloaded
+                if overloaded:
+                    self._send(503, b"", "text/plain", {"Retry-After": stand_in.retry_after})
+                    return
+
+                url = urlparse(self.path)
+                response = stand_in._get_response(url.path, parse_qs(url.query))
+                if response is None:
+                    self._send(404, b"", "text/plain")
+                elif isinstance(response, bytes):
+                    self._send(200, response, "application/octet-stream")
+                else:
+                    body = json.dumps(response).encode()
+                    etag = '"' + hashlib.sha256(body).hexdigest() + '"'
+                    if self.headers.get("If-None-Match") == etag:
+                        stand_in.not_modified.append(self.path)
+                        self._send(304, b"", "application/json", {"ETag": etag})
+                    else:
+                        self._send(200, body, "application/json", {"ETag": etag})
+
+        return Handler
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from irida_staramr_results.accumulator import DataFrameAccumulator, SpooledDataFrameAccumulator
+
+
+class TestAccumulator(unittest.TestCase):
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def tearDown(self):
+        pass
+
+    def test_to_data_frames(self):
+        """
+        Test data frames of every analysis are concatenated per sheet, in order.
+        :return:
+        """
+
+        accumulator = DataFrameAccumulator()
+        accumulator.add_data_frames({
+            "Summary": pd.DataFrame({"Isolate ID": ["SAMPLE1"], "Genotype": ["blaTEM-1B"]}),
+            "PointFinder": pd.DataFrame()
+        })
+        accumulator.add_data_frames({
+            "Summary": pd.DataFrame({"Isolate ID": ["SAMPLE2", "SAMPLE3"], "Genotype": ["None", "aac(6')-Iaa"],
+                                     "Quality Module": ["Passed", "Failed"]}),
+            "PointFinder": pd.DataFrame()
+        })
+
+        res = accumulator.to_data_frames()
+
+        self.assertEqual(list(res), ["Summary", "PointFinder"])
+        self.assertEqual(list(res["Summary"]["Isolate ID"]), ["SAMPLE1", "SAMPLE2", "SAMPLE3"])
+        self.assertEqual(list(res["Summary"].columns), ["Isolate ID", "Genotype", "Quality Module"])
+        self.assertEqual(list(res["Summary"].index), [0, 1, 2])
+        self.assertTrue(res["PointFinder"].empty)
+
+    def test_spooled_accumulator(self):
+        """
+        Test the spooled accumulator keeps data frames on disk and gives them back in order.
+        :return:
+        """
+
+        with tempfile.TemporaryDirectory() as spool_dir:
+            accumulator = SpooledDataFrameAccumulator(spool_dir)
+            for i in range(3):
+                accumulator.add_data_frames({
+                    "ResFinder": pd.DataFrame({"Isolate ID": [f"SAMPLE{i}"] * 2, "%Identity": [100.0, 99.5]}),
+                    "Settings": pd.DataFrame([{"version": "0.7.1"}])
+                })
+
+            self.assertEqual(len(os.listdir(spool_dir)), 2)
+            self.assertEqual(accumulator.get_sheet_names(), ["ResFinder", "Settings"])
+            self.assertEqual(accumulator.get_row_count("ResFinder"), 6)
+
+            chunks = list(accumulator.iter_chunks("ResFinder"))
+            self.assertEqual([list(c["Isolate ID"]) for c in chunks],
+                             [["SAMPLE0", "SAMPLE0"], ["SAMPLE1", "SAMPLE1"], ["SAMPLE2", "SAMPLE2"]])
+            self.assertEqual(len(accumulator.to_data_frames()["Settings"]), 3)
+
+    def test_spooled_accumulator_restore(self):
+        """
+        Test restoring a checkpoint drops the data frames added after it.
+        :return:
+        """
+
+        with tempfile.TemporaryDirectory() as spool_dir:
+            accumulator = SpooledDataFrameAccumulator(spool_dir)
+            accumulator.add_data_frames({"ResFinder": pd.DataFrame({"Isolate ID": ["SAMPLE0"]}),
+                                         "PointFinder": pd.DataFrame()})
+            checkpoint = accumulator.get_checkpoint()
+
+            accumulator.add_data_frames({"ResFinder": pd.DataFrame({"Isolate ID": ["SAMPLE1"], "Gene": ["blaTEM-1B"]}),
+                                         "PointFinder": pd.DataFrame({"Isolate ID": ["SAMPLE1"]})})
+
+            accumulator = SpooledDataFrameAccumulator(spool_dir)
+            accumulator.restore(checkpoint)
+            self.assertEqual(accumulator.get_columns("ResFinder"), ["Isolate ID"])
+            self.assertEqual(accumulator.get_row_count("PointFinder"), 0)
+            self.assertEqual(len(os.listdir(spool_dir)), 1)
+
+            accumulator.add_data_frames({"ResFinder": pd.DataFrame({"Isolate ID": ["SAMPLE2"]}),
+                                         "PointFinder": pd.DataFrame({"Isolate ID": ["SAMPLE2"]})})
+            res = accumulator.to_data_frames()
+            self.assertEqual(list(res["ResFinder"]["Isolate ID"]), ["SAMPLE0", "SAMPLE2"])
+            self.assertEqual(list(res["PointFinder"]["Isolate ID"]), ["SAMPLE2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
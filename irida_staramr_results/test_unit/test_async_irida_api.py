@@ -0,0 +1,72 @@
+import tempfile
+import unittest
+
+from irida_staramr_results.api import AsyncIridaAPI, IridaAPI
+from irida_staramr_results.cache import ResultFileCache
+from irida_staramr_results.test_unit.irida_stand_in import IridaStandIn, RESULT_FILES
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+@unittest.skipIf(aiohttp is None, "aiohttp is not installed")
+class TestAsyncIridaApi(unittest.TestCase):
+    """
+    Tests of AsyncIridaAPI requesting a local stand-in for the IRIDA REST API.
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.stand_in = IridaStandIn(submission_count=20, page_size=6)
+        self.stand_in.start()
+        self.addCleanup(self.stand_in.stop)
+
+    def _get_api(self, **kwargs):
+        irida_api = AsyncIridaAPI("client", "secret", self.stand_in.base_url, "user", "password", max_workers=8,
+                                  **kwargs)
+        self.addCleanup(irida_api.close)
+        return irida_api
+
+    def test_get_completed_amr_analysis_results(self):
+        """
+        Test the asynchronous client finds the same analyses as the synchronous one, with the same requests.
+        :return:
+        """
+
+        irida_api = self._get_api()
+        res = irida_api.get_completed_amr_analysis_results(1, show_progress=False)
+        request_count = irida_api.request_count
+
+        expected_api = IridaAPI("client", "secret", self.stand_in.base_url, "user", "password")
+        expected = expected_api.get_completed_amr_analysis_results(1, show_progress=False)
+
+        self.assertEqual(res, expected)
+        self.assertEqual(request_count, expected_api.request_count)
+
+    def test_get_analysis_result_files(self):
+        """
+        Test the results files are returned in order, and the cached ones are not requested again.
+        :return:
+        """
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            irida_api = self._get_api(result_cache=ResultFileCache(cache_dir))
+            analysis_results = irida_api.get_completed_amr_analysis_results(1, show_progress=False)
+            request_count = irida_api.request_count
+
+            result_files = irida_api.get_analysis_result_files(analysis_results[1]["identifier"],
+                                                               analysis_results[1])
+            self.assertEqual([f.get_file_name() for f in result_files], list(RESULT_FILES) + ["staramr-excel.xlsx"])
+            self.assertEqual(result_files[3].get_contents(), RESULT_FILES["staramr-summary.tsv"].format(i=2))
+            self.assertEqual(irida_api.request_count, request_count + 7)
+
+            cached_result_files = irida_api.get_analysis_result_files(analysis_results[1]["identifier"],
+                                                                      analysis_results[1])
+            self.assertEqual([f.file_content for f in cached_result_files], [f.file_content for f in result_files])
+            self.assertEqual(irida_api.request_count, request_count + 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
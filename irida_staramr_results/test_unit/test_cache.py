@@ -0,0 +1,117 @@
+import tempfile
+import unittest
+
+from irida_staramr_results.cache import ResultFileCache, ResponseCache
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_get_put(self):
+        """
+        Test cached file contents are returned for the same server, analysis and file only.
+        :return:
+        """
+
+        cache = ResultFileCache(self.cache_dir.name)
+        cache.put("http://localhost/api/", 1, "staramr-summary.tsv", b"Isolate ID\tGenotype\n")
+
+        self.assertEqual(cache.get("http://localhost/api/", 1, "staramr-summary.tsv"), b"Isolate ID\tGenotype\n")
+        self.assertIsNone(cache.get("http://localhost/api/", 1, "staramr-mlst.tsv"))
+        self.assertIsNone(cache.get("http://localhost/api/", 2, "staramr-summary.tsv"))
+        self.assertIsNone(cache.get("http://otherhost/api/", 1, "staramr-summary.tsv"))
+        cache.close()
+
+        # the cache persists between runs
+        cache = ResultFileCache(self.cache_dir.name)
+        self.assertEqual(cache.get("http://localhost/api/", 1, "staramr-summary.tsv"), b"Isolate ID\tGenotype\n")
+        cache.close()
+
+    def test_corrupted_file(self):
+        """
+        Test a file that fails its integrity check is removed from the cache.
+        :return:
+        """
+
+        cache = ResultFileCache(self.cache_dir.name)
+        cache.put("http://localhost/api/", 1, "staramr-summary.tsv", b"Isolate ID\tGenotype\n")
+        with cache._connection:
+            cache._connection.execute("UPDATE result_files SET content = ?", (b"Isolate ID\tGeno",))
+
+        self.assertIsNone(cache.get("http://localhost/api/", 1, "staramr-summary.tsv"))
+        self.assertEqual(cache._connection.execute("SELECT COUNT(*) FROM result_files").fetchone()[0], 0)
+        cache.close()
+
+    def test_evict_least_recently_used(self):
+        """
+        Test the least recently used files are evicted when the cache is over its maximum size.
+        :return:
+        """
+
+        cache = ResultFileCache(self.cache_dir.name, max_size=30)
+        cache.put("http://localhost/api/", 1, "staramr-summary.tsv", b"0123456789")
+        cache.put("http://localhost/api/", 2, "staramr-summary.tsv", b"0123456789")
+        cache.put("http://localhost/api/", 3, "staramr-summary.tsv", b"0123456789")
+
+        # analysis 1 is used again, so analysis 2 is now the least recently used
+        cache.get("http://localhost/api/", 1, "staramr-summary.tsv")
+        cache.put("http://localhost/api/", 4, "staramr-summary.tsv", b"0123456789")
+
+        self.assertIsNotNone(cache.get("http://localhost/api/", 1, "staramr-summary.tsv"))
+        self.assertIsNone(cache.get("http://localhost/api/", 2, "staramr-summary.tsv"))
+        self.assertIsNotNone(cache.get("http://localhost/api/", 3, "staramr-summary.tsv"))
+        self.assertIsNotNone(cache.get("http://localhost/api/", 4, "staramr-summary.tsv"))
+        cache.close()
+
+    def test_total_size(self):
+        """
+        Test the total size of the cached files counts replaced files once, and is reloaded when the cache is opened.
+        :return:
+        """
+
+        cache = ResultFileCache(self.cache_dir.name, max_size=30)
+        cache.put("http://localhost/api/", 1, "staramr-summary.tsv", b"0123456789")
+        cache.put("http://localhost/api/", 2, "staramr-summary.tsv", b"0123456789")
+        cache.put("http://localhost/api/", 1, "staramr-summary.tsv", b"01234")
+        cache.put("http://localhost/api/", 1, "staramr-summary.tsv", b"0123456789")
+        cache.put("http://localhost/api/", 3, "staramr-summary.tsv", b"0123456789")
+        self.assertEqual(cache._total_size, 30)
+        self.assertIsNotNone(cache.get("http://localhost/api/", 2, "staramr-summary.tsv"))
+        cache.close()
+
+        cache = ResultFileCache(self.cache_dir.name, max_size=30)
+        self.assertEqual(cache._total_size, 30)
+        cache.put("http://localhost/api/", 4, "staramr-summary.tsv", b"0123456789")
+        self.assertEqual(cache._total_size, 30)
+        self.assertIsNone(cache.get("http://localhost/api/", 1, "staramr-summary.tsv"))
+        cache.close()
+
+    def test_response_cache(self):
+        """
+        Test cached responses are returned for the same user and url only, and responses without validators are not
+        cached.
+        :return:
+        """
+
+        cache = ResponseCache(self.cache_dir.name)
+        cache.put("admin", "http://localhost/api/projects", '"1"', None, b'{"resource": {}}')
+        cache.put("admin", "http://localhost/api/", None, None, b'{"resource": {}}')
+
+        self.assertEqual(cache.get("admin", "http://localhost/api/projects"), ('"1"', None, b'{"resource": {}}'))
+        self.assertIsNone(cache.get("user", "http://localhost/api/projects"))
+        self.assertIsNone(cache.get("admin", "http://localhost/api/"))
+
+        cache.put("admin", "http://localhost/api/projects", None, "Wed, 21 Oct 2015 07:28:00 GMT", b"{}")
+        self.assertEqual(cache.get("admin", "http://localhost/api/projects"),
+                         (None, "Wed, 21 Oct 2015 07:28:00 GMT", b"{}"))
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+
+from irida_staramr_results import filter
+from irida_staramr_results.api.irida_api import IridaAPI
+from irida_staramr_results.catalog import SubmissionCatalog
+from irida_staramr_results.test_unit.irida_stand_in import IridaStandIn
+
+
+class TestCatalog(unittest.TestCase):
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.catalog_dir = tempfile.TemporaryDirectory()
+        self.catalog_path = os.path.join(self.catalog_dir.name, "catalog.sqlite3")
+
+        self.stand_in = IridaStandIn(project_ids=(1, 2), submission_count=10)
+        self.stand_in.start()
+        self.irida_api = IridaAPI("client", "secret", self.stand_in.base_url, "user", "password", max_workers=4)
+
+    def tearDown(self):
+        self.stand_in.stop()
+        self.catalog_dir.cleanup()
+
+    def _get_analysis_requests(self):
+        return [path for path in self.stand_in.requests if path.endswith("/analysis")]
+
+    def test_sync_project(self):
+        """
+        Test only the analysis results of submissions new to the catalog are requested by each sync.
+        :return:
+        """
+
+        catalog = SubmissionCatalog(self.catalog_path)
+        res = catalog.sync_project(self.irida_api, 1, show_progress=False)
+
+        # every fifth submission is in ERROR
+        self.assertEqual(res, {"submissions": 10, "new_submissions": 10, "removed_submissions": 0,
+                               "analysis_results": 8})
+        self.assertEqual(len(self._get_analysis_requests()), 8)
+
+        res = catalog.sync_project(self.irida_api, 1, show_progress=False)
+        self.assertEqual(res, {"submissions": 10, "new_submissions": 0, "removed_submissions": 0,
+                               "analysis_results": 0})
+        self.assertEqual(len(self._get_analysis_requests()), 8)
+        catalog.close()
+
+        # the catalog persists between runs, submissions 11 and 12 are new and 1 and 2 were deleted
+        self.stand_in.submission_count = 12
+        self.stand_in.deleted_submission_ids = {1, 2}
+        catalog = SubmissionCatalog(self.catalog_path)
+        res = catalog.sync_project(self.irida_api, 1, show_progress=False)
+        self.assertEqual(res, {"submissions": 10, "new_submissions": 2, "removed_submissions": 2,
+                               "analysis_results": 2})
+        self.assertEqual(len(self._get_analysis_requests()), 10)
+        catalog.close()
+
+    def test_get_completed_amr_analysis_results(self):
+        """
+        Test the catalog returns the same analyses as IRIDA, without requesting them.
+        :return:
+        """
+
+        catalog = SubmissionCatalog(self.catalog_path)
+
+        with self.assertRaises(LookupError):
+            catalog.get_completed_amr_analysis_results(self.irida_api.base_url, 1)
+
+        catalog.sync_project(self.irida_api, 1, show_progress=False)
+        expected = self.irida_api.get_completed_amr_analysis_results(1, show_progress=False)
+        requests = len(self.stand_in.requests)
+
+        res = catalog.get_completed_amr_analysis_results(self.irida_api.base_url, 1)
+        self.assertEqual(res, expected)
+
+        query = filter.parse_expression("id > 2 and not id = 7")
+        res = catalog.get_completed_amr_analysis_results(self.irida_api.base_url, 1, submission_query=query,
+                                                         submission_filter=lambda s: s["identifier"] != "8")
+        self.assertEqual([a["identifier"] for a in res], ["1004"])
+        self.assertEqual(len(self.stand_in.requests), requests)
+
+        # project 2 was not synchronized
+        with self.assertRaises(LookupError):
+            catalog.get_completed_amr_analysis_results(self.irida_api.base_url, 2)
+        catalog.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
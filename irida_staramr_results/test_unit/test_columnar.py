@@ -0,0 +1,103 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from irida_staramr_results import columnar
+from irida_staramr_results.accumulator import DataFrameAccumulator
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class TestColumnar(unittest.TestCase):
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.directory = tempfile.TemporaryDirectory()
+
+        self.accumulator = DataFrameAccumulator()
+        self.accumulator.add_data_frames({
+            "Summary": pd.DataFrame({"Isolate ID": ["a"], "Genotype": ["blaTEM-1B"], "Hits": [1]}),
+            "MLST": pd.DataFrame()
+        })
+        self.accumulator.add_data_frames({
+            "Summary": pd.DataFrame({"Isolate ID": ["b"], "Hits": [1.5], "Plasmid": ["ColRNAI"]}),
+            "MLST": pd.DataFrame()
+        })
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _get_path(self, sheet_name, output_format):
+        return columnar.get_sheet_file_path(self.directory.name, "out", sheet_name, output_format)
+
+    def test_accumulator_to_csv(self):
+        """
+        Test each sheet is written to a gzip compressed csv file with the columns of every analysis.
+        :return:
+        """
+
+        columnar.accumulator_to_files(self.accumulator, self.directory.name, "out", "csv")
+
+        with gzip.open(self._get_path("Summary", "csv"), "rt") as file:
+            self.assertEqual(file.read(), "Isolate ID,Genotype,Hits,Plasmid\n"
+                                          "a,blaTEM-1B,1,\n"
+                                          "b,,1.5,ColRNAI\n")
+
+        # sheets without any data are skipped
+        self.assertFalse(os.path.exists(self._get_path("MLST", "csv")))
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_accumulator_to_parquet(self):
+        """
+        Test column types that differ between analyses are unified in the parquet file.
+        :return:
+        """
+
+        columnar.accumulator_to_files(self.accumulator, self.directory.name, "out", "parquet")
+
+        df = pd.read_parquet(self._get_path("Summary", "parquet"))
+        self.assertEqual(list(df.columns), ["Isolate ID", "Genotype", "Hits", "Plasmid"])
+        self.assertEqual(list(df["Hits"]), [1.0, 1.5])
+        self.assertEqual(df["Genotype"][0], "blaTEM-1B")
+        self.assertTrue(pd.isna(df["Genotype"][1]))
+        self.assertFalse(os.path.exists(self._get_path("MLST", "parquet")))
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_accumulator_to_feather(self):
+        """
+        Test integers and strings of the same column are written as strings to the feather file.
+        :return:
+        """
+
+        self.accumulator.add("Summary", pd.DataFrame({"Isolate ID": [3], "Hits": [2]}))
+        columnar.accumulator_to_files(self.accumulator, self.directory.name, "out", "feather")
+
+        df = pd.read_feather(self._get_path("Summary", "feather"))
+        self.assertEqual(list(df["Isolate ID"]), ["a", "b", "3"])
+        self.assertEqual(list(df["Hits"]), [1.0, 1.5, 2.0])
+
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_accumulator_to_feather_categoricals(self):
+        """
+        Test categoricals with different categories in each analysis are written as their values to the feather file.
+        :return:
+        """
+
+        accumulator = DataFrameAccumulator()
+        for genes in [["blaTEM-1B", "sul1"], ["aac(6')-Iaa"], ["sul1", "tet(A)"]]:
+            accumulator.add("ResFinder", pd.DataFrame({"Isolate ID": ["a"] * len(genes),
+                                                       "Gene": pd.Categorical(genes)}))
+        columnar.accumulator_to_files(accumulator, self.directory.name, "out", "feather")
+
+        df = pd.read_feather(self._get_path("ResFinder", "feather"))
+        self.assertEqual(list(df["Gene"]), ["blaTEM-1B", "sul1", "aac(6')-Iaa", "sul1", "tet(A)"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,19 @@
+import os
+import random
+import tempfile
+import threading
+import time
 import unittest
+from unittest.mock import MagicMock, patch
 
-from irida_staramr_results.downloader import _get_output_file_name
+import openpyxl
+import pandas as pd
+
+from irida_staramr_results.accumulator import DataFrameAccumulator
+from irida_staramr_results.downloader import _get_output_file_name, _download_analysis_result_files, \
+    _accumulator_to_excel, ColumnWidths, _run_per_project, _add_project_column, download_all_results
+from irida_staramr_results.model.result import Result
+from irida_staramr_results.state import ExportState, ExportCheckpoint
 
 
 class TestDownloader(unittest.TestCase):
@@ -25,6 +38,299 @@ class TestDownloader(unittest.TestCase):
         self.assertNotIn(".xlsx", res_milli)
         self.assertEqual(res_milli, "out-2021-01-19T21-13-14")
 
+    def test_get_output_file_existing_sheet_files(self):
+        """
+        Test an increment number is added when files of another output format already use the name.
+        :return:
+        """
+
+        with tempfile.TemporaryDirectory() as directory_name:
+            with patch("irida_staramr_results.downloader._directory_name", directory_name):
+                open(os.path.join(directory_name, "out-2021-01-19T21-13-14-Summary.parquet"), "w").close()
+                self.assertEqual(_get_output_file_name("out", 1611090794000), "out-2021-01-19T21-13-14 (1)")
+
+                open(os.path.join(directory_name, "out-2021-01-19T21-13-14 (1).xlsx"), "w").close()
+                self.assertEqual(_get_output_file_name("out", 1611090794000), "out-2021-01-19T21-13-14 (2)")
+
+    def test_download_analysis_result_files(self):
+        """
+        Test results files are yielded in the order of the analyses and downloads never run too far ahead.
+        :return:
+        """
+
+        lock = threading.Lock()
+        downloaded = []
+
+        def get_analysis_result_files_stub(analysis_id, analysis_result=None, sheet_names=None):
+            time.sleep(random.random() / 100)
+            with lock:
+                downloaded.append(analysis_id)
+            return [f"file-of-{analysis_id}"]
+
+        fake_api = MagicMock()
+        fake_api.get_analysis_result_files.side_effect = get_analysis_result_files_stub
+        fake_analyses = [{"identifier": i} for i in range(30)]
+
+        yielded = []
+        for a, result_files in _download_analysis_result_files(fake_api, fake_analyses, workers=4, max_pending=6):
+            with lock:
+                # at most max_pending analyses are downloaded ahead of the one being consumed
+                self.assertLessEqual(len(downloaded), a["identifier"] + 6)
+            yielded.append((a["identifier"], result_files))
+
+        self.assertEqual(yielded, [(i, [f"file-of-{i}"]) for i in range(30)])
+
+    def test_accumulator_to_excel(self):
+        """
+        Test the data of every analysis is streamed to one sheet per sheet name, with fitted column widths.
+        :return:
+        """
+
+        accumulator = DataFrameAccumulator()
+        accumulator.add_data_frames({
+            "Summary": pd.DataFrame({"Isolate ID": ["SAMPLE1"], "Genotype": ["blaTEM-1B"]}),
+            "PointFinder": pd.DataFrame()
+        })
+        accumulator.add_data_frames({
+            "Summary": pd.DataFrame({"Isolate ID": ["SAMPLE2"], "Genotype": ["None"], "Sequence Type": [19]}),
+            "PointFinder": pd.DataFrame()
+        })
+
+        with tempfile.TemporaryDirectory() as directory_name:
+            with patch("irida_staramr_results.downloader._directory_name", directory_name):
+                _accumulator_to_excel(accumulator, "out")
+
+            res = pd.read_excel(os.path.join(directory_name, "out.xlsx"), sheet_name=None)
+            worksheet = openpyxl.load_workbook(os.path.join(directory_name, "out.xlsx"))["Summary"]
+
+        # empty sheets are skipped
+        self.assertEqual(list(res), ["Summary"])
+        self.assertEqual(list(res["Summary"].columns), ["Isolate ID", "Genotype", "Sequence Type"])
+        self.assertEqual(list(res["Summary"]["Isolate ID"]), ["SAMPLE1", "SAMPLE2"])
+        self.assertTrue(pd.isna(res["Summary"]["Sequence Type"][0]))
+        self.assertEqual(res["Summary"]["Sequence Type"][1], 19)
+        self.assertAlmostEqual(worksheet.column_dimensions["B"].width, len("blaTEM-1B") + 1, delta=1)
+
+    def test_column_widths(self):
+        """
+        Test column widths follow the widest cell, with max width, and only sampled rows are measured.
+        :return:
+        """
+
+        column_widths = ColumnWidths(["Isolate ID", "Gene", "Start"], max_width=20)
+        column_widths.update(["SAMPLE1", "blaTEM-1B", 1])
+        column_widths.update(["SAMPLE2", None, 1000000])
+        column_widths.update(["SAMPLE3", "x" * 100, 5])
+        self.assertEqual(column_widths.get_widths(), [len("Isolate ID") + 1, 20, len("1000000") + 1])
+
+        column_widths = ColumnWidths(["Isolate ID", "Gene"], sample_rows=1)
+        column_widths.update(["SAMPLE1", "blaTEM-1B"])
+        column_widths.update(["SAMPLE2", "aac(6')-Iaa,aph(3'')-Ib"])
+        self.assertEqual(column_widths.get_widths(), [len("Isolate ID") + 1, len("blaTEM-1B") + 1])
+
+    def test_run_per_project(self):
+        """
+        Test a project that fails does not stop the other projects.
+        :return:
+        """
+
+        done = []
+
+        def download_project_results_stub(project_id):
+            if project_id == 2:
+                raise KeyError("The given project ID doesn't exist: 2")
+            time.sleep(random.random() / 100)
+            done.append(project_id)
+
+        res = _run_per_project(download_project_results_stub, [1, 2, 3, 4], workers=3)
+
+        self.assertEqual(res, [2])
+        self.assertEqual(sorted(done), [1, 3, 4])
+
+    def test_add_project_column(self):
+        """
+        Test the project id is added as the first column of data frames with data.
+        :return:
+        """
+
+        data_frames = {"Summary": pd.DataFrame({"Isolate ID": ["a", "b"]}), "PointFinder": pd.DataFrame()}
+        _add_project_column(data_frames, 7)
+
+        self.assertEqual(list(data_frames["Summary"].columns), ["Project ID", "Isolate ID"])
+        self.assertEqual(list(data_frames["Summary"]["Project ID"]), [7, 7])
+        self.assertTrue(data_frames["PointFinder"].empty)
+
+    def test_resume_download(self):
+        """
+        Test resuming an interrupted export only downloads the analyses it did not write yet.
+        :return:
+        """
+
+        downloaded = []
+        fail_analysis_ids = {"5"}
+
+        def get_analysis_result_files_stub(analysis_id, analysis_result=None, sheet_names=None):
+            if analysis_id in fail_analysis_ids:
+                raise ConnectionError("Connection reset by peer")
+            downloaded.append(analysis_id)
+            return [Result({}, f"Isolate ID\tGenotype\nS{analysis_id}\tblaTEM-1B\n".encode(), "staramr-summary.tsv")]
+
+        fake_api = MagicMock()
+        fake_api.get_analysis_result_files.side_effect = get_analysis_result_files_stub
+        fake_api.get_completed_amr_analysis_results.return_value = [{"identifier": str(i)} for i in range(10)]
+
+        working_dir = os.getcwd()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.chdir(temp_dir)
+            try:
+                res = download_all_results(fake_api, 1, "out", False, 0, time.time() * 1000, workers=1)
+                self.assertEqual(res, [1])
+
+                directory_name = os.listdir(temp_dir)[0]
+                fail_analysis_ids.clear()
+                downloaded.clear()
+                res = download_all_results(fake_api, 1, "out", False, 0, time.time() * 1000, workers=1,
+                                           resume_directory=directory_name)
+            finally:
+                os.chdir(working_dir)
+
+            self.assertEqual(res, [])
+            self.assertEqual(downloaded, ["5", "6", "7", "8", "9"])
+            # the checkpoint and spool files are removed once the export is done
+            self.assertEqual(os.listdir(os.path.join(temp_dir, directory_name)), ["out.xlsx"])
+
+            worksheet = openpyxl.load_workbook(os.path.join(temp_dir, directory_name, "out.xlsx"))["Summary"]
+            self.assertEqual([row[0] for row in worksheet.iter_rows(min_row=2, values_only=True)],
+                             [f"S{i}" for i in range(10)])
+
+    def test_resume_split_download(self):
+        """
+        Test resuming an interrupted export of separate output files overwrites the files of an analysis written before
+        it was checkpointed, instead of writing them again under a new name.
+        :return:
+        """
+
+        def get_analysis_result_files_stub(analysis_id, analysis_result=None, sheet_names=None):
+            return [Result({}, f"Isolate ID\tGenotype\nS{analysis_id}\tblaTEM-1B\n".encode(), "staramr-summary.tsv")]
+
+        fake_api = MagicMock()
+        fake_api.get_analysis_result_files.side_effect = get_analysis_result_files_stub
+        fake_api.get_completed_amr_analysis_results.return_value = [{"identifier": str(i), "createdDate": 1611090794000}
+                                                                     for i in range(6)]
+
+        add = ExportCheckpoint.add
+
+        def add_stub(checkpoint, analysis_id, accumulator=None):
+            if analysis_id == "3":
+                raise ConnectionError("Interrupted")
+            add(checkpoint, analysis_id, accumulator)
+
+        working_dir = os.getcwd()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.chdir(temp_dir)
+            try:
+                with patch.object(ExportCheckpoint, "add", add_stub):
+                    res = download_all_results(fake_api, 1, "out", True, 0, time.time() * 1000, workers=1)
+                self.assertEqual(res, [1])
+
+                directory_name = os.listdir(temp_dir)[0]
+                res = download_all_results(fake_api, 1, "out", True, 0, time.time() * 1000, workers=1,
+                                           resume_directory=directory_name)
+            finally:
+                os.chdir(working_dir)
+
+            self.assertEqual(res, [])
+            self.assertEqual(sorted(os.listdir(os.path.join(temp_dir, directory_name))),
+                             ["out-2021-01-19T21-13-14 (1).xlsx", "out-2021-01-19T21-13-14 (2).xlsx",
+                              "out-2021-01-19T21-13-14 (3).xlsx", "out-2021-01-19T21-13-14 (4).xlsx",
+                              "out-2021-01-19T21-13-14 (5).xlsx", "out-2021-01-19T21-13-14.xlsx"])
+
+            worksheet = openpyxl.load_workbook(os.path.join(temp_dir, directory_name,
+                                                            "out-2021-01-19T21-13-14 (3).xlsx"))["Summary"]
+            self.assertEqual([row[0] for row in worksheet.iter_rows(min_row=2, values_only=True)], ["S3"])
+
+    def test_incremental_download(self):
+        """
+        Test running an incremental export twice appends each analysis to the report once, including those still
+        running during the first run, and does not record the submissions outside the date range as exported.
+        :return:
+        """
+
+        analysis_submissions = [{"identifier": str(i), "analysisState": "COMPLETED", "createdDate": i * 86400000}
+                                for i in range(1, 5)]
+        analysis_submissions[1]["analysisState"] = "RUNNING"
+
+        def get_completed_amr_analysis_results_stub(project_id, submission_filter=None, show_progress=True):
+            return [{"identifier": s["identifier"], "createdDate": s["createdDate"]} for s in analysis_submissions
+                    if submission_filter(s) and s["analysisState"] == "COMPLETED"]
+
+        def get_analysis_result_files_stub(analysis_id, analysis_result=None, sheet_names=None):
+            return [Result({}, f"Isolate ID\tGenotype\nS{analysis_id}\tblaTEM-1B\n".encode(), "staramr-summary.tsv")]
+
+        fake_api = MagicMock()
+        fake_api.failed_submission_ids = set()
+        fake_api.get_analysis_result_files.side_effect = get_analysis_result_files_stub
+        fake_api.get_completed_amr_analysis_results.side_effect = get_completed_amr_analysis_results_stub
+
+        working_dir = os.getcwd()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.chdir(temp_dir)
+            try:
+                export_state = ExportState()
+                download_all_results(fake_api, 1, "out", False, 0, 3 * 86400000, workers=1,
+                                     export_state=export_state)
+                # submission 3 is in the date range, but submission 4 is not
+                self.assertEqual(export_state.get_last_submission_id(1), 3)
+                self.assertEqual(export_state.get_pending_submission_ids(1), [2])
+
+                for _ in range(2):
+                    analysis_submissions[1]["analysisState"] = "COMPLETED"
+                    export_state = ExportState()
+                    download_all_results(fake_api, 1, "out", False, 0, time.time() * 1000, workers=1,
+                                         export_state=export_state)
+                report = export_state.get_report(1)
+            finally:
+                os.chdir(working_dir)
+
+            self.assertEqual(export_state.get_last_submission_id(1), 4)
+            self.assertEqual(export_state.get_pending_submission_ids(1), [])
+
+            worksheet = openpyxl.load_workbook(report)["Summary"]
+            self.assertEqual([row[0] for row in worksheet.iter_rows(min_row=2, values_only=True)],
+                             ["S1", "S3", "S2", "S4"])
+
+    def test_split_download_processes(self):
+        """
+        Test a pool of processes writes one output file per analysis, named in the order of the analyses even when
+        they were created at the same time.
+        :return:
+        """
+
+        def get_analysis_result_files_stub(analysis_id, analysis_result=None, sheet_names=None):
+            return [Result({}, f"Isolate ID\tGenotype\nS{analysis_id}\tblaTEM-1B\n".encode(), "staramr-summary.tsv")]
+
+        fake_api = MagicMock()
+        fake_api.get_analysis_result_files.side_effect = get_analysis_result_files_stub
+        fake_api.get_completed_amr_analysis_results.return_value = [{"identifier": str(i), "createdDate": 1611090794000}
+                                                                     for i in range(6)]
+
+        working_dir = os.getcwd()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.chdir(temp_dir)
+            try:
+                res = download_all_results(fake_api, 1, "out", True, 0, time.time() * 1000, workers=2, processes=3)
+            finally:
+                os.chdir(working_dir)
+
+            self.assertEqual(res, [])
+            directory_name = os.path.join(temp_dir, os.listdir(temp_dir)[0])
+            self.assertEqual(len(os.listdir(directory_name)), 6)
+            for i in range(6):
+                suffix = f" ({i})" if i > 0 else ""
+                worksheet = openpyxl.load_workbook(os.path.join(directory_name,
+                                                                f"out-2021-01-19T21-13-14{suffix}.xlsx"))["Summary"]
+                self.assertEqual(worksheet["A2"].value, f"S{i}")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -39,6 +39,82 @@ class TestFilter(unittest.TestCase):
         self.assertEqual(len(res_no_input), 5)
         self.assertEqual(len(res_input), 2)
 
+    def test_created_between(self):
+        """
+        Tests the date range predicate and combining predicates
+        :return:
+        """
+
+        fake_submission = {"createdDate": 1613282400000, "analysisState": "COMPLETED"}  # Feb 14 2021
+
+        self.assertTrue(filter.created_between(1611122400000, 1614405600000)(fake_submission))
+        self.assertFalse(filter.created_between(1614319200000, 1617771600000)(fake_submission))
+
+        is_completed = lambda s: s["analysisState"] == "COMPLETED"
+        self.assertTrue(filter.all_of(None, is_completed, filter.created_between(0, 1614405600000))(fake_submission))
+        self.assertFalse(filter.all_of(is_completed, filter.created_between(0, 1611122400000))(fake_submission))
+        self.assertTrue(filter.all_of()(fake_submission))
+
+    def _get_fake_submissions(self):
+        return [{"identifier": str(i),
+                 "name": f"Salmonella-{i}" if i % 2 else f"ecoli-{i}",
+                 "analysisState": "ERROR" if i % 5 == 0 else "COMPLETED",
+                 "workflowId": "a0b1" if i < 6 else "c2d3",
+                 "createdDate": 1611100800000 + i * 86400000}  # Jan 20 2021 (UTC) + i days
+                for i in range(1, 13)]
+
+    def test_parse_expression(self):
+        """
+        Tests filter expressions accept the same submissions when evaluated one by one and with an index
+        :return:
+        """
+
+        fake_submissions = self._get_fake_submissions()
+        index = filter.SubmissionIndex(fake_submissions)
+
+        expected = {
+            'id = 3': ["3"],
+            'id in [3, "4", 99]': ["3", "4"],
+            'id > 10 or id <= 1': ["1", "11", "12"],
+            'name ~ "salmonella*" and not state = error': ["1", "3", "7", "9", "11"],
+            'name ~ "*-1?"': ["10", "11", "12"],
+            'NAME = ECOLI-2': ["2"],
+            'created >= 2021-01-30 and created < 2021-02-01': ["10", "11"],
+            'created = 2021-01-23': ["3"],
+            'workflow != a0b1 and (id = 6 or name ~ salmonella*)': ["6", "7", "9", "11"],
+            'missingField = 1 or not missingField = 1 and id = 1': ["1"]
+        }
+
+        for expression, expected_ids in expected.items():
+            predicate = filter.parse_expression(expression)
+            self.assertEqual([s["identifier"] for s in fake_submissions if predicate(s)], expected_ids, expression)
+            self.assertEqual([s["identifier"] for s in index.select(predicate)], expected_ids, expression)
+
+    def test_parse_expression_errors(self):
+        """
+        Tests invalid filter expressions raise ValueError
+        :return:
+        """
+
+        for expression in ['', 'id =', 'id 3', '(id = 3', 'id in 3', 'id in [3, 4', 'id = 3 id = 4', 'id = three',
+                           'created ~ 2021*', 'id = 3 and']:
+            with self.assertRaises(ValueError, msg=expression):
+                filter.parse_expression(expression)
+
+    def test_submission_index_reused(self):
+        """
+        Tests the index of a field is built once and reused by the next queries
+        :return:
+        """
+
+        index = filter.SubmissionIndex(self._get_fake_submissions())
+        index.select(filter.parse_expression("id in [1, 2]"))
+        hashed = index.get_hashed("identifier")
+
+        self.assertEqual(len(index.select(filter.parse_expression("id > 6"))), 6)
+        self.assertIs(index.get_hashed("identifier"), hashed)
+        self.assertEqual(set(index._hashed), {"identifier"})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,8 +1,17 @@
+import random
+import threading
+import time
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 
 from irida_staramr_results.api.irida_api import IridaAPI
+from irida_staramr_results.api.rate_limit import RateLimiter, RetryPolicy
 from irida_staramr_results.api import exceptions
+from irida_staramr_results import filter
+from irida_staramr_results.cache import ResponseCache
+from irida_staramr_results.test_unit.irida_stand_in import IridaStandIn, RESULT_FILES, FIRST_CREATED_DATE
 
 
 class TestIridaApi(unittest.TestCase):
@@ -13,6 +22,14 @@ class TestIridaApi(unittest.TestCase):
     def tearDown(self):
         pass
 
+    @staticmethod
+    def _get_fake_api(**kwargs):
+        """
+        Returns an IridaAPI instance that does not connect to IRIDA.
+        """
+        with patch("irida_staramr_results.api.irida_api.IridaAPI._create_session"):
+            return IridaAPI("client", "secret", "http://localhost/api/", "user", "password", **kwargs)
+
     @patch("irida_staramr_results.api.irida_api.IridaAPI._get_analysis_result")
     @patch("irida_staramr_results.api.irida_api.IridaAPI._is_result_type_amr")
     def test_is_submission_type_amr(self, mock_get_analysis_result, mock_is_result_type_amr):
@@ -96,21 +113,91 @@ class TestIridaApi(unittest.TestCase):
         mock_is_result_type_amr.side_effect = is_result_type_amr_stub
         mock_store_submission_id.return_value = store_submission_id_stub
 
+        fake_api = self._get_fake_api()
+
         # Test ALL completed to return 3 values
         mock_get_project_analysis_submissions.return_value = fake_submissions_all_completed
-        res = IridaAPI.get_completed_amr_analysis_results(IridaAPI, 1)
+        res = fake_api.get_completed_amr_analysis_results(1)
         self.assertEqual(len(res), 3)
 
         # Test NONE completed to return 0 values
         mock_get_project_analysis_submissions.return_value = fake_data_none_completed
-        res = IridaAPI.get_completed_amr_analysis_results(IridaAPI, 1)
+        res = fake_api.get_completed_amr_analysis_results(1)
         self.assertEqual(len(res), 0)
 
         # Test SOME completed to return 1 value
         mock_get_project_analysis_submissions.return_value = fake_data_some_completed
-        res = IridaAPI.get_completed_amr_analysis_results(IridaAPI, 1)
+        res = fake_api.get_completed_amr_analysis_results(1)
         self.assertEqual(len(res), 1)
 
+    @patch("irida_staramr_results.api.irida_api.IridaAPI._get_analysis_result")
+    @patch("irida_staramr_results.api.irida_api.IridaAPI._get_project_analysis_submissions")
+    def test_get_completed_amr_analysis_results_concurrent(self, mock_get_project_analysis_submissions,
+                                                           mock_get_analysis_result):
+        """
+        Test get_completed_amr_analysis_results keeps submission order, skips failed lookups
+        and maps every result id to its submission id when requesting concurrently.
+        :param mock_get_project_analysis_submissions:
+        :param mock_get_analysis_result:
+        :return:
+        """
+
+        def get_analysis_result_stub(submission_id):
+            if submission_id == 13:
+                raise ConnectionError("Connection reset by peer")
+            # results arrive out of order
+            time.sleep(random.random() / 100)
+            analysis_type = "AMR_DETECTION" if submission_id % 2 == 0 else "SISTR_TYPING"
+            return {"identifier": submission_id + 1000, "analysisType": {"type": analysis_type}}
+
+        mock_get_project_analysis_submissions.return_value = [{"analysisState": "COMPLETED", "identifier": i}
+                                                              for i in range(1, 41)]
+        mock_get_analysis_result.side_effect = get_analysis_result_stub
+
+        fake_api = self._get_fake_api(max_workers=8)
+        res = fake_api.get_completed_amr_analysis_results(1)
+
+        self.assertEqual([r["identifier"] for r in res], [i + 1000 for i in range(2, 41, 2)])
+        self.assertEqual(fake_api.target_submission_ids, {i + 1000: i for i in range(2, 41, 2)})
+        self.assertEqual(fake_api.failed_submission_ids, {13})
+        self.assertEqual(mock_get_analysis_result.call_count, 40)
+
+        # skipped submissions are never requested
+        mock_get_analysis_result.reset_mock()
+        res = fake_api.get_completed_amr_analysis_results(1, submission_filter=lambda s: s["identifier"] > 30)
+        self.assertEqual([r["identifier"] for r in res], [i + 1000 for i in range(32, 41, 2)])
+        self.assertEqual(mock_get_analysis_result.call_count, 10)
+
+    @patch("irida_staramr_results.api.irida_api.IridaAPI._get_analysis_result")
+    def test_get_analysis_results_bounded(self, mock_get_analysis_result):
+        """
+        Test get_analysis_results only consumes the analysis submissions as their analysis results arrive, with at most
+        twice max_workers requests pending.
+        :param mock_get_analysis_result:
+        :return:
+        """
+
+        seen = []
+
+        def iter_analysis_submissions():
+            for i in range(1, 41):
+                seen.append(i)
+                yield {"analysisState": "COMPLETED", "identifier": i}
+
+        def get_analysis_result_stub(submission_id):
+            # submissions seen ahead of this request, which are the requests pending
+            ahead.append(len(seen) - submission_id)
+            return {"identifier": submission_id + 1000}
+
+        ahead = []
+        mock_get_analysis_result.side_effect = get_analysis_result_stub
+
+        fake_api = self._get_fake_api(max_workers=2)
+        res = fake_api.get_analysis_results(iter_analysis_submissions(), show_progress=False)
+
+        self.assertEqual([r["identifier"] for s, r in res], [i + 1000 for i in range(1, 41)])
+        self.assertLessEqual(max(ahead), 2 * 2)
+
     @patch("irida_staramr_results.api.irida_api.IridaAPI._get_project_analysis_submissions")
     def test_get_amr_analysis_submissions_error(self, mock_get_project_analysis_submissions):
         """
@@ -124,6 +211,384 @@ class TestIridaApi(unittest.TestCase):
         with self.assertRaises(exceptions.IridaResourceError):
             IridaAPI.get_completed_amr_analysis_results(IridaAPI, 1)
 
+    @patch("irida_staramr_results.api.irida_api.IridaAPI._reinitialize_session")
+    def test_session_refreshed_only_when_expired(self, mock_reinitialize_session):
+        """
+        Test _session reuses the session without any request until the access token is about to expire.
+        :param mock_reinitialize_session:
+        :return:
+        """
+
+        fake_api = self._get_fake_api()
+        fake_session = MagicMock()
+        fake_api._session_instance = fake_session
+        fake_api._session_expiry = time.monotonic() + 3600
+
+        self.assertIs(fake_api._session, fake_session)
+        self.assertFalse(fake_session.method_calls)
+        self.assertFalse(mock_reinitialize_session.called)
+
+        fake_api._session_expiry = time.monotonic() - 1
+        fake_api._session
+        self.assertEqual(mock_reinitialize_session.call_count, 1)
+
+    @patch("irida_staramr_results.api.irida_api.IridaAPI._reinitialize_session")
+    def test_get_refreshes_session_on_unauthorized(self, mock_reinitialize_session):
+        """
+        Test _get gets a new session and retries once when the access token is rejected.
+        :param mock_reinitialize_session:
+        :return:
+        """
+
+        fake_api = self._get_fake_api()
+        stale_session = MagicMock()
+        stale_session.get.return_value = MagicMock(status_code=401)
+        new_session = MagicMock()
+        new_session.get.return_value = MagicMock(status_code=200)
+        fake_api._session_instance = stale_session
+
+        def reinitialize_session_stub():
+            fake_api._session_instance = new_session
+
+        mock_reinitialize_session.side_effect = reinitialize_session_stub
+
+        res = fake_api._get("http://localhost/api/projects")
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(mock_reinitialize_session.call_count, 1)
+        new_session.get.assert_called_once_with("http://localhost/api/projects")
+
+    @patch("irida_staramr_results.api.irida_api.IridaAPI._get")
+    def test_get_analysis_result_files_requests(self, mock_get):
+        """
+        Test get_analysis_result_files reuses the analysis links and only requests the contents of each file.
+        :param mock_get:
+        :return:
+        """
+
+        fake_file_keys = ["staramr-resfinder.tsv", "staramr-detailed-summary.tsv", "staramr-settings.txt",
+                          "staramr-summary.tsv", "staramr-plasmidfinder.tsv", "staramr-mlst.tsv", "staramr-excel.xlsx"]
+        fake_analysis_result = {
+            "identifier": 1,
+            "links": [{"rel": "self", "href": "http://localhost/api/analysisSubmissions/2/analysis"}] +
+                     [{"rel": "outputFile/" + k,
+                       "href": "http://localhost/api/analysisSubmissions/2/analysis/file/" + k}
+                      for k in fake_file_keys]
+        }
+        mock_get.return_value = MagicMock(status_code=200, content=b"Isolate ID\tGene\n")
+
+        fake_api = self._get_fake_api()
+        res = fake_api.get_analysis_result_files(1, fake_analysis_result)
+
+        self.assertEqual([r.file_key for r in res], fake_file_keys)
+        self.assertEqual(mock_get.call_count, len(fake_file_keys))
+        for call in mock_get.call_args_list:
+            self.assertEqual(call.kwargs["headers"], {"Accept": "text/plain"})
+
+        # without the analysis links, they are requested once
+        mock_get.reset_mock()
+        mock_get.return_value.json.return_value = {"resource": fake_analysis_result}
+        fake_api.target_submission_ids[1] = 2
+        fake_api.analysis_submission_url = "http://localhost/api/analysisSubmissions"
+        res = fake_api.get_analysis_result_files(1)
+
+        self.assertEqual(len(res), len(fake_file_keys))
+        self.assertEqual(mock_get.call_count, len(fake_file_keys) + 1)
+
+    @patch("irida_staramr_results.api.irida_api.IridaAPI._get_link")
+    def test_get_cached_link(self, mock_get_link):
+        """
+        Test each link is only requested once by threads sharing the instance.
+        :param mock_get_link:
+        :return:
+        """
+
+        def get_link_stub(target_url, target_key, target_dict=None):
+            time.sleep(0.01)
+            return target_url + target_key
+
+        mock_get_link.side_effect = get_link_stub
+        fake_api = self._get_fake_api()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            res = list(executor.map(lambda _: fake_api._get_cached_link("http://localhost/api/", "projects"), range(8)))
+
+        self.assertEqual(res, ["http://localhost/api/projects"] * 8)
+        self.assertEqual(mock_get_link.call_count, 1)
+
+        # targeted links are cached per target value
+        for project_id in [1, 2, 1]:
+            fake_api._get_cached_link("http://localhost/api/projects", "project/analyses",
+                                      {"key": "identifier", "value": project_id})
+        self.assertEqual(mock_get_link.call_count, 3)
+
+    def test_get_limits_concurrent_requests(self):
+        """
+        Test threads sharing the instance never send more than max_workers requests at the same time.
+        :return:
+        """
+
+        lock = threading.Lock()
+        in_flight = [0]
+        max_in_flight = [0]
+
+        def get_stub(url, **kwargs):
+            with lock:
+                in_flight[0] = in_flight[0] + 1
+                max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+            time.sleep(0.005)
+            with lock:
+                in_flight[0] = in_flight[0] - 1
+            return MagicMock(status_code=200)
+
+        fake_api = self._get_fake_api(max_workers=3)
+        fake_api._session_instance = MagicMock()
+        fake_api._session_instance.get.side_effect = get_stub
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            list(executor.map(fake_api._get, ["http://localhost/api/projects"] * 30))
+
+        self.assertLessEqual(max_in_flight[0], 3)
+        self.assertEqual(fake_api.request_count, 30)
+
+    @patch("irida_staramr_results.api.irida_api.IridaAPI._get_existing_url")
+    def test_get_project_link(self, mock_get_existing_url):
+        """
+        Test project links are looked up in the projects index, which is requested once until it expires.
+        :param mock_get_existing_url:
+        :return:
+        """
+
+        def fake_projects(*project_ids):
+            return {"resource": {"resources": [
+                {"identifier": str(i), "links": [{"rel": "project/analyses",
+                                                  "href": f"http://localhost/api/projects/{i}/analyses"}]}
+                for i in project_ids]}}
+
+        mock_get_existing_url.return_value.json.return_value = fake_projects(1, 2, 3)
+        fake_api = self._get_fake_api()
+        fake_api.project_url = "http://localhost/api/projects"
+
+        for project_id in [1, 2, 3, "2", 1]:
+            res = fake_api._get_project_link(project_id, "project/analyses")
+            self.assertEqual(res, f"http://localhost/api/projects/{project_id}/analyses")
+        self.assertEqual(mock_get_existing_url.call_count, 1)
+
+        with self.assertRaises(exceptions.IridaKeyError):
+            fake_api._get_project_link(1, "project/samples")
+        self.assertEqual(mock_get_existing_url.call_count, 1)
+
+        # a project missing from the index is requested again once, in case it was created since
+        mock_get_existing_url.return_value.json.return_value = fake_projects(1, 2, 3, 4)
+        self.assertEqual(fake_api._get_project_link(4, "project/analyses"), "http://localhost/api/projects/4/analyses")
+        self.assertEqual(mock_get_existing_url.call_count, 2)
+
+        with self.assertRaises(exceptions.IridaKeyError):
+            fake_api._get_project_link(5, "project/analyses")
+        self.assertEqual(mock_get_existing_url.call_count, 3)
+
+        # the projects are requested again once the index expires
+        fake_api._projects_index_expiry = time.monotonic() - 1
+        fake_api._get_project_link(1, "project/analyses")
+        self.assertEqual(mock_get_existing_url.call_count, 4)
+
+
+class TestIridaApiStandIn(unittest.TestCase):
+    """
+    Tests of IridaAPI requesting a local stand-in for the IRIDA REST API.
+    """
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def _start_stand_in(self, **kwargs):
+        stand_in = IridaStandIn(**kwargs)
+        stand_in.start()
+        self.addCleanup(stand_in.stop)
+        return stand_in
+
+    def test_iter_project_analysis_submissions(self):
+        """
+        Test analysis submissions of a project are all yielded from a single response when they are not paged.
+        :return:
+        """
+
+        stand_in = self._start_stand_in(submission_count=10)
+        irida_api = IridaAPI("client", "secret", stand_in.base_url, "user", "password")
+
+        res = list(irida_api.iter_project_analysis_submissions(1))
+
+        self.assertEqual([s["identifier"] for s in res], [str(i) for i in range(1, 11)])
+        self.assertEqual(len([path for path in stand_in.requests if path.startswith("/api/projects/1/analyses")]), 1)
+
+        with self.assertRaises(exceptions.IridaKeyError):
+            irida_api.iter_project_analysis_submissions(2)
+
+    def test_iter_project_analysis_submissions_paged(self):
+        """
+        Test each page of analysis submissions is only requested once the previous page was consumed.
+        :return:
+        """
+
+        stand_in = self._start_stand_in(submission_count=10, page_size=4)
+        irida_api = IridaAPI("client", "secret", stand_in.base_url, "user", "password")
+
+        def get_page_requests():
+            return [path for path in stand_in.requests if path.startswith("/api/projects/1/analyses")]
+
+        analysis_submissions = irida_api.iter_project_analysis_submissions(1)
+        self.assertEqual(get_page_requests(), [])
+
+        first = [next(analysis_submissions) for _ in range(4)]
+        self.assertEqual([s["identifier"] for s in first], ["1", "2", "3", "4"])
+        self.assertEqual(len(get_page_requests()), 1)
+
+        rest = list(analysis_submissions)
+        self.assertEqual([s["identifier"] for s in rest], [str(i) for i in range(5, 11)])
+        self.assertEqual(get_page_requests(), ["/api/projects/1/analyses", "/api/projects/1/analyses?page=1",
+                                               "/api/projects/1/analyses?page=2"])
+
+    def test_get_completed_amr_analysis_results(self):
+        """
+        Test completed amr analysis results and their files are requested from paged analysis submissions.
+        :return:
+        """
+
+        stand_in = self._start_stand_in(submission_count=10, page_size=3)
+        irida_api = IridaAPI("client", "secret", stand_in.base_url, "user", "password", max_workers=4)
+
+        res = irida_api.get_completed_amr_analysis_results(1, show_progress=False)
+
+        # every fifth submission is in ERROR and every third one is not an amr analysis
+        self.assertEqual([a["identifier"] for a in res], ["1001", "1002", "1004", "1007", "1008"])
+
+        result_files = irida_api.get_analysis_result_files(res[0]["identifier"], res[0])
+        self.assertEqual(len(result_files), 7)
+        self.assertEqual(result_files[0].get_contents(), RESULT_FILES["staramr-resfinder.tsv"].format(i=1))
+
+    def test_get_analysis_result_files_pointfinder(self):
+        """
+        Test the PointFinder sheet is read from staramr-pointfinder.tsv when the analysis has one, and that
+        staramr-excel.xlsx is only downloaded if the analysis searched for PointFinder point mutations.
+        :return:
+        """
+
+        stand_in = self._start_stand_in(submission_count=2, pointfinder_tsv=True)
+        irida_api = IridaAPI("client", "secret", stand_in.base_url, "user", "password")
+        res = irida_api.get_completed_amr_analysis_results(1, show_progress=False)
+
+        result_files = irida_api.get_analysis_result_files(res[0]["identifier"], res[0])
+        self.assertEqual(result_files[-1].get_file_name(), "staramr-pointfinder.tsv")
+        self.assertEqual(result_files[-1].get_sheet_name(), "PointFinder")
+        self.assertEqual(list(result_files[-1].get_data_frame()["Position"]), [83])
+
+        stand_in.pointfinder_tsv = False
+        stand_in.pointfinder_enabled = False
+        res = irida_api.get_completed_amr_analysis_results(1, show_progress=False)
+        result_files = irida_api.get_analysis_result_files(res[1]["identifier"], res[1])
+        self.assertEqual(result_files[-1].get_file_name(), "staramr-excel.xlsx")
+        self.assertTrue(result_files[-1].get_data_frame().empty)
+        self.assertFalse(any(path.endswith("staramr-excel.xlsx") for path in stand_in.requests))
+
+        stand_in.pointfinder_enabled = True
+        result_files = irida_api.get_analysis_result_files(res[1]["identifier"], res[1])
+        self.assertEqual(result_files[-1].get_data_frame().to_dict("records"),
+                         [{"Isolate ID": "S1", "Gene": "gyrA (S83F)"}])
+        self.assertTrue(stand_in.requests[-1].endswith("staramr-excel.xlsx"))
+
+    def test_get_analysis_result_files_sheet_names(self):
+        """
+        Test only the results files of the given sheets are requested.
+        :return:
+        """
+
+        stand_in = self._start_stand_in(submission_count=1)
+        irida_api = IridaAPI("client", "secret", stand_in.base_url, "user", "password")
+        res = irida_api.get_completed_amr_analysis_results(1, show_progress=False)
+
+        result_files = irida_api.get_analysis_result_files(res[0]["identifier"], res[0], ["Summary", "ResFinder"])
+        self.assertEqual([f.get_file_name() for f in result_files], ["staramr-resfinder.tsv", "staramr-summary.tsv"])
+        self.assertEqual(len([path for path in stand_in.requests if "/file/" in path]), 2)
+
+        # the settings are requested to decide whether to download the excel file, but not returned
+        result_files = irida_api.get_analysis_result_files(res[0]["identifier"], res[0], ["PointFinder"])
+        self.assertEqual([f.get_file_name() for f in result_files], ["staramr-excel.xlsx"])
+        self.assertEqual([path.rsplit("/", 1)[-1] for path in stand_in.requests if "/file/" in path][2:],
+                         ["staramr-settings.txt", "staramr-excel.xlsx"])
+
+    def test_get_completed_amr_analysis_results_date_range(self):
+        """
+        Test only the analysis results of submissions in the date range are requested.
+        :return:
+        """
+
+        stand_in = self._start_stand_in(submission_count=100)
+        irida_api = IridaAPI("client", "secret", stand_in.base_url, "user", "password")
+
+        # submissions 91 to 100
+        is_created_in_range = filter.created_between(FIRST_CREATED_DATE + 91000, FIRST_CREATED_DATE + 100000)
+        res = irida_api.get_completed_amr_analysis_results(1, is_created_in_range, show_progress=False)
+
+        self.assertEqual([a["identifier"] for a in res], ["1091", "1092", "1094", "1097", "1098"])
+        analysis_requests = [path for path in stand_in.requests if path.endswith("/analysis")]
+        self.assertEqual(len(analysis_requests), 8)  # submission 95 and 100 are in ERROR
+
+    def test_get_retries_overloaded_responses(self):
+        """
+        Test requests answered 503 are sent again, and the rate limiter slows down.
+        :return:
+        """
+
+        stand_in = self._start_stand_in(submission_count=10)
+        rate_limiter = RateLimiter(requests_per_second=100)
+        irida_api = IridaAPI("client", "secret", stand_in.base_url, "user", "password", max_workers=4,
+                             rate_limiter=rate_limiter, retry_policy=RetryPolicy(max_retries=3, backoff_factor=0.01))
+        # the links and the projects listing are requested by the first call only
+        irida_api.get_completed_amr_analysis_results(1, show_progress=False)
+        request_count = irida_api.request_count
+        expected = irida_api.get_completed_amr_analysis_results(1, show_progress=False)
+        expected_request_count = irida_api.request_count - request_count
+
+        stand_in.overloaded_responses = 3
+        request_count = irida_api.request_count
+        res = irida_api.get_completed_amr_analysis_results(1, show_progress=False)
+
+        self.assertEqual(res, expected)
+        self.assertEqual(irida_api.request_count - request_count, expected_request_count + 3)
+        self.assertLess(rate_limiter.rate, 100)
+
+        # the last response is returned once every retry was overloaded
+        stand_in.overloaded_responses = 4
+        with self.assertRaises(exceptions.IridaConnectionError):
+            irida_api._get_existing_url(stand_in.base_url)
+
+    def test_get_conditional_requests(self):
+        """
+        Test unchanged links and listings are answered 304 Not Modified and read from the response cache, by another
+        instance too, and changed listings are downloaded again.
+        :return:
+        """
+
+        stand_in = self._start_stand_in(submission_count=10)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            irida_api = IridaAPI("client", "secret", stand_in.base_url, "user", "password",
+                                 response_cache=ResponseCache(cache_dir))
+            expected = irida_api.get_completed_amr_analysis_results(1, show_progress=False)
+            # the links of the base url are requested twice, for the projects and the analysis submissions
+            self.assertEqual(stand_in.not_modified, ["/api/"])
+
+            stand_in.not_modified.clear()
+            irida_api = IridaAPI("client", "secret", stand_in.base_url, "user", "password",
+                                 response_cache=ResponseCache(cache_dir))
+            res = irida_api.get_completed_amr_analysis_results(1, show_progress=False)
+            self.assertEqual(res, expected)
+            self.assertEqual(stand_in.not_modified, ["/api/", "/api/projects", "/api/projects/1/analyses", "/api/"])
+
+            stand_in.submission_count = 11
+            res = irida_api.get_completed_amr_analysis_results(1, show_progress=False)
+            self.assertEqual([a["identifier"] for a in res], [a["identifier"] for a in expected] + ["1011"])
+            self.assertEqual(len(stand_in.not_modified), 4)
+
 
 if __name__ == '__main__':
     unittest.main()
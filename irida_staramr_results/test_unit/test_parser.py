@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+
+from irida_staramr_results import parser
+
+
+class TestParser(unittest.TestCase):
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.config_dir = tempfile.TemporaryDirectory()
+        self.config_file = os.path.join(self.config_dir.name, "config.yml")
+
+    def tearDown(self):
+        self.config_dir.cleanup()
+
+    def _write_config(self, text):
+        with open(self.config_file, "w") as file:
+            file.write("base-url: http://localhost:8080/api/\nclient-id: client\nclient-secret: secret\n" + text)
+
+    def test_parse_config_request_settings(self):
+        """
+        Test the optional request settings have defaults, and their values are converted.
+        :return:
+        """
+
+        self._write_config("")
+        res = parser.parse_config(self.config_file)
+        self.assertEqual(res, {"base_url": "http://localhost:8080/api/", "client_id": "client",
+                               "client_secret": "secret", "requests_per_second": None, "max_concurrency": None,
+                               "max_retries": 5, "backoff_factor": 0.5, "max_backoff": 60})
+
+        self._write_config("requests-per-second: 2.5\nmax-concurrency: '16'\nmax-retries: 0\n")
+        res = parser.parse_config(self.config_file)
+        self.assertEqual((res["requests_per_second"], res["max_concurrency"], res["max_retries"]), (2.5, 16, 0))
+
+    def test_parse_config_invalid_request_settings(self):
+        """
+        Test request settings that are not positive numbers are rejected.
+        :return:
+        """
+
+        for text in ["requests-per-second: 0\n", "max-concurrency: many\n", "max-backoff: -1\n"]:
+            self._write_config(text)
+            with self.assertRaises(parser.exceptions.ConfigInformationError):
+                parser.parse_config(self.config_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+from email.utils import formatdate
+from unittest.mock import patch
+
+from irida_staramr_results.api.rate_limit import RateLimiter, RetryPolicy, MIN_RATE
+
+
+class TestRateLimit(unittest.TestCase):
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        patcher = patch("irida_staramr_results.api.rate_limit.time.monotonic", return_value=100.0)
+        self.monotonic = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reserve(self):
+        """
+        Test a second of requests can be sent at once, then requests are spaced by the rate.
+        :return:
+        """
+
+        rate_limiter = RateLimiter(requests_per_second=4)
+
+        self.assertEqual([rate_limiter.reserve() for _ in range(4)], [0, 0, 0, 0])
+        self.assertEqual([rate_limiter.reserve() for _ in range(2)], [0.25, 0.5])
+
+        # a quarter of a second refills one request
+        self.monotonic.return_value = 100.25
+        self.assertEqual(rate_limiter.reserve(), 0.5)
+
+    def test_adaptive_rate(self):
+        """
+        Test the rate is halved when IRIDA is overloaded, once per cooldown, and grows back to the configured rate.
+        :return:
+        """
+
+        rate_limiter = RateLimiter(requests_per_second=10)
+        rate_limiter.on_overload()
+        rate_limiter.on_overload()
+        self.assertEqual(rate_limiter.rate, 5)
+
+        self.monotonic.return_value = 102.0
+        rate_limiter.on_overload()
+        self.assertEqual(rate_limiter.rate, 2.5)
+
+        for _ in range(20):
+            rate_limiter.on_success()
+        self.assertEqual(rate_limiter.rate, 10)
+
+    def test_adaptive_rate_unlimited(self):
+        """
+        Test requests are only limited from the first overload until the rate grows back.
+        :return:
+        """
+
+        rate_limiter = RateLimiter()
+        self.assertEqual([rate_limiter.reserve() for _ in range(8)], [0] * 8)
+
+        rate_limiter.on_overload()
+        self.assertEqual(rate_limiter.rate, 4)
+        self.assertEqual(rate_limiter.reserve(), 0.25)
+
+        for _ in range(10):
+            rate_limiter.on_success()
+        self.assertIsNone(rate_limiter.rate)
+        self.assertEqual(rate_limiter.reserve(), 0)
+
+        # overloaded without any request sent during the last second
+        self.monotonic.return_value = 110.0
+        rate_limiter.on_overload()
+        self.assertEqual(rate_limiter.rate, MIN_RATE)
+
+    def test_retry_delay(self):
+        """
+        Test backoffs grow exponentially up to max_backoff, and Retry-After headers are honoured.
+        :return:
+        """
+
+        retry_policy = RetryPolicy(max_retries=5, backoff_factor=0.5, max_backoff=3)
+        with patch("irida_staramr_results.api.rate_limit.random.uniform", side_effect=lambda low, high: high):
+            self.assertEqual([retry_policy.get_delay(attempt) for attempt in range(4)], [0.5, 1, 2, 3])
+            self.assertEqual(retry_policy.get_delay(0, "2"), 2)
+            self.assertEqual(retry_policy.get_delay(0, "120"), 3)
+            self.assertEqual(retry_policy.get_delay(0, "soon"), 0.5)
+
+        delay = retry_policy.get_delay(0, formatdate(usegmt=True))
+        self.assertLessEqual(delay, 0.5)
+
+        self.assertTrue(retry_policy.is_retryable(503))
+        self.assertFalse(retry_policy.is_retryable(404))
+
+
+if __name__ == '__main__':
+    unittest.main()
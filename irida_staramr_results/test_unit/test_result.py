@@ -0,0 +1,82 @@
+import io
+import unittest
+
+import pandas as pd
+
+from irida_staramr_results.model.result import Result
+from irida_staramr_results.test_unit.irida_stand_in import _get_excel_file
+
+
+class TestResult(unittest.TestCase):
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+
+    def test_get_contents_settings(self):
+        """
+        Test settings.txt is parsed to a dictionary, keeping the values that contain "=", and parsed once.
+        :return:
+        """
+
+        result = Result({}, b"command_line = staramr search --min-coverage=98\r\nversion = 0.7.1\n\ninvalid line\n",
+                        "staramr-settings.txt")
+
+        res = result.get_contents()
+        self.assertEqual(res, {"command_line": "staramr search --min-coverage=98", "version": "0.7.1"})
+        self.assertIs(result.get_contents(), res)
+
+        data_frame = result.get_data_frame()
+        self.assertEqual(list(data_frame.columns), ["command_line", "version"])
+        self.assertEqual(data_frame["version"][0], "0.7.1")
+
+    def test_get_data_frame_tsv(self):
+        """
+        Test tsv files are parsed with the declared column types, and parsed once.
+        :return:
+        """
+
+        result = Result({}, b"Isolate ID\tScheme\tSequence Type\tGenome Length\n"
+                            b"1001\tsenterica\t19\t4800000\n"
+                            b"1002\tsenterica\t-\t4700000\n", "staramr-mlst.tsv")
+
+        data_frame = result.get_data_frame()
+        self.assertEqual(list(data_frame["Isolate ID"]), ["1001", "1002"])
+        self.assertEqual(list(data_frame["Sequence Type"]), ["19", "-"])
+        self.assertEqual(list(data_frame["Genome Length"]), [4800000, 4700000])
+        self.assertIs(result.get_data_frame(), data_frame)
+
+        result = Result({}, b"Isolate ID\tGene\t%Identity\tStart\nS1\tblaTEM-1B\t100\t1\n", "staramr-resfinder.tsv")
+        data_frame = result.get_data_frame()
+        self.assertIsInstance(data_frame["Gene"].dtype, pd.CategoricalDtype)
+        self.assertEqual(data_frame["%Identity"].dtype, "float64")
+        self.assertEqual(data_frame["Start"].dtype, "Int64")
+
+    def test_get_data_frame_schema_mismatch(self):
+        """
+        Test a file with values that don't fit its schema is still parsed, with inferred types.
+        :return:
+        """
+
+        result = Result({}, b"Isolate ID\tGene\tStart\nS1\tblaTEM-1B\tunknown\n", "staramr-resfinder.tsv")
+        with self.assertLogs(level="WARNING"):
+            data_frame = result.get_data_frame()
+        self.assertEqual(data_frame.to_dict("records"), [{"Isolate ID": "S1", "Gene": "blaTEM-1B", "Start": "unknown"}])
+
+    def test_get_data_frame_excel(self):
+        """
+        Test the PointFinder sheet is read from the bytes of the excel file, or is empty if there is none.
+        :return:
+        """
+
+        result = Result({}, _get_excel_file(), "staramr-excel.xlsx")
+        self.assertEqual(result.get_data_frame().to_dict("records"), [{"Isolate ID": "S1", "Gene": "gyrA (S83F)"}])
+
+        excel_file = io.BytesIO()
+        with pd.ExcelWriter(excel_file, engine="xlsxwriter") as writer:
+            pd.DataFrame({"Isolate ID": ["S1"]}).to_excel(writer, sheet_name="Summary", index=False)
+        result = Result({}, excel_file.getvalue(), "staramr-excel.xlsx")
+        self.assertTrue(result.get_data_frame().empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+
+from irida_staramr_results.state import ExportState, ExportCheckpoint
+
+
+class TestState(unittest.TestCase):
+
+    def setUp(self):
+        print("\nStarting " + self.__module__ + ": " + self._testMethodName)
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.state_file = os.path.join(self.state_dir.name, "state.json")
+
+    def tearDown(self):
+        self.state_dir.cleanup()
+
+    def test_submission_filter(self):
+        """
+        Test only submissions after the last exported submission, or still running, are accepted by the next run.
+        :return:
+        """
+
+        fake_submissions = [
+            {"identifier": "1", "analysisState": "COMPLETED", "createdDate": 1611122400000},
+            {"identifier": "2", "analysisState": "ERROR", "createdDate": 1613282400000},
+            {"identifier": "3", "analysisState": "COMPLETED", "createdDate": 1614405600000},
+            {"identifier": "4", "analysisState": "RUNNING", "createdDate": 1614924000000},
+            {"identifier": "5", "analysisState": "COMPLETED", "createdDate": 1617858000000}
+        ]
+
+        state = ExportState(self.state_file)
+        is_new_submission = state.submission_filter(1)
+        self.assertEqual(len([s for s in fake_submissions if is_new_submission(s)]), 5)
+
+        # the running submission (4) is pending, the submission after it is exported
+        state.update(1, report="out.xlsx")
+        state.save()
+
+        state = ExportState(self.state_file)
+        self.assertEqual(state.get_last_submission_id(1), 5)
+        self.assertEqual(state.get_pending_submission_ids(1), [4])
+        self.assertEqual(state.get_report(1), os.path.abspath("out.xlsx"))
+        self.assertEqual(state.get_last_submission_id(2), 0)
+
+        is_new_submission = state.submission_filter(1)
+        self.assertEqual([s["identifier"] for s in fake_submissions if is_new_submission(s)], ["4"])
+
+        # once completed, the pending submission is exported
+        fake_submissions[3]["analysisState"] = "COMPLETED"
+        state.update(1)
+        self.assertEqual(state.get_last_submission_id(1), 5)
+        self.assertEqual(state.get_pending_submission_ids(1), [])
+
+    def test_update_failed_submissions(self):
+        """
+        Test submissions whose analysis result failed are not recorded as exported.
+        :return:
+        """
+
+        fake_submissions = [{"identifier": str(i), "analysisState": "COMPLETED", "createdDate": i} for i in range(1, 6)]
+
+        state = ExportState(self.state_file)
+        is_new_submission = state.submission_filter(1)
+        for s in fake_submissions:
+            is_new_submission(s)
+
+        state.update(1, failed_submission_ids={"4"})
+        self.assertEqual(state.get_last_submission_id(1), 5)
+        self.assertEqual(state.get_pending_submission_ids(1), [4])
+
+        # nothing new, nothing changes
+        state.submission_filter(1)
+        state.update(1)
+        self.assertEqual(state.get_last_submission_id(1), 5)
+        self.assertEqual(state.get_pending_submission_ids(1), [4])
+
+    def test_export_checkpoint(self):
+        """
+        Test a checkpoint is reloaded without its incomplete last line, and removed with its spool files.
+        :return:
+        """
+
+        checkpoint = ExportCheckpoint(self.state_dir.name, "out")
+        os.makedirs(checkpoint.spool_dir)
+        checkpoint.add(1)
+        checkpoint.add("2")
+        with open(checkpoint.checkpoint_path, "a") as file:
+            file.write('{"analysis_id": "3", "accu')
+
+        checkpoint = ExportCheckpoint(self.state_dir.name, "out")
+        self.assertTrue(checkpoint.is_done("1"))
+        self.assertTrue(checkpoint.is_done(2))
+        self.assertFalse(checkpoint.is_done(3))
+        self.assertFalse(checkpoint.report_appended)
+
+        checkpoint.add(3)
+        checkpoint.reserve_output_file_name(4, "out-2021-01-19T21-13-14")
+        checkpoint.set_report_appended()
+        checkpoint = ExportCheckpoint(self.state_dir.name, "out")
+        self.assertEqual(checkpoint.analysis_ids, {"1", "2", "3"})
+        self.assertFalse(checkpoint.is_done(4))
+        self.assertEqual(checkpoint.get_output_file_name("4"), "out-2021-01-19T21-13-14")
+        self.assertIsNone(checkpoint.get_output_file_name(3))
+        self.assertTrue(checkpoint.report_appended)
+
+        checkpoint.remove()
+        self.assertEqual(os.listdir(self.state_dir.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
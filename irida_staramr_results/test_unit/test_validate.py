@@ -1,4 +1,8 @@
+import os
+import sys
+import tempfile
 import unittest
+from unittest.mock import patch
 
 from irida_staramr_results import validate
 
@@ -37,6 +41,82 @@ class TestValidate(unittest.TestCase):
         res = validate.date_range(fake_from, fake_to)
         self.assertEqual(0, res["from_date"])
 
+    def test_validate_workers(self):
+        """
+        Test workers function to accept positive numbers only
+        :return:
+        """
+
+        self.assertEqual(validate.workers(8), 8)
+
+        with self.assertRaises(SystemExit):
+            validate.workers(0)
+
+    def test_validate_processes(self):
+        """
+        Test processes function to accept positive numbers only, and default to the number of CPUs with split results
+        :return:
+        """
+
+        self.assertEqual(validate.processes(4), 4)
+        self.assertEqual(validate.processes(None), os.cpu_count() or 1)
+        # a pool of processes is only used by --split_results
+        self.assertEqual(validate.processes(None, split_results=False), 1)
+        self.assertEqual(validate.processes(4, split_results=False), 1)
+
+        with self.assertRaises(SystemExit):
+            validate.processes(0)
+
+    def test_validate_output_formats(self):
+        """
+        Test output_formats function to remove duplicates, and exit if pyarrow is needed but not installed
+        :return:
+        """
+
+        self.assertEqual(validate.output_formats(["csv", "xlsx", "csv"]), ["csv", "xlsx"])
+
+        with patch.dict(sys.modules, {"pyarrow": None}):
+            self.assertEqual(validate.output_formats(["xlsx", "csv"]), ["xlsx", "csv"])
+            with self.assertRaises(SystemExit):
+                validate.output_formats(["xlsx", "parquet"])
+
+    def test_validate_project_ids(self):
+        """
+        Test project_ids function to combine project ids of arguments and project file
+        :return:
+        """
+
+        self.assertEqual(validate.project_ids([1, 2, 1], None), [1, 2])
+
+        with tempfile.TemporaryDirectory() as directory_name:
+            project_file = os.path.join(directory_name, "projects.txt")
+            with open(project_file, "w") as file:
+                file.write("# surveillance projects\n3 4\n\n2  # also given as argument\n")
+
+            self.assertEqual(validate.project_ids([2], project_file), [2, 3, 4])
+
+            with open(project_file, "w") as file:
+                file.write("3\nfour\n")
+            with self.assertRaises(SystemExit):
+                validate.project_ids(None, project_file)
+
+        with self.assertRaises(SystemExit):
+            validate.project_ids(None, None)
+
+    def test_validate_resume_directory(self):
+        """
+        Test the directory to resume must exist.
+        :return:
+        """
+
+        self.assertIsNone(validate.resume_directory(None))
+
+        with tempfile.TemporaryDirectory() as directory_name:
+            self.assertEqual(validate.resume_directory(directory_name + os.sep), directory_name)
+
+            with self.assertRaises(SystemExit):
+                validate.resume_directory(os.path.join(directory_name, "staramr-results-2021-04-08T10-00-00"))
+
 
 if __name__ == '__main__':
     unittest.main()
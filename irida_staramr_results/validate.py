@@ -1,9 +1,10 @@
+import os
 import sys
 import logging
 import getpass
 import time
 
-from irida_staramr_results import util
+from irida_staramr_results import columnar, filter, util
 
 
 def user_credentials(username, password):
@@ -68,3 +69,116 @@ def date_range(from_date, to_date):
 
 
     return {"from_date": from_date, "to_date": to_date}
+
+
+def workers(worker_count):
+    """
+    Validates the number of workers (concurrent requests) is at least 1.
+    :param worker_count: integer
+    :return worker_count:
+    """
+    if worker_count < 1:
+        logging.error("WorkersError: --workers must be at least 1.")
+        sys.exit(1)
+
+    return worker_count
+
+
+def processes(process_count, split_results=True):
+    """
+    Validates the number of processes writing the output files of --split_results, defaults to the number of CPUs.
+    Without --split_results, the output files are written by the main process and no pool is started.
+    :param process_count: integer, or None
+    :param split_results: boolean, --split_results was given
+    :return process_count: 1 without split_results
+    """
+    if not split_results:
+        if process_count is not None:
+            logging.warning("--processes only applies to --split_results, it is ignored.")
+        return 1
+
+    if process_count is None:
+        return os.cpu_count() or 1
+
+    if process_count < 1:
+        logging.error("ProcessesError: --processes must be at least 1.")
+        sys.exit(1)
+
+    return process_count
+
+
+def output_formats(formats):
+    """
+    Validates the output formats, without duplicates, and that the optional dependencies they need are installed.
+    :param formats: list of columnar.OUTPUT_FORMATS
+    :return formats: list, in the order they were given
+    """
+    try:
+        columnar.check_dependencies(formats)
+    except ImportError:
+        sys.exit(1)
+
+    return list(dict.fromkeys(formats))
+
+
+def project_ids(projects, project_file):
+    """
+    Combines the project ids given as arguments and the ones listed in a project file, without duplicates.
+    The project file lists project ids separated by spaces or new lines, text after a # is a comment.
+    At least one project id is required.
+    :param projects: list of project ids, or None
+    :param project_file: path of a project file, or None
+    :return project_ids: list of integers, in the order they were given
+    """
+    project_ids = list(projects or [])
+
+    if project_file is not None:
+        try:
+            with open(project_file, "r") as file:
+                for line in file:
+                    for value in line.split("#", 1)[0].split():
+                        project_ids.append(int(value))
+        except OSError as e:
+            logging.error(f"ProjectFileError: The project file could not be read: {e}")
+            sys.exit(1)
+        except ValueError as e:
+            logging.error(f"ProjectFileError: The project file must only list project ids: {e}")
+            sys.exit(1)
+
+    if len(project_ids) < 1:
+        logging.error("ProjectError: At least one project id is required, use --project or --project_file.")
+        sys.exit(1)
+
+    return list(dict.fromkeys(project_ids))
+
+
+def query(expression):
+    """
+    Parses the filter expression selecting the analysis submissions to download.
+    :param expression: filter expression, or None
+    :return predicate: filter.Predicate, or None if no expression is given
+    """
+    if expression is None:
+        return None
+
+    try:
+        return filter.parse_expression(expression)
+    except ValueError as e:
+        logging.error(f"QueryError: {e}")
+        sys.exit(1)
+
+
+def resume_directory(directory_name):
+    """
+    Validates the output directory of the interrupted run to resume exists.
+    :param directory_name: path of the directory, or None
+    :return directory_name: the path without trailing separators, or None if not resuming
+    """
+    if directory_name is None:
+        return None
+
+    if not os.path.isdir(directory_name):
+        logging.error(f"ResumeError: The directory {directory_name} to resume does not exist.")
+        sys.exit(1)
+
+    return os.path.normpath(directory_name)
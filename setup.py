@@ -36,6 +36,10 @@ setuptools.setup(
         "xlsxwriter",
         "python-dateutil"
     ],
+    extras_require={
+        "columnar": ["pyarrow"],
+        "async": ["aiohttp"]
+    },
     packages=setuptools.find_packages(),
     include_package_data=True,
     entry_points = {